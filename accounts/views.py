@@ -2,6 +2,7 @@ from accounts.models import UserType
 from rest_framework.permissions import IsAuthenticated
 from .serializers import UserSerializer
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
@@ -23,8 +24,7 @@ from .serializers import (
 )
 import random
 import string
-from notifications.models import Notification
-from notifications.utils import generate_notification_content,is_notification_allowed
+from notifications import outbox
 
 
 @swagger_auto_schema(
@@ -69,15 +69,9 @@ from notifications.utils import generate_notification_content,is_notification_al
 def signup(request):
     serializer = UserSignupSerializer(data=request.data)
     if serializer.is_valid():
-        user = serializer.save()
-        if is_notification_allowed('recharge_success', 'in_app'):
-            data = generate_notification_content(user, 'USER_REGISTERED')
-            Notification.objects.create(
-                user=user,
-                title=data['title'],
-                message=data['message'],
-                notification_type='USER_REGISTERED'
-)
+        with transaction.atomic():
+            user = serializer.save()
+            outbox.enqueue('USER_REGISTERED', user)
 
         refresh = RefreshToken.for_user(user)
         return Response({
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'corsheaders',
     'drf_yasg',
+    'core',
     'accounts',
     'plans',
     'purchases',
@@ -178,6 +179,82 @@ REST_FRAMEWORK = {
 # OTP Settings
 OTP_EXPIRY_MINUTES = config('OTP_EXPIRY_MINUTES', default=1, cast=int)
 
+# Wallet Settings
+WALLET_BULK_MAX_ROWS = config('WALLET_BULK_MAX_ROWS', default=10000, cast=int)
+# Cached balances expire after this many seconds even if a write-through was missed
+WALLET_BALANCE_CACHE_TTL = config('WALLET_BALANCE_CACHE_TTL', default=60, cast=int)
+# Bump to discard every cached balance (e.g. after changing the cached format)
+WALLET_BALANCE_CACHE_VERSION = config('WALLET_BALANCE_CACHE_VERSION', default=3, cast=int)
+# Sub-balances the house (admin) wallet is split into for payment credits; 1 disables striping
+HOUSE_WALLET_STRIPES = config('HOUSE_WALLET_STRIPES', default=16, cast=int)
+# Wallet holds for pending payments are released automatically after this many seconds
+WALLET_HOLD_TTL_SECONDS = config('WALLET_HOLD_TTL_SECONDS', default=900, cast=int)
+
+# Purchase Settings
+# Background threads per web process that run the payment step of purchases
+PURCHASE_WORKERS = config('PURCHASE_WORKERS', default=8, cast=int)
+# Longest a client may long-poll a purchase with ?wait=
+PURCHASE_WAIT_MAX_SECONDS = config('PURCHASE_WAIT_MAX_SECONDS', default=30, cast=int)
+# Node id embedded in transaction ids; unset means a random id per process
+PURCHASE_ID_NODE = config('PURCHASE_ID_NODE', default=None, cast=lambda value: int(value) if value not in (None, '') else None)
+# Bulk recharge submissions: items accepted per batch and charged at once per batch
+PURCHASE_BATCH_MAX_ITEMS = config('PURCHASE_BATCH_MAX_ITEMS', default=1000, cast=int)
+PURCHASE_BATCH_PARALLELISM = config('PURCHASE_BATCH_PARALLELISM', default=8, cast=int)
+# sweep_pending_purchases requeues purchases left pending/processing this long
+PURCHASE_STALE_SECONDS = config('PURCHASE_STALE_SECONDS', default=120, cast=int)
+# Requeue delay doubles per attempt from the base up to the max (with jitter); after
+# PURCHASE_MAX_ATTEMPTS requeues the purchase is marked failed
+PURCHASE_RETRY_BASE_SECONDS = config('PURCHASE_RETRY_BASE_SECONDS', default=30, cast=int)
+PURCHASE_RETRY_MAX_SECONDS = config('PURCHASE_RETRY_MAX_SECONDS', default=1800, cast=int)
+PURCHASE_MAX_ATTEMPTS = config('PURCHASE_MAX_ATTEMPTS', default=5, cast=int)
+# A repeat of the same recharge (user, phone number, plan) this soon after the last one is
+# coalesced with it instead of charged again; 0 disables the guard
+PURCHASE_DUPLICATE_WINDOW_SECONDS = config('PURCHASE_DUPLICATE_WINDOW_SECONDS', default=30, cast=int)
+# purchase_history?count=cached reuses a total for this long
+PURCHASE_HISTORY_COUNT_CACHE_SECONDS = config('PURCHASE_HISTORY_COUNT_CACHE_SECONDS', default=60, cast=int)
+# compact_revenue_rollups keeps hourly revenue buckets this many days before folding them into daily ones
+PURCHASE_ROLLUP_HOURLY_DAYS = config('PURCHASE_ROLLUP_HOURLY_DAYS', default=7, cast=int)
+
+# Notification Settings
+# Outbox rows that fail this many times are given up on (and kept, with their error)
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = config('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+# send_expiry_reminders notifies customers this many days before a plan expires
+PLAN_EXPIRY_REMINDER_DAYS = config('PLAN_EXPIRY_REMINDER_DAYS', default='3,1', cast=lambda value: [int(days) for days in value.split(',') if days.strip()])
+
+# Payment Gateway Settings
+# purchases.gateway.SimulatedGateway runs in-process; purchases.gateway.HttpGateway calls
+# PAYMENT_GATEWAY_URL (e.g. `manage.py run_gateway_simulator`) and asks PAYMENT_GATEWAY_STATUS_URL
+# (default: the /status sibling of PAYMENT_GATEWAY_URL) about purchases the sweeper recovers
+PAYMENT_GATEWAY_BACKEND = config('PAYMENT_GATEWAY_BACKEND', default='purchases.gateway.SimulatedGateway')
+PAYMENT_GATEWAY_TIMEOUT_MS = config('PAYMENT_GATEWAY_TIMEOUT_MS', default=10000, cast=int)
+# Simulator behaviour; set a seed to make outcomes and latencies reproducible
+PAYMENT_GATEWAY_SIMULATOR = {
+    'seed': config('PAYMENT_GATEWAY_SEED', default='') or None,
+    'success_rate': config('PAYMENT_GATEWAY_SUCCESS_RATE', default=0.8, cast=float),
+    'latency_p50_ms': config('PAYMENT_GATEWAY_LATENCY_P50_MS', default=1000, cast=int),
+    'latency_p99_ms': config('PAYMENT_GATEWAY_LATENCY_P99_MS', default=1000, cast=int),
+    'timeout_ms': PAYMENT_GATEWAY_TIMEOUT_MS,
+    'max_concurrency': config('PAYMENT_GATEWAY_MAX_CONCURRENCY', default=0, cast=int),
+}
+if PAYMENT_GATEWAY_BACKEND == 'purchases.gateway.HttpGateway':
+    PAYMENT_GATEWAY_OPTIONS = {
+        'url': config('PAYMENT_GATEWAY_URL', default='http://127.0.0.1:8089/charge'),
+        'status_url': config('PAYMENT_GATEWAY_STATUS_URL', default='') or None,
+        'timeout_ms': PAYMENT_GATEWAY_TIMEOUT_MS,
+    }
+else:
+    PAYMENT_GATEWAY_OPTIONS = PAYMENT_GATEWAY_SIMULATOR
+PAYMENT_GATEWAY = {
+    'BACKEND': PAYMENT_GATEWAY_BACKEND,
+    'OPTIONS': PAYMENT_GATEWAY_OPTIONS,
+}
+
+# Idempotency Settings
+# Stored responses for Idempotency-Key requests are replayed for this long
+IDEMPOTENCY_KEY_TTL_HOURS = config('IDEMPOTENCY_KEY_TTL_HOURS', default=24, cast=int)
+# A key left in progress longer than this (e.g. the worker died) may be taken over by a retry
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = config('IDEMPOTENCY_LOCK_TIMEOUT_SECONDS', default=60, cast=int)
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
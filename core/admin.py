@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import IdempotencyKey
 
-# Register your models here.
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'user', 'status', 'response_status', 'locked_at', 'expires_at')
+    list_filter = ('status',)
+    search_fields = ('key', 'user__email')
+    readonly_fields = ('user', 'key', 'fingerprint', 'status', 'response_status', 'response_body', 'locked_at', 'expires_at')
@@ -0,0 +1,154 @@
+"""
+Idempotency-Key support for money-moving endpoints.
+
+A client sends ``Idempotency-Key: <unique value>`` with a POST. The first
+request claims the key by inserting a row (the unique constraint on
+user + key decides the winner when two workers race), runs the view and
+stores its response in the same transaction as the view's own writes. Any
+retry with the same key gets the stored response back without running the
+view again; a retry that arrives while the first is still running gets 409.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_yasg import openapi
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+IDEMPOTENCY_KEY_PARAMETER = openapi.Parameter(
+    'Idempotency-Key',
+    openapi.IN_HEADER,
+    description="Optional unique key; retries with the same key replay the first response instead of repeating the operation",
+    type=openapi.TYPE_STRING,
+    required=False,
+)
+
+
+def _fingerprint(request):
+    files = request.FILES
+    data = request.data
+    if files:
+        data = {key: data.getlist(key) for key in data if key not in files}
+    body = json.dumps(data, sort_keys=True, cls=JSONEncoder, default=str)
+    digest = hashlib.sha256(f"{request.method}:{request.path}:{body}".encode())
+    # Uploads count by content, not file name; rewind them for the view.
+    for name in sorted(files):
+        for upload in files.getlist(name):
+            digest.update(f":{name}:".encode())
+            for chunk in upload.chunks():
+                digest.update(chunk)
+            upload.seek(0)
+    return digest.hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """Returns ``(record, claimed)``; ``claimed`` is False if another request owns the key."""
+    for _ in range(3):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user,
+                    key=key,
+                    fingerprint=fingerprint,
+                    locked_at=now,
+                    expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                )
+            return record, True
+        except IntegrityError:
+            pass
+
+        try:
+            record = IdempotencyKey.objects.get(user=user, key=key)
+        except IdempotencyKey.DoesNotExist:
+            # The owner failed and released the key between our insert and read.
+            continue
+
+        expired = record.expires_at <= now
+        abandoned = (
+            record.status == 'in_progress'
+            and record.locked_at <= now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS)
+        )
+        if not (expired or abandoned):
+            return record, False
+
+        # Take over an expired or abandoned key; the conditional UPDATE makes
+        # sure only one of several racing retries wins it.
+        taken = IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at, status=record.status).update(
+            fingerprint=fingerprint,
+            status='in_progress',
+            response_status=None,
+            response_body=None,
+            locked_at=now,
+            expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+        )
+        if taken:
+            record.refresh_from_db()
+            return record, True
+    return IdempotencyKey.objects.get(user=user, key=key), False
+
+
+def idempotent(view_func):
+    """
+    Make a DRF view (function view or APIView method) honour ``Idempotency-Key``.
+
+    Requests without the header run normally. Apply it beneath ``@api_view`` /
+    ``@permission_classes`` so the request is already authenticated.
+    """
+    @functools.wraps(view_func)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_func(*args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': 'Idempotency-Key must be at most 255 characters'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = _fingerprint(request)
+        record, claimed = _claim(request.user, key, fingerprint)
+        if not claimed:
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {'error': 'Idempotency-Key was already used for a different request'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.status == 'in_progress':
+                return Response(
+                    {'error': 'A request with this Idempotency-Key is still being processed'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            response = Response(record.response_body, status=record.response_status)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            with transaction.atomic():
+                response = view_func(*args, **kwargs)
+                if response.status_code < 500 and hasattr(response, 'data'):
+                    # Stored with the view's writes so a crash can't record one without the other.
+                    IdempotencyKey.objects.filter(pk=record.pk).update(
+                        status='completed',
+                        response_status=response.status_code,
+                        response_body=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+                    )
+                    return response
+        except Exception:
+            IdempotencyKey.objects.filter(pk=record.pk, status='in_progress').delete()
+            raise
+
+        # Server errors are not replayed: release the key so the client can retry.
+        IdempotencyKey.objects.filter(pk=record.pk, status='in_progress').delete()
+        return response
+
+    return wrapper
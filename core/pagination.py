@@ -0,0 +1,175 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are selected with a ``WHERE (a, b) < (x, y)`` style predicate on the
+ordering columns instead of ``OFFSET``, and no ``COUNT(*)`` is issued, so the
+cost of a page is the same whether it is the first or the ten-thousandth -
+provided an index matches the ordering.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values, reverse=False):
+    payload = {'v': [_encode_value(value) for value in values]}
+    if reverse:
+        payload['r'] = 1
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, fields):
+    """Returns ``(values, reverse)``; raises ``ValueError`` for a malformed cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        raw_values = payload['v']
+        if len(raw_values) != len(fields):
+            raise ValueError('cursor does not match ordering')
+        values = [
+            model._meta.get_field(field).to_python(raw)
+            for field, raw in zip(fields, raw_values)
+        ]
+        return values, bool(payload.get('r'))
+    except (KeyError, TypeError, ValidationError, json.JSONDecodeError, UnicodeDecodeError, base64.binascii.Error) as exc:
+        raise ValueError('invalid cursor') from exc
+
+
+def keyset_filter(ordering, values, reverse=False):
+    """
+    Q object selecting rows strictly after ``values`` in ``ordering``.
+
+    ``ordering`` is a list like ``['-created_at', '-id']``; the last field
+    must be unique so the order is total. With ``reverse`` the rows strictly
+    before ``values`` are selected instead.
+    """
+    condition = Q()
+    equal_prefix = Q()
+    for ordering_field, value in zip(ordering, values):
+        descending = ordering_field.startswith('-')
+        field = ordering_field.lstrip('-')
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition |= equal_prefix & Q(**{f'{field}__{lookup}': value})
+        equal_prefix &= Q(**{field: value})
+    return condition
+
+
+def reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def ordering_values(obj, ordering):
+    return [getattr(obj, field.lstrip('-')) for field in ordering]
+
+
+class KeysetPagination(BasePagination):
+    """DRF paginator returning ``next`` / ``previous`` cursor links and ``results``."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size_value = self.get_page_size(request)
+        ordering = list(self.ordering)
+
+        reverse = False
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            fields = [field.lstrip('-') for field in ordering]
+            try:
+                values, reverse = decode_cursor(cursor, queryset.model, fields)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(keyset_filter(ordering, values, reverse))
+
+        queryset = queryset.order_by(*(reverse_ordering(ordering) if reverse else ordering))
+        rows = list(queryset[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+
+        self.next_values = self.previous_values = None
+        if rows:
+            # The extra row tells us whether more rows lie in the direction we
+            # read; in the other direction there is always the page we came from.
+            if has_more or reverse:
+                self.next_values = ordering_values(rows[-1], ordering)
+            if (has_more and reverse) or (cursor and not reverse):
+                self.previous_values = ordering_values(rows[0], ordering)
+        return rows
+
+    def _link(self, values, reverse):
+        if values is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        return self._link(self.next_values, False)
+
+    def get_previous_link(self):
+        return self._link(self.previous_values, True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor from a previous next/previous link.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Rows per page (max {self.max_page_size}).',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,40 @@
+"""
+Factories shared by the apps' tests.
+
+Phone numbers and plan identifiers come from a counter, so every run creates
+the same rows in the same order.
+"""
+from decimal import Decimal
+import itertools
+
+from accounts.models import User, UserType
+
+_sequence = itertools.count(1)
+
+
+def make_user(name, user_type=UserType.RETAILER):
+    return User.objects.create_user(
+        username=name, email=f'{name}@example.com', phone=f'+91{next(_sequence):010d}',
+        password='x', user_type=user_type,
+    )
+
+
+def make_plan(title='Unlimited 299', amount='25.00', validity=28, provider=None):
+    from plans.models import Plans, Provider
+
+    return Plans.objects.create(
+        provider=provider or Provider.objects.create(title='Airtel'), title=title, description='',
+        validity=validity, amount=Decimal(amount), identifier=f'plan-{next(_sequence)}',
+    )
+
+
+def make_purchase(user, plan, **fields):
+    from purchases import ids
+    from purchases.models import PlanPurchase
+
+    fields.setdefault('payment_status', 'pending')
+    fields.setdefault('payment_method', 'online')
+    fields.setdefault('phone_number', '9876543210')
+    return PlanPurchase.objects.create(
+        user=user, plan=plan, amount=plan.amount, transaction_id=ids.transaction_id(), **fields,
+    )
@@ -1,3 +1,60 @@
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import UserType
+from .testing import make_user
+from wallet.models import Wallet, WalletTransaction
+
+
+class IdempotencyTests(TestCase):
+    url = '/api/wallet/bulk/'
+
+    def setUp(self):
+        self.admin = make_user('admin', UserType.ADMIN)
+        self.retailer = make_user('retailer')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.admin)
+
+    def post_json(self, amount, key):
+        entries = [{'email': self.retailer.email, 'amount': amount, 'transaction_type': 'add_to_wallet'}]
+        return self.client.post(self.url, entries, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def post_csv(self, amount, key):
+        upload = SimpleUploadedFile(
+            'wallets.csv', f'email,amount\n{self.retailer.email},{amount}\n'.encode(), content_type='text/csv'
+        )
+        return self.client.post(self.url, {'file': upload}, format='multipart', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.post_json('10.00', 'key-1')
+        retry = self.post_json('10.00', 'key-1')
+
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Wallet.objects.get(user=self.retailer).balance, Decimal('10.00'))
+        self.assertEqual(WalletTransaction.objects.count(), 1)
+
+    def test_different_body_with_same_key_is_rejected(self):
+        self.post_json('10.00', 'key-2')
+        response = self.post_json('20.00', 'key-2')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Wallet.objects.get(user=self.retailer).balance, Decimal('10.00'))
+
+    def test_csv_retry_replays_first_response(self):
+        self.post_csv('10.00', 'key-3')
+        retry = self.post_csv('10.00', 'key-3')
+
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Wallet.objects.get(user=self.retailer).balance, Decimal('10.00'))
+
+    def test_different_csv_with_same_name_and_key_is_rejected(self):
+        self.post_csv('10.00', 'key-4')
+        response = self.post_csv('99.00', 'key-4')
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Wallet.objects.get(user=self.retailer).balance, Decimal('10.00'))
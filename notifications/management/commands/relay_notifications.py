@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+import time
+
+from notifications import outbox
+from notifications.models import NotificationOutbox
+
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notifications from the outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Outbox rows delivered per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling every --interval seconds when the outbox is empty',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Seconds to wait when the outbox is empty with --loop (default: 2)',
+        )
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=7,
+            help='Delete delivered outbox rows older than this many days (default: 7); failed rows are kept',
+        )
+
+    def handle(self, *args, **options):
+        next_purge = 0
+        while True:
+            delivered = 0
+            while True:
+                count = outbox.relay(options['batch_size'])
+                delivered += count
+                if count < options['batch_size']:
+                    break
+            purged = 0
+            # Purging scans delivered history, so do it at most hourly.
+            if time.monotonic() >= next_purge:
+                # Rows given up on keep their error for inspection.
+                purged, _ = NotificationOutbox.objects.filter(
+                    processed_at__lt=timezone.now() - timedelta(days=options['keep_days']),
+                    last_error='',
+                ).delete()
+                next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+            if delivered or purged or not options['loop']:
+                self.stdout.write(f'Delivered {delivered} notifications, purged {purged} old outbox rows')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
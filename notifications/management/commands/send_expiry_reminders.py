@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import time
+
+from notifications import reminders
+from notifications.utils import is_notification_allowed
+
+
+class Command(BaseCommand):
+    help = 'Remind customers that their plans expire soon (run from cron, or with --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            nargs='+',
+            default=settings.PLAN_EXPIRY_REMINDER_DAYS,
+            help='Days before expiry to send a reminder (default: PLAN_EXPIRY_REMINDER_DAYS)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Purchases read and reminders written per chunk (default: 5000)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, sending every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=3600,
+            help='Seconds between runs with --loop (default: 3600)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.send(options['days'], options['chunk_size'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def send(self, days_before, chunk_size):
+        if not is_notification_allowed('plan_expiry_reminder', 'in_app'):
+            self.stdout.write('Plan expiry reminders are turned off')
+            return
+        for days, start, end in reminders.windows(days_before):
+            scanned, created = reminders.send_window(days, start, end, chunk_size)
+            self.stdout.write(f'{days}-day reminders: {scanned} purchases expiring, {created} reminders sent')
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globalnotificationsetting',
+            name='plan_expiry_reminder',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='dedupe_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_globalnotificationsetting_plan_expiry_reminder_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Failed delivery attempts'),
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='last_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
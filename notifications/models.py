@@ -38,6 +38,8 @@ class Notification(models.Model):
     delivered_at = models.DateTimeField(null=True, blank=True)
     read_at = models.DateTimeField(null=True, blank=True)
     related_id = models.BigIntegerField(null=True, blank=True)
+    # Set for notifications that must only ever be sent once (e.g. expiry reminders)
+    dedupe_key = models.CharField(max_length=100, null=True, blank=True, unique=True)
 
     def __str__(self):
         return f"Notification #{self.id} - {self.title} ({self.notification_type})"
@@ -57,6 +59,7 @@ class GlobalNotificationSetting(models.Model):
     new_user_registered = models.BooleanField(default=True)
     low_balance = models.BooleanField(default=True)
     maintenance_scheduled = models.BooleanField(default=False)
+    plan_expiry_reminder = models.BooleanField(default=True)
 
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -72,3 +75,37 @@ class LowBalanceThreshold(models.Model):
 
    
         ...
+
+OUTBOX_EVENTS = (
+    ('RECHARGE_SUCCESS', 'Recharge Success'),
+    ('RECHARGE_FAILED', 'Recharge Failed'),
+    ('SUPPORT_UPDATED', 'Support Updated'),
+    ('USER_REGISTERED', 'User Registered'),
+)
+
+class NotificationOutbox(models.Model):
+    """
+    A notification still to be created, written in the same transaction as
+    the event that causes it. ``relay_notifications`` renders and delivers
+    pending rows in batches and stamps ``processed_at``. A row that fails is
+    retried up to ``NOTIFICATION_OUTBOX_MAX_ATTEMPTS`` times and then stamped
+    anyway, keeping its ``last_error``.
+    """
+    event = models.CharField(max_length=30, choices=OUTBOX_EVENTS)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notification_outbox')
+    related_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Failed delivery attempts")
+    last_error = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f"Outbox #{self.id} - {self.event}"
+
+    class Meta:
+        db_table = 'notification_outbox'
+        indexes = [
+            # Only pending rows are indexed, so the relay's scan stays small as history grows.
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='notif_outbox_pending_idx'),
+        ]
+
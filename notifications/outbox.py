@@ -0,0 +1,145 @@
+"""
+Transactional outbox for notifications.
+
+Business code calls ``enqueue`` inside its own transaction, which costs one
+INSERT and no reads: the notification exists if and only if the event
+committed. ``relay`` (run by ``relay_notifications``) later drains the outbox
+in batches: it checks the notification settings once per batch, loads every
+purchase and ticket the batch refers to with one query each, renders the
+content and writes all notifications with one ``bulk_create``. A row that
+cannot be delivered is retried on later runs and eventually given up on,
+without holding up the rows behind it.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from purchases.models import PlanPurchase
+from support.models import Support
+from .models import Notification, NotificationOutbox
+from .utils import generate_notification_content, is_notification_allowed
+
+logger = logging.getLogger(__name__)
+
+RECHARGE_EVENTS = ('RECHARGE_SUCCESS', 'RECHARGE_FAILED')
+
+
+def enqueue(event, user, related_id=None):
+    """Record a notification to send once the surrounding transaction commits."""
+    return NotificationOutbox.objects.create(
+        event=event,
+        user_id=getattr(user, 'pk', user),
+        related_id=related_id,
+    )
+
+
+def _render(entry, related):
+    user = entry.user
+    if entry.event == 'RECHARGE_SUCCESS':
+        data = generate_notification_content(user, 'RECHARGE', related_id=entry.related_id, related=related)
+        return data['title'], data['message'], 'RECHARGE'
+    if entry.event == 'RECHARGE_FAILED':
+        reason = (related.payment_gateway_response or {}).get('message', 'Payment failed') if related else 'Payment failed'
+        plan_title = related.plan.title if related else 'your plan'
+        return (
+            "Recharge Failed",
+            f"Hi {user.first_name or user.email.split('@')[0]},\n\n"
+            f"Your payment for the plan '{plan_title}' failed: {reason}.\n"
+            f"Please try again.",
+            'RECHARGE',
+        )
+    if entry.event == 'SUPPORT_UPDATED':
+        data = generate_notification_content(user, 'SUPPORT', related_id=entry.related_id, related=related)
+        return data['title'], data['message'], 'SUPPORT'
+    data = generate_notification_content(user, 'USER_REGISTERED')
+    return data['title'], data['message'], 'USER_REGISTERED'
+
+
+def relay(batch_size=500):
+    """
+    Deliver up to ``batch_size`` pending outbox rows. Returns how many were handled.
+
+    Rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` (on databases
+    that support it), so several relays can run side by side. Each row is
+    rendered in its own savepoint, so a row that fails is recorded against
+    that row (``attempts``, ``last_error``) and the rest of the batch is still
+    delivered.
+    """
+    with transaction.atomic():
+        entries = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(processed_at__isnull=True)
+            .select_related('user')
+            .order_by('id')[:batch_size]
+        )
+        if not entries:
+            return 0
+
+        failed = {}
+        # Same switch the request-time code used for every notification type.
+        if is_notification_allowed('recharge_success', 'in_app'):
+            purchases = PlanPurchase.objects.select_related('plan').in_bulk(
+                {entry.related_id for entry in entries if entry.event in RECHARGE_EVENTS and entry.related_id}
+            )
+            tickets = Support.objects.in_bulk(
+                {entry.related_id for entry in entries if entry.event == 'SUPPORT_UPDATED' and entry.related_id}
+            )
+            notifications = []
+            for entry in entries:
+                if entry.event in RECHARGE_EVENTS:
+                    related = purchases.get(entry.related_id)
+                elif entry.event == 'SUPPORT_UPDATED':
+                    related = tickets.get(entry.related_id)
+                else:
+                    related = None
+                try:
+                    with transaction.atomic():
+                        title, message, notification_type = _render(entry, related)
+                except Exception as e:
+                    failed[entry.pk] = e
+                    continue
+                notifications.append((entry, Notification(
+                    user_id=entry.user_id,
+                    title=title,
+                    message=message,
+                    notification_type=notification_type,
+                    related_id=entry.related_id,
+                    created_at=entry.created_at,
+                )))
+            try:
+                with transaction.atomic():
+                    Notification.objects.bulk_create([notification for _, notification in notifications], batch_size=500)
+            except Exception:
+                # One bad row fails the whole INSERT; write them one at a time to isolate it.
+                for entry, notification in notifications:
+                    try:
+                        with transaction.atomic():
+                            notification.save()
+                    except Exception as e:
+                        failed[entry.pk] = e
+
+        now = timezone.now()
+        NotificationOutbox.objects.filter(
+            pk__in=[entry.pk for entry in entries if entry.pk not in failed]
+        ).update(processed_at=now)
+        for entry in entries:
+            if entry.pk in failed:
+                _record_failure(entry, failed[entry.pk], now)
+    return len(entries)
+
+
+def _record_failure(entry, error, now):
+    attempts = entry.attempts + 1
+    given_up = attempts >= settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS
+    logger.log(
+        logging.ERROR if given_up else logging.WARNING,
+        "Outbox entry %s (%s) failed on attempt %s%s: %r",
+        entry.pk, entry.event, attempts, ', giving up' if given_up else '', error,
+    )
+    NotificationOutbox.objects.filter(pk=entry.pk).update(
+        attempts=attempts,
+        last_error=f"{type(error).__name__}: {error}",
+        processed_at=now if given_up else None,
+    )
@@ -0,0 +1,87 @@
+"""
+Plan expiry reminders.
+
+For each reminder threshold (e.g. 3 days and 1 day before expiry) the
+purchases expiring in that window are read in ``(expires_at, id)`` order
+straight off the ``expires_at`` index, a chunk at a time. Each reminder has a
+``dedupe_key`` of purchase id and threshold; keys already sent are skipped with
+one lookup per chunk, and the unique constraint (``ignore_conflicts``) covers
+two runs overlapping.
+"""
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from purchases.models import PlanPurchase
+from .models import Notification
+
+
+def dedupe_key(purchase_id, days):
+    return f"plan-expiry:{purchase_id}:{days}d"
+
+
+def windows(days_before, now=None):
+    """
+    ``(days, start, end)`` per threshold, each covering ``(start, end]``.
+
+    Windows do not overlap, so a plan expiring in 12 hours gets only the
+    1-day reminder even on the first run, not the 3-day one as well.
+    """
+    now = now or timezone.now()
+    thresholds = sorted(set(days_before))
+    return [
+        (days, now + timedelta(days=previous), now + timedelta(days=days))
+        for previous, days in zip([0] + thresholds, thresholds)
+    ]
+
+
+def _render(purchase, days):
+    user = purchase.user
+    name = user.first_name or user.email.split('@')[0]
+    return Notification(
+        user_id=purchase.user_id,
+        title=f"Your {purchase.plan.title} plan expires soon"[:100],
+        message=(
+            f"Hi {name},\n\n"
+            f"Your plan {purchase.plan.title} for {purchase.phone_number} expires on "
+            f"{timezone.localtime(purchase.expires_at).strftime('%Y-%m-%d')} "
+            f"(within {days} day{'s' if days != 1 else ''}).\n"
+            f"Recharge now to stay connected."
+        ),
+        notification_type='RECHARGE',
+        related_id=purchase.id,
+        dedupe_key=dedupe_key(purchase.id, days),
+    )
+
+
+def send_window(days, start, end, chunk_size=5000):
+    """Create the reminders for purchases expiring in ``(start, end]``. Returns ``(scanned, created)``."""
+    scanned = created = 0
+    purchases = (
+        PlanPurchase.objects.filter(payment_status='success', expires_at__gt=start, expires_at__lte=end)
+        .select_related('user', 'plan')
+        .only('id', 'user_id', 'phone_number', 'expires_at', 'user__email', 'user__first_name', 'plan__title')
+        .order_by('expires_at', 'id')
+    )
+    last = None
+    while True:
+        page = purchases
+        if last is not None:
+            page = page.filter(Q(expires_at__gt=last[0]) | Q(expires_at=last[0], id__gt=last[1]))
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            break
+        last = (chunk[-1].expires_at, chunk[-1].id)
+        scanned += len(chunk)
+
+        sent = set(
+            Notification.objects.filter(dedupe_key__in=[dedupe_key(purchase.id, days) for purchase in chunk])
+            .values_list('dedupe_key', flat=True)
+        )
+        reminders = [_render(purchase, days) for purchase in chunk if dedupe_key(purchase.id, days) not in sent]
+        Notification.objects.bulk_create(reminders, batch_size=1000, ignore_conflicts=True)
+        created += len(reminders)
+        if len(chunk) < chunk_size:
+            break
+    return scanned, created
@@ -1,3 +1,84 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.testing import make_plan, make_purchase, make_user
+from .models import GlobalNotificationSetting, Notification, NotificationOutbox
+from . import outbox, reminders
+
+
+@override_settings(NOTIFICATION_OUTBOX_MAX_ATTEMPTS=2)
+class RelayTests(TestCase):
+    def setUp(self):
+        GlobalNotificationSetting.objects.create()
+        self.user = make_user('retailer')
+        # A gateway response that is not an object cannot be rendered.
+        purchase = make_purchase(self.user, make_plan(), payment_status='failed', payment_gateway_response=['unexpected'])
+        self.bad = outbox.enqueue('RECHARGE_FAILED', self.user, related_id=purchase.pk)
+        self.good = outbox.enqueue('USER_REGISTERED', self.user)
+
+    def test_failing_entry_does_not_block_the_batch(self):
+        self.assertEqual(outbox.relay(), 2)
+
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 1)
+        self.good.refresh_from_db()
+        self.bad.refresh_from_db()
+        self.assertIsNotNone(self.good.processed_at)
+        self.assertIsNone(self.bad.processed_at)
+        self.assertEqual(self.bad.attempts, 1)
+        self.assertIn('AttributeError', self.bad.last_error)
+
+    def test_entry_is_given_up_after_max_attempts(self):
+        outbox.relay()
+        outbox.relay()
+
+        self.bad.refresh_from_db()
+        self.assertEqual(self.bad.attempts, 2)
+        self.assertIsNotNone(self.bad.processed_at)
+        self.assertEqual(outbox.relay(), 0)
+        self.assertFalse(NotificationOutbox.objects.filter(processed_at__isnull=True).exists())
+
+
+class ExpiryReminderTests(TestCase):
+    def setUp(self):
+        self.settings = GlobalNotificationSetting.objects.create()
+        self.user = make_user('retailer')
+        plan = make_plan()
+        now = timezone.now()
+        self.expiring = {
+            hours: make_purchase(self.user, plan, payment_status='success', completed_at=now, expires_at=now + timedelta(hours=hours))
+            for hours in (6, 12, 48, 120)
+        }
+        make_purchase(self.user, plan, payment_status='failed', expires_at=now + timedelta(hours=12))
+
+    def send(self):
+        call_command('send_expiry_reminders', days=[3, 1], chunk_size=1, stdout=StringIO())
+        return set(Notification.objects.values_list('dedupe_key', flat=True))
+
+    def test_each_purchase_gets_only_its_nearest_reminder_once(self):
+        expected = {
+            reminders.dedupe_key(self.expiring[6].pk, 1),
+            reminders.dedupe_key(self.expiring[12].pk, 1),
+            reminders.dedupe_key(self.expiring[48].pk, 3),
+        }
+
+        self.assertEqual(self.send(), expected)
+        self.assertEqual(self.send(), expected)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_windows_do_not_overlap(self):
+        now = timezone.now()
+
+        self.assertEqual(reminders.windows([1, 3, 1], now), [
+            (1, now, now + timedelta(days=1)),
+            (3, now + timedelta(days=1), now + timedelta(days=3)),
+        ])
+
+    def test_reminders_can_be_turned_off(self):
+        self.settings.plan_expiry_reminder = False
+        self.settings.save()
+
+        self.assertEqual(self.send(), set())
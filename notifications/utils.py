@@ -6,7 +6,8 @@ from django.contrib.auth import get_user_model
 from notifications.models import LowBalanceThreshold,GlobalNotificationSetting
 
 
-def generate_notification_content(user, notification_type, related_id=None):
+def generate_notification_content(user, notification_type, related_id=None, related=None):
+    # ``related`` is the already-loaded purchase/ticket, to skip looking it up again.
     NOTIFICATION_TYPES = {
         'RECHARGE', 'SUPPORT', 'PROMOTION', 'ACCOUNT', 'OTHER','USER_REGISTERED','LOW_BALANCE'
     }
@@ -18,7 +19,7 @@ def generate_notification_content(user, notification_type, related_id=None):
 
     if notification_type == 'RECHARGE':
         try:
-            purchase = PlanPurchase.objects.get(id=related_id, user=user) if related_id else None
+            purchase = related or (PlanPurchase.objects.get(id=related_id, user=user) if related_id else None)
             plan_title = purchase.plan.title if purchase else 'Unknown Plan'
             title = f"Recharge Successful for {plan_title}"
             message = (
@@ -35,7 +36,7 @@ def generate_notification_content(user, notification_type, related_id=None):
 
     elif notification_type == 'SUPPORT':
         try:
-            ticket = Support.objects.get(id=related_id, user=user) if related_id else None
+            ticket = related or (Support.objects.get(id=related_id, user=user) if related_id else None)
             title = f"Support Ticket #{related_id or 'New'} Update"
             message = (
                 f"Hi {name},\n\n"
@@ -1,3 +1,54 @@
-from django.test import TestCase
+import hashlib
+import hmac
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import UserType
+from core.testing import make_user
+from wallet import ledger
+from wallet.models import Wallet, WalletTransaction
+
+
+@override_settings(HOUSE_WALLET_STRIPES=4)
+class PaymentSuccessTests(TestCase):
+    def setUp(self):
+        self.client_user = make_user('retailer')
+        self.wallet = Wallet.objects.create(user=self.client_user, balance=Decimal('50.00'))
+        self.house = Wallet.objects.create(user=make_user('admin', UserType.ADMIN))
+        self.api = APIClient(SERVER_NAME='localhost')
+        self.api.force_authenticate(self.client_user)
+
+    def pay(self, amount):
+        signature = hmac.new(
+            settings.RAZORPAY_KEY_SECRET.encode(), b'order_1|pay_1', hashlib.sha256
+        ).hexdigest()
+        return self.api.post('/api/payment/payment-success/', {
+            'razorpay_order_id': 'order_1',
+            'razorpay_payment_id': 'pay_1',
+            'razorpay_signature': signature,
+            'amount': amount,
+        }, format='json')
+
+    def house_balance(self):
+        house = ledger.with_stripe_balance(Wallet.objects.filter(pk=self.house.pk)).get()
+        return house.balance + house.stripe_balance
+
+    def test_payment_moves_funds_to_the_house_wallet(self):
+        response = self.pay('20.00')
+
+        self.assertEqual(response.status_code, 200)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('30.00'))
+        self.assertEqual(self.house_balance(), Decimal('20.00'))
+
+    def test_failed_debit_rolls_back_the_house_credit(self):
+        response = self.pay('80.00')
+
+        self.assertEqual(response.status_code, 400)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('50.00'))
+        self.assertEqual(self.house_balance(), Decimal('0.00'))
+        self.assertFalse(WalletTransaction.objects.exists())
@@ -6,8 +6,10 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from wallet.models import Wallet, WalletTransaction
-from accounts.models import User, UserType
+from django.db import transaction
+from wallet.models import Wallet
+from wallet import ledger
+from core.idempotency import idempotent
 from rest_framework.permissions import IsAuthenticated
 import hmac
 import hashlib
@@ -48,6 +50,7 @@ class CreateRazorpayOrderAPIView(APIView):
 class RazorpayPaymentSuccessAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         data = request.data
         required_fields = ['razorpay_order_id', 'razorpay_payment_id', 'razorpay_signature', 'amount']
@@ -67,35 +70,33 @@ class RazorpayPaymentSuccessAPIView(APIView):
 
         # Fetch users
         client_user = request.user
-        admin_user = get_object_or_404(User, user_type=UserType.ADMIN)
 
         amount = Decimal(data['amount'])
 
         # Wallet operations
         client_wallet = get_object_or_404(Wallet, user=client_user)
-        admin_wallet = get_object_or_404(Wallet, user=admin_user)
-
-        if not client_wallet.can_debit(amount):
+        admin_wallet = ledger.house_wallet()
+        if admin_wallet is None:
+            return Response({'error': 'Admin wallet not found'}, status=404)
+
+        # Debit client and credit admin as one unit so a failure can't leave
+        # money taken from one wallet but never added to the other. The
+        # stripe row is locked before the client's wallet row, the same order
+        # as ledger.transfer and apply_batch (fold_stripes first), so the two
+        # cannot deadlock; a failed debit rolls the credit back.
+        try:
+            with transaction.atomic():
+                # Every payment credits the admin wallet, so spread the credits
+                # over its stripes instead of serialising on one row lock.
+                ledger.credit_striped(
+                    admin_wallet, amount, created_by=client_user,
+                    description=f'Received payment from {client_user.email}'
+                )
+                ledger.debit(
+                    client_wallet, amount, created_by=client_user,
+                    description=f'Payment made to admin by {client_user.email}'
+                )
+        except ledger.InsufficientBalance:
             return Response({'error': 'Insufficient balance in wallet'}, status=400)
 
-        # Debit client
-        client_wallet.debit_balance(amount)
-        WalletTransaction.objects.create(
-            wallet=client_wallet,
-            transaction_type='debit_from_wallet',
-            amount=amount,
-            description=f'Payment made to admin by {client_user.email}',
-            created_by=client_user
-        )
-
-        # Credit admin
-        admin_wallet.add_balance(amount)
-        WalletTransaction.objects.create(
-            wallet=admin_wallet,
-            transaction_type='add_to_wallet',
-            amount=amount,
-            description=f'Received payment from {client_user.email}',
-            created_by=client_user
-        )
-
         return Response({'success': True, 'message': 'Payment verified and wallet updated'}, status=200)
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=50)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='plans.plans')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token'], name='plan_search_token_idx', opclasses=['varchar_pattern_ops'])],
+                'constraints': [models.UniqueConstraint(fields=('plan', 'token'), name='plan_search_token_unique')],
+            },
+        ),
+    ]
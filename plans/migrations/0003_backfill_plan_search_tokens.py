@@ -0,0 +1,41 @@
+from django.db import migrations
+
+from plans.models import search_tokens
+
+CHUNK_SIZE = 500
+
+
+def backfill(apps, schema_editor):
+    """Build the search tokens of existing plans, a chunk of plans at a time."""
+    Plans = apps.get_model('plans', 'Plans')
+    PlanSearchToken = apps.get_model('plans', 'PlanSearchToken')
+    last_id = 0
+    while True:
+        chunk = list(
+            Plans.objects.filter(pk__gt=last_id)
+            .order_by('pk')
+            .values_list('pk', 'title', 'provider__title')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        PlanSearchToken.objects.bulk_create(
+            [
+                PlanSearchToken(plan_id=plan_id, token=token)
+                for plan_id, title, provider_title in chunk
+                for token in search_tokens(f"{provider_title} {title}")
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0002_plansearchtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
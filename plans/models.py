@@ -1,4 +1,13 @@
 from django.db import models
+import re
+
+SEARCH_TOKEN_RE = re.compile(r'[0-9a-z]+')
+SEARCH_TOKEN_LENGTH = 50
+
+
+def search_tokens(text):
+    """Lowercase alphanumeric words of ``text``, as stored in PlanSearchToken."""
+    return sorted({token[:SEARCH_TOKEN_LENGTH] for token in SEARCH_TOKEN_RE.findall(text.lower())})
 
 class Provider(models.Model):
     title = models.CharField(max_length=100)
@@ -6,6 +15,11 @@ class Provider(models.Model):
     
     def __str__(self):
         return self.title
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        for plan in self.plans.all():
+            plan.update_search_tokens()
 
 class Plans(models.Model):
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='plans')
@@ -23,3 +37,37 @@ class Plans(models.Model):
     
     def __str__(self):
         return f"{self.provider.title} - {self.title}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.update_search_tokens()
+    
+    def update_search_tokens(self):
+        tokens = search_tokens(f"{self.provider.title} {self.title}")
+        self.search_tokens.exclude(token__in=tokens).delete()
+        PlanSearchToken.objects.bulk_create(
+            [PlanSearchToken(plan=self, token=token) for token in tokens], ignore_conflicts=True
+        )
+
+class PlanSearchToken(models.Model):
+    """
+    The words of a plan's title and provider title, kept up to date when
+    either is saved. Purchase search matches query words against these by
+    prefix and then filters purchases by plan, so the purchases table itself
+    is never scanned for text.
+    """
+    plan = models.ForeignKey(Plans, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=SEARCH_TOKEN_LENGTH)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plan', 'token'], name='plan_search_token_unique'),
+        ]
+        indexes = [
+            # varchar_pattern_ops lets PostgreSQL use the index for LIKE 'prefix%'
+            # in any collation; other databases ignore opclasses.
+            models.Index(fields=['token'], name='plan_search_token_idx', opclasses=['varchar_pattern_ops']),
+        ]
+    
+    def __str__(self):
+        return f"{self.token} -> {self.plan_id}"
@@ -0,0 +1,88 @@
+"""
+Duplicate-recharge guard for ``purchase_plan``.
+
+A terminal that double-taps "recharge" sends the same (user, phone number,
+plan) twice within seconds. The first request claims a cache key with
+``cache.add`` (atomic on Redis and local memory) before any database work; a
+repeat inside ``PURCHASE_DUPLICATE_WINDOW_SECONDS`` finds the key taken and is
+answered from the cache alone, without a query or a gateway call:
+
+* once the first purchase is accepted, the repeat gets that purchase back
+  (coalesced, marked ``duplicate``);
+* while the first is still being submitted, the repeat gets 409.
+
+Every repeat restarts the window, so a terminal that keeps retrying stays
+coalesced until it has been quiet for a full window. A first request that is
+rejected releases its key straight away.
+"""
+import functools
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import PlanPurchase
+
+IN_FLIGHT = 'in-flight'
+
+
+def guard_key(user_id, plan_id, phone_number):
+    digits = PlanPurchase.reversed_phone(str(phone_number))[::-1]
+    return f"recharge_guard:{user_id}:{str(plan_id).strip()}:{digits}"
+
+
+def _duplicate_response(entry):
+    if entry == IN_FLIGHT:
+        return Response(
+            {'error': 'The same recharge is already being submitted'},
+            status=status.HTTP_409_CONFLICT
+        )
+    return Response({**entry, 'duplicate': True}, status=status.HTTP_202_ACCEPTED)
+
+
+def recharge_guard(view_func):
+    """
+    Coalesce repeats of a purchase request inside the duplicate window.
+
+    Apply it beneath ``@idempotent`` so a retry carrying the same
+    Idempotency-Key is replayed rather than treated as a duplicate.
+    """
+    @functools.wraps(view_func)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        if not isinstance(request.data, dict):
+            return Response(
+                {'error': 'Expected a JSON object'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        window = settings.PURCHASE_DUPLICATE_WINDOW_SECONDS
+        plan_id = request.data.get('plan_id')
+        phone_number = request.data.get('phone_number')
+        if window <= 0 or plan_id in (None, '') or not phone_number:
+            return view_func(*args, **kwargs)
+
+        key = guard_key(request.user.pk, plan_id, phone_number)
+        if not cache.add(key, IN_FLIGHT, window):
+            entry = cache.get(key)
+            if entry is not None:
+                cache.touch(key, window)
+                return _duplicate_response(entry)
+            # The window ran out between the two calls: this is a new request.
+            if not cache.add(key, IN_FLIGHT, window):
+                return _duplicate_response(cache.get(key, IN_FLIGHT))
+
+        try:
+            response = view_func(*args, **kwargs)
+        except Exception:
+            cache.delete(key)
+            raise
+        if response.status_code == status.HTTP_202_ACCEPTED:
+            accepted = dict(response.data)
+            transaction.on_commit(lambda: cache.set(key, accepted, window))
+        else:
+            cache.delete(key)
+        return response
+    return wrapper
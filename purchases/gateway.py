@@ -0,0 +1,234 @@
+"""
+Payment gateway backends for plan purchases.
+
+The backend is chosen by ``settings.PAYMENT_GATEWAY`` (``BACKEND`` dotted path
+plus ``OPTIONS`` keyword arguments), the same way Django configures caches.
+Every backend implements ``charge(transaction_id, amount, attempt=1)`` and
+returns the dict stored in ``PlanPurchase.payment_gateway_response``; it must
+not raise for a declined or timed-out payment.
+
+Backends also implement ``status(transaction_id)``, which reports what the
+provider knows about a transaction without charging it: the recorded charge
+response (``success`` / ``failed``), ``pending`` while a charge is in
+progress, ``unknown`` if it was never charged, or ``unavailable`` if the
+provider could not be asked. Only ``unknown`` means it is safe to charge again.
+
+``SimulatedGateway`` is a local stand-in for a real provider. With a ``seed``
+its outcome and latency are a pure function of the seed, transaction id and
+attempt, so a load test or a failure can be replayed exactly. ``HttpGateway``
+talks to the same simulator run as a server (``run_gateway_simulator``), which
+puts a real network hop and a separate process in the path.
+"""
+from decimal import Decimal
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Standard normal quantile of 0.99, used to turn p50/p99 into a lognormal sigma.
+Z_99 = 2.3263
+
+ERROR_MESSAGES = {
+    'INSUFFICIENT_FUNDS': 'Payment failed due to insufficient funds',
+    'PAYMENT_DECLINED': 'Payment declined by the provider',
+    'PROVIDER_UNAVAILABLE': 'Payment provider is unavailable',
+    'GATEWAY_TIMEOUT': 'Payment gateway did not respond in time',
+    'GATEWAY_BUSY': 'Payment gateway is at capacity',
+    'GATEWAY_ERROR': 'Payment gateway returned an invalid response',
+    'HOLD_EXPIRED': 'Wallet hold expired before the payment completed',
+    'MAX_ATTEMPTS_EXCEEDED': 'Payment could not be confirmed after repeated attempts',
+}
+
+DEFAULT_ERROR_WEIGHTS = {
+    'INSUFFICIENT_FUNDS': 5,
+    'PAYMENT_DECLINED': 3,
+    'PROVIDER_UNAVAILABLE': 2,
+}
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def success_response(transaction_id, attempt, latency_ms):
+    return {
+        'status': 'success',
+        'message': 'Payment completed successfully on retry' if attempt > 1 else 'Payment completed successfully',
+        'gateway_txn_id': f"GTW_{transaction_id}_RETRY" if attempt > 1 else f"GTW_{transaction_id}",
+        'latency_ms': latency_ms,
+    }
+
+
+def error_response(error_code, latency_ms):
+    return {
+        'status': 'failed',
+        'message': ERROR_MESSAGES.get(error_code, 'Payment failed'),
+        'error_code': error_code,
+        'latency_ms': latency_ms,
+    }
+
+
+def pending_response():
+    return {'status': 'pending', 'message': 'Payment is being processed'}
+
+
+def unknown_response():
+    return {'status': 'unknown', 'message': 'No charge found for this transaction'}
+
+
+def unavailable_response(error_code, latency_ms):
+    return {**error_response(error_code, latency_ms), 'status': 'unavailable'}
+
+
+class SimulatedGateway:
+    """
+    In-process gateway with seeded outcomes and lognormal latency.
+
+    ``latency_p50_ms`` / ``latency_p99_ms`` shape the latency distribution;
+    a draw above ``timeout_ms`` waits the full timeout and fails with
+    ``GATEWAY_TIMEOUT``. Failures pick an error code from ``error_weights``.
+    ``max_concurrency`` caps in-flight charges (0 means unlimited); a charge
+    that cannot get a slot within ``timeout_ms`` fails with ``GATEWAY_BUSY``
+    and is not recorded. The latest ``max_recorded`` charges are kept for
+    ``status``, in memory, so they are lost when the process exits.
+    """
+
+    def __init__(self, seed=None, success_rate=0.8, latency_p50_ms=1000, latency_p99_ms=1000,
+                 timeout_ms=10000, max_concurrency=0, error_weights=None, max_recorded=100000):
+        self.seed = seed
+        self.success_rate = success_rate
+        self.timeout_ms = timeout_ms
+        self.mu = math.log(max(latency_p50_ms, 1))
+        self.sigma = max(math.log(max(latency_p99_ms, 1)) - self.mu, 0) / Z_99
+        self.error_codes, self.error_cum_weights = self._cumulative(error_weights or DEFAULT_ERROR_WEIGHTS)
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self.max_recorded = max_recorded
+        self.charges = {}
+        self.charges_lock = threading.Lock()
+
+    @staticmethod
+    def _cumulative(weights):
+        codes, cumulative, total = [], [], 0
+        for code, weight in weights.items():
+            total += weight
+            codes.append(code)
+            cumulative.append(total)
+        return codes, cumulative
+
+    def _rng(self, transaction_id, attempt):
+        if self.seed is None:
+            return random.Random()
+        return random.Random(f"{self.seed}:{transaction_id}:{attempt}")
+
+    def plan(self, transaction_id, attempt=1):
+        """The ``(latency_ms, error_code or None)`` this charge will have, without waiting."""
+        rng = self._rng(transaction_id, attempt)
+        latency_ms = round(math.exp(rng.gauss(self.mu, self.sigma)) if self.sigma else math.exp(self.mu))
+        if latency_ms > self.timeout_ms:
+            return self.timeout_ms, 'GATEWAY_TIMEOUT'
+        if rng.random() < self.success_rate:
+            return latency_ms, None
+        return latency_ms, rng.choices(self.error_codes, cum_weights=self.error_cum_weights)[0]
+
+    def charge(self, transaction_id, amount, attempt=1):
+        latency_ms, error_code = self.plan(transaction_id, attempt)
+        if self.slots is not None:
+            started = time.monotonic()
+            if not self.slots.acquire(timeout=self.timeout_ms / 1000):
+                return error_response('GATEWAY_BUSY', round((time.monotonic() - started) * 1000))
+        self._record(transaction_id, pending_response())
+        try:
+            time.sleep(latency_ms / 1000)
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+        if error_code:
+            response = error_response(error_code, latency_ms)
+        else:
+            response = success_response(transaction_id, attempt, latency_ms)
+        self._record(transaction_id, response)
+        return response
+
+    def _record(self, transaction_id, response):
+        with self.charges_lock:
+            self.charges.pop(transaction_id, None)
+            self.charges[transaction_id] = response
+            if len(self.charges) > self.max_recorded:
+                # Dicts keep insertion order: drop the oldest charge.
+                del self.charges[next(iter(self.charges))]
+
+    def status(self, transaction_id):
+        with self.charges_lock:
+            response = self.charges.get(transaction_id)
+        return dict(response) if response is not None else unknown_response()
+
+
+class HttpGateway:
+    """
+    Gateway reached over HTTP, e.g. ``run_gateway_simulator`` on another port or host.
+
+    Charges are POSTed to ``url``; ``status`` GETs ``status_url`` (by default
+    ``url`` with its last path segment replaced by ``status``).
+    """
+
+    def __init__(self, url, timeout_ms=10000, status_url=None):
+        self.url = url
+        self.status_url = status_url or f"{url.rsplit('/', 1)[0]}/status"
+        self.timeout_ms = timeout_ms
+
+    def charge(self, transaction_id, amount, attempt=1):
+        body = json.dumps({'transaction_id': transaction_id, 'amount': str(amount), 'attempt': attempt}).encode()
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        started = time.monotonic()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_ms / 1000) as response:
+                return json.loads(response.read())
+        except TimeoutError:
+            return error_response('GATEWAY_TIMEOUT', round((time.monotonic() - started) * 1000))
+        except urllib.error.URLError as e:
+            code = 'GATEWAY_TIMEOUT' if isinstance(e.reason, TimeoutError) else 'PROVIDER_UNAVAILABLE'
+            return error_response(code, round((time.monotonic() - started) * 1000))
+        except ValueError:
+            return error_response('GATEWAY_ERROR', round((time.monotonic() - started) * 1000))
+
+    def status(self, transaction_id):
+        url = f"{self.status_url}?{urllib.parse.urlencode({'transaction_id': transaction_id})}"
+        started = time.monotonic()
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout_ms / 1000) as response:
+                return json.loads(response.read())
+        except TimeoutError:
+            return unavailable_response('GATEWAY_TIMEOUT', round((time.monotonic() - started) * 1000))
+        except urllib.error.URLError as e:
+            code = 'GATEWAY_TIMEOUT' if isinstance(e.reason, TimeoutError) else 'PROVIDER_UNAVAILABLE'
+            return unavailable_response(code, round((time.monotonic() - started) * 1000))
+        except ValueError:
+            return unavailable_response('GATEWAY_ERROR', round((time.monotonic() - started) * 1000))
+
+
+def build_gateway(config):
+    return import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+
+
+def get_gateway():
+    """The configured gateway, built once per process so its concurrency limit is shared."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = build_gateway(settings.PAYMENT_GATEWAY)
+    return _gateway
+
+
+def charge(transaction_id, amount, attempt=1):
+    return get_gateway().charge(transaction_id, Decimal(amount), attempt)
+
+
+def status(transaction_id):
+    return get_gateway().status(transaction_id)
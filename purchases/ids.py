@@ -0,0 +1,79 @@
+"""
+Time-ordered transaction ids for plan purchases.
+
+An id is ``TXN-`` followed by 18 Crockford base32 characters encoding, from
+the most significant bits down:
+
+* 48 bits: milliseconds since the Unix epoch
+* 24 bits: node id, drawn at random per process (or ``PURCHASE_ID_NODE``)
+* 16 bits: sequence within the millisecond on this node
+
+Fixed-width base32 sorts like the number it encodes, so ids sort by creation
+time and new rows land at the right-hand end of the unique index. Processes
+need no coordination: two of them only collide if they draw the same node id
+and issue the same sequence number in the same millisecond.
+"""
+import os
+import secrets
+import threading
+import time
+
+from django.conf import settings
+
+PREFIX = 'TXN-'
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+NODE_BITS = 24
+SEQUENCE_BITS = 16
+ID_LENGTH = 18  # ceil((48 + NODE_BITS + SEQUENCE_BITS) / 5)
+
+_lock = threading.Lock()
+_state = {'pid': None, 'node': None, 'last_ms': 0, 'sequence': 0}
+
+
+def _encode(number):
+    chars = []
+    for _ in range(ID_LENGTH):
+        number, remainder = divmod(number, 32)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def _node():
+    configured = settings.PURCHASE_ID_NODE
+    if configured is not None:
+        return configured % (1 << NODE_BITS)
+    return secrets.randbits(NODE_BITS)
+
+
+def transaction_id():
+    with _lock:
+        # A forked worker must not share its parent's node id and sequence.
+        if _state['pid'] != os.getpid():
+            _state.update(pid=os.getpid(), node=_node(), last_ms=0, sequence=0)
+
+        now_ms = time.time_ns() // 1_000_000
+        # If the clock steps back, keep counting from the last millisecond used.
+        if now_ms <= _state['last_ms']:
+            now_ms = _state['last_ms']
+            _state['sequence'] += 1
+            if _state['sequence'] >> SEQUENCE_BITS:
+                # Sequence exhausted for this millisecond: borrow the next one.
+                now_ms += 1
+                _state['sequence'] = 0
+        else:
+            _state['sequence'] = 0
+        _state['last_ms'] = now_ms
+
+        value = (now_ms << (NODE_BITS + SEQUENCE_BITS)) | (_state['node'] << SEQUENCE_BITS) | _state['sequence']
+    return PREFIX + _encode(value)
+
+
+def created_at_ms(txn_id):
+    """Milliseconds since the epoch encoded in an id from ``transaction_id``, or None for older ids."""
+    body = txn_id[len(PREFIX):]
+    if not txn_id.startswith(PREFIX) or len(body) != ID_LENGTH or any(char not in ALPHABET for char in body):
+        return None
+    value = 0
+    for char in body:
+        value = value * 32 + ALPHABET.index(char)
+    return value >> (NODE_BITS + SEQUENCE_BITS)
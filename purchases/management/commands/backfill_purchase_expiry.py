@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from purchases.models import PlanPurchase
+
+
+class Command(BaseCommand):
+    help = 'Fill in expires_at for successful purchases completed before it was stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Purchases updated per transaction (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        last_id = 0
+        updated = 0
+        while True:
+            # Walk the primary key so each batch is an index range scan and
+            # rows that cannot get an expiry are not revisited.
+            rows = list(
+                PlanPurchase.objects.filter(
+                    pk__gt=last_id,
+                    payment_status='success',
+                    completed_at__isnull=False,
+                    expires_at__isnull=True,
+                )
+                .order_by('pk')
+                .values_list('pk', 'completed_at', 'plan__validity')[:options['batch_size']]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            purchases = [
+                PlanPurchase(pk=pk, expires_at=PlanPurchase.expiry_for(completed_at, validity))
+                for pk, completed_at, validity in rows
+            ]
+            purchases = [purchase for purchase in purchases if purchase.expires_at]
+            with transaction.atomic():
+                PlanPurchase.objects.bulk_update(purchases, ['expires_at'])
+            updated += len(purchases)
+            self.stdout.write(f'Backfilled {updated} purchases (up to id {last_id})')
+        self.stdout.write(self.style.SUCCESS(f'Done: {updated} purchases now have expires_at'))
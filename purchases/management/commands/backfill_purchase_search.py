@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from plans.models import Plans
+from purchases.models import PlanPurchase
+
+
+class Command(BaseCommand):
+    help = 'Build the search tokens of every plan and fill in phone_reversed for existing purchases'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Purchases updated per transaction (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        plans = 0
+        for plan in Plans.objects.select_related('provider').iterator():
+            plan.update_search_tokens()
+            plans += 1
+        self.stdout.write(f'Indexed {plans} plans')
+
+        last_id = 0
+        updated = 0
+        while True:
+            rows = list(
+                PlanPurchase.objects.filter(pk__gt=last_id, phone_reversed='')
+                .order_by('pk')
+                .values_list('pk', 'phone_number')[:options['batch_size']]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            purchases = [
+                PlanPurchase(pk=pk, phone_reversed=PlanPurchase.reversed_phone(phone_number))
+                for pk, phone_number in rows
+            ]
+            with transaction.atomic():
+                PlanPurchase.objects.bulk_update(purchases, ['phone_reversed'])
+            updated += len(purchases)
+            self.stdout.write(f'Backfilled {updated} purchases (up to id {last_id})')
+        self.stdout.write(self.style.SUCCESS(f'Done: {updated} purchases now have phone_reversed'))
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+import time
+
+from purchases import rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold hourly revenue rollup buckets older than --keep-days into daily buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=settings.PURCHASE_ROLLUP_HOURLY_DAYS,
+            help='Days of hourly buckets to keep (default: PURCHASE_ROLLUP_HOURLY_DAYS, at least 1)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, compacting every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=3600,
+            help='Seconds between passes with --loop (default: 3600)',
+        )
+
+    def handle(self, *args, **options):
+        # Today's buckets are still being written to, so they are never compacted.
+        keep_days = max(options['keep_days'], 1)
+        while True:
+            days = rollups.compact(timezone.now() - timedelta(days=keep_days))
+            self.stdout.write(f'Compacted {days} days of hourly buckets')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
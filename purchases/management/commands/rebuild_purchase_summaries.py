@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from concurrent.futures import ThreadPoolExecutor
+
+from purchases import summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute every purchase summary from the purchases themselves, in parallel chunks of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Users recomputed per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Chunks recomputed at once (default: 4)',
+        )
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='summaries') as pool:
+            results = pool.map(self.rebuild_chunk, self.user_chunks(options['chunk_size']))
+            users = rows = 0
+            for chunk_users, chunk_rows in results:
+                users += chunk_users
+                rows += chunk_rows
+                self.stdout.write(f'Rebuilt {users} users')
+        self.stdout.write(self.style.SUCCESS(f'Done: {users} users, {rows} provider summaries'))
+
+    def user_chunks(self, chunk_size):
+        # Walk the user primary key so each chunk is an index range scan.
+        users = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+        last_id = 0
+        while True:
+            chunk = list(users.filter(pk__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+            yield chunk
+
+    def rebuild_chunk(self, user_ids):
+        close_old_connections()
+        try:
+            return len(user_ids), summaries.rebuild(user_ids)
+        finally:
+            connection.close()
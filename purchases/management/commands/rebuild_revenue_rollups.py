@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from purchases import rollups
+from purchases.models import PlanPurchase
+
+
+class Command(BaseCommand):
+    help = 'Recount revenue rollup buckets from the purchases themselves, then compact days older than PURCHASE_ROLLUP_HOURLY_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start-date',
+            type=date.fromisoformat,
+            help='First day to rebuild, YYYY-MM-DD (default: the day of the oldest purchase)',
+        )
+        parser.add_argument(
+            '--end-date',
+            type=date.fromisoformat,
+            help='Last day to rebuild, YYYY-MM-DD (default: today)',
+        )
+
+    def handle(self, *args, **options):
+        end_date = options['end_date'] or timezone.localdate()
+        start_date = options['start_date']
+        if start_date is None:
+            oldest = PlanPurchase.objects.aggregate(oldest=Min('created_at'))['oldest']
+            if oldest is None:
+                self.stdout.write('No purchases to count')
+                return
+            start_date = timezone.localtime(oldest).date()
+        if start_date > end_date:
+            raise CommandError('--start-date must not be after --end-date')
+
+        days = rollups.rebuild(start_date, end_date)
+        self.stdout.write(f'Rebuilt {days} days of buckets')
+        compacted = rollups.compact(timezone.now() - timedelta(days=max(settings.PURCHASE_ROLLUP_HOURLY_DAYS, 1)))
+        self.stdout.write(self.style.SUCCESS(f'Done: compacted {compacted} days of hourly buckets'))
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import urllib.parse
+
+from purchases.gateway import SimulatedGateway
+
+
+class Command(BaseCommand):
+    help = 'Serve the simulated payment gateway over HTTP for purchases.gateway.HttpGateway'
+
+    def add_arguments(self, parser):
+        simulator = settings.PAYMENT_GATEWAY_SIMULATOR
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (default: 127.0.0.1)')
+        parser.add_argument('--port', type=int, default=8089, help='Port to listen on (default: 8089)')
+        parser.add_argument('--seed', default=simulator['seed'], help='Seed for reproducible outcomes and latencies')
+        parser.add_argument('--success-rate', type=float, default=simulator['success_rate'])
+        parser.add_argument('--p50', type=int, default=simulator['latency_p50_ms'], help='Median latency in ms')
+        parser.add_argument('--p99', type=int, default=simulator['latency_p99_ms'], help='99th percentile latency in ms')
+        parser.add_argument('--timeout', type=int, default=simulator['timeout_ms'], help='Charges slower than this time out (ms)')
+        parser.add_argument(
+            '--max-concurrency',
+            type=int,
+            default=simulator['max_concurrency'],
+            help='Charges processed at once; 0 means unlimited',
+        )
+
+    def handle(self, *args, **options):
+        gateway = SimulatedGateway(
+            seed=options['seed'],
+            success_rate=options['success_rate'],
+            latency_p50_ms=options['p50'],
+            latency_p99_ms=options['p99'],
+            timeout_ms=options['timeout'],
+            max_concurrency=options['max_concurrency'],
+        )
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                    result = gateway.charge(body['transaction_id'], body['amount'], int(body.get('attempt', 1)))
+                    status, payload = 200, result
+                except (ValueError, KeyError):
+                    status, payload = 400, {'error': 'Expected JSON with transaction_id, amount and attempt'}
+                self.respond(status, payload)
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                transaction_id = urllib.parse.parse_qs(url.query).get('transaction_id')
+                if url.path.rstrip('/').rsplit('/', 1)[-1] != 'status':
+                    self.respond(404, {'error': 'Not found'})
+                elif not transaction_id:
+                    self.respond(400, {'error': 'Expected ?transaction_id='})
+                else:
+                    self.respond(200, gateway.status(transaction_id[0]))
+
+            def respond(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options['host'], options['port']), Handler)
+        self.stdout.write(
+            f"Gateway simulator listening on http://{options['host']}:{options['port']}/charge and /status "
+            f"(p50={options['p50']}ms p99={options['p99']}ms success_rate={options['success_rate']} seed={options['seed']})"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from purchases import pipeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Requeue purchases stuck in pending/processing with backoff and settle them from the gateway\'s '
+        'status, charging only those it has no record of; fail them after too many attempts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Stale purchases claimed per batch (default: 100)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.PURCHASE_WORKERS,
+            help='Requeued purchases recovered at once (default: PURCHASE_WORKERS)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, sweeping every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=30,
+            help='Seconds between passes with --loop (default: 30)',
+        )
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='sweep') as pool:
+            while True:
+                self.sweep(pool, options['batch_size'])
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+    def sweep(self, pool, batch_size):
+        requeued = failed = skipped = 0
+        while True:
+            batch = pipeline.stale_purchases(batch_size)
+            claimed = []
+            for purchase in batch:
+                outcome = pipeline.requeue_stale(purchase)
+                if outcome == 'requeued':
+                    claimed.append(purchase.pk)
+                elif outcome == 'failed':
+                    failed += 1
+                else:
+                    skipped += 1
+            # Wait for this batch so the next query does not see it again half-processed.
+            list(pool.map(pipeline.run_recovery, claimed))
+            requeued += len(claimed)
+            if len(batch) < batch_size:
+                break
+        self.stdout.write(f'Requeued {requeued} purchases, failed {failed}, skipped {skipped} claimed elsewhere')
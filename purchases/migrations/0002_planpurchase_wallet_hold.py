@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0001_initial'),
+        ('wallet', '0009_wallet_held_amount_wallethold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planpurchase',
+            name='wallet_hold',
+            field=models.OneToOneField(blank=True, help_text="Funds held on the buyer's wallet while a wallet payment is pending", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchase', to='wallet.wallethold'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0002_planpurchase_wallet_hold'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='planpurchase',
+            name='payment_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('success', 'Success'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+    ]
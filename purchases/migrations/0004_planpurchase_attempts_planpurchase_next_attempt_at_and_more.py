@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0001_initial'),
+        ('purchases', '0003_alter_planpurchase_payment_status'),
+        ('wallet', '0009_wallet_held_amount_wallethold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planpurchase',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Times the sweeper has requeued this purchase'),
+        ),
+        migrations.AddField(
+            model_name='planpurchase',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text='The sweeper leaves the purchase alone until then', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='planpurchase',
+            index=models.Index(fields=['payment_status', 'updated_at'], name='purchase_status_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0001_initial'),
+        ('purchases', '0005_purchasebatch_planpurchase_batch'),
+        ('wallet', '0009_wallet_held_amount_wallethold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planpurchase',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text="completed_at plus the plan's validity; set when the purchase succeeds", null=True),
+        ),
+        migrations.AddIndex(
+            model_name='planpurchase',
+            index=models.Index(fields=['user', 'expires_at'], name='purchase_user_expires_idx'),
+        ),
+    ]
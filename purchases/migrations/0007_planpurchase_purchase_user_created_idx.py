@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0001_initial'),
+        ('purchases', '0006_planpurchase_expires_at_and_more'),
+        ('wallet', '0009_wallet_held_amount_wallethold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='planpurchase',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='purchase_user_created_idx'),
+        ),
+    ]
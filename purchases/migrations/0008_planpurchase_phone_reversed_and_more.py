@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0002_plansearchtoken'),
+        ('purchases', '0007_planpurchase_purchase_user_created_idx'),
+        ('wallet', '0009_wallet_held_amount_wallethold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planpurchase',
+            name='phone_reversed',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Digits of phone_number reversed, so phone suffix searches are index prefix scans', max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='planpurchase',
+            index=models.Index(fields=['user', 'plan', 'created_at'], name='purchase_user_plan_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planpurchase',
+            index=models.Index(fields=['user', 'phone_reversed'], name='purchase_user_phone_rev_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_userprofile_bio_alter_userprofile_profile_picture_and_more'),
+        ('plans', '0002_plansearchtoken'),
+        ('purchases', '0008_planpurchase_phone_reversed_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseSummary',
+            fields=[
+                ('purchase_count', models.PositiveIntegerField(default=0)),
+                ('success_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0, help_text='Purchases currently failed; a retried purchase stops counting')),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, help_text='Sum of successful purchases', max_digits=14)),
+                ('last_recharge_at', models.DateTimeField(blank=True, help_text='Latest completed_at of a successful purchase', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='purchase_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Purchase Summary',
+                'verbose_name_plural': 'Purchase Summaries',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProviderPurchaseSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purchase_count', models.PositiveIntegerField(default=0)),
+                ('success_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0, help_text='Purchases currently failed; a retried purchase stops counting')),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, help_text='Sum of successful purchases', max_digits=14)),
+                ('last_recharge_at', models.DateTimeField(blank=True, help_text='Latest completed_at of a successful purchase', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchase_summaries', to='plans.provider')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='provider_purchase_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Provider Purchase Summary',
+                'verbose_name_plural': 'Provider Purchase Summaries',
+                'constraints': [models.UniqueConstraint(fields=('user', 'provider'), name='provider_summary_user_provider_unique')],
+            },
+        ),
+    ]
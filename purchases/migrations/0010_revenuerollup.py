@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0002_plansearchtoken'),
+        ('purchases', '0009_purchasesummary_providerpurchasesummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('status', models.CharField(help_text='Outcome counted: success or failed', max_length=20)),
+                ('purchase_count', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='plans.plans')),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='plans.provider')),
+            ],
+            options={
+                'verbose_name': 'Revenue Rollup',
+                'verbose_name_plural': 'Revenue Rollups',
+                'indexes': [models.Index(fields=['bucket_start', 'granularity'], name='revenue_rollup_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket_start', 'plan', 'status'), name='revenue_rollup_bucket_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+CHUNK_SIZE = 500
+COUNTERS = ('purchase_count', 'success_count', 'failed_count', 'total_spent')
+
+
+def backfill(apps, schema_editor):
+    """Recompute every purchase summary from existing purchases, a chunk of users at a time."""
+    PlanPurchase = apps.get_model('purchases', 'PlanPurchase')
+    PurchaseSummary = apps.get_model('purchases', 'PurchaseSummary')
+    ProviderPurchaseSummary = apps.get_model('purchases', 'ProviderPurchaseSummary')
+    success = Q(payment_status='success')
+
+    PurchaseSummary.objects.all().delete()
+    ProviderPurchaseSummary.objects.all().delete()
+    user_ids = PlanPurchase.objects.order_by('user_id').values_list('user_id', flat=True).distinct()
+    last_id = 0
+    while True:
+        chunk = list(user_ids.filter(user_id__gt=last_id)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1]
+        rows = (
+            PlanPurchase.objects.filter(user_id__in=chunk)
+            .order_by()
+            .values('user_id', 'plan__provider_id')
+            .annotate(
+                purchase_count=Count('id'),
+                success_count=Count('id', filter=success),
+                failed_count=Count('id', filter=Q(payment_status='failed')),
+                total_spent=Coalesce(Sum('amount', filter=success), Value(Decimal('0'))),
+                last_recharge_at=Max('completed_at', filter=success),
+            )
+        )
+        users = {}
+        providers = []
+        for row in rows:
+            totals = {name: row[name] for name in COUNTERS + ('last_recharge_at',)}
+            providers.append(ProviderPurchaseSummary(user_id=row['user_id'], provider_id=row['plan__provider_id'], **totals))
+            user = users.setdefault(row['user_id'], PurchaseSummary(user_id=row['user_id']))
+            for name in COUNTERS:
+                setattr(user, name, getattr(user, name) + totals[name])
+            if totals['last_recharge_at'] and (user.last_recharge_at is None or totals['last_recharge_at'] > user.last_recharge_at):
+                user.last_recharge_at = totals['last_recharge_at']
+        PurchaseSummary.objects.bulk_create(users.values(), batch_size=1000)
+        ProviderPurchaseSummary.objects.bulk_create(providers, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0010_revenuerollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0011_backfill_purchase_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planpurchase',
+            name='needs_reconciliation',
+            field=models.BooleanField(default=False, help_text='Delivered, but the wallet could not be debited after its hold lapsed'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+CHUNK_SIZE = 2000
+
+
+def reversed_phone(phone_number):
+    # Same as PlanPurchase.reversed_phone; historical models have no methods.
+    return ''.join(char for char in phone_number if char.isdigit())[::-1]
+
+
+def backfill(apps, schema_editor):
+    """Fill in ``phone_reversed`` for purchases made before it existed, a chunk at a time."""
+    PlanPurchase = apps.get_model('purchases', 'PlanPurchase')
+    last_id = 0
+    while True:
+        chunk = list(
+            PlanPurchase.objects.filter(pk__gt=last_id, phone_reversed='')
+            .order_by('pk')
+            .values_list('pk', 'phone_number')[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        PlanPurchase.objects.bulk_update(
+            [PlanPurchase(pk=pk, phone_reversed=reversed_phone(phone_number)) for pk, phone_number in chunk],
+            ['phone_reversed'],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0012_planpurchase_needs_reconciliation'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
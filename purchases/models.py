@@ -1,12 +1,29 @@
 from django.db import models
+from datetime import timedelta
 from django.contrib.auth import get_user_model
-from plans.models import Plans
+from plans.models import Plans, Provider
 
 User = get_user_model()
 
+class PurchaseBatch(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='purchase_batches')
+    payment_method = models.CharField(max_length=50, default='online')
+    item_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Purchase Batch'
+        verbose_name_plural = 'Purchase Batches'
+    
+    def __str__(self):
+        return f"{self.user.email} - batch {self.pk} - {self.item_count} items"
+
 class PlanPurchase(models.Model):
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('processing', 'Processing'),
         ('success', 'Success'),
         ('failed', 'Failed'),
         ('cancelled', 'Cancelled'),
@@ -18,16 +35,121 @@ class PlanPurchase(models.Model):
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
     transaction_id = models.CharField(max_length=100, unique=True)
     phone_number = models.CharField(max_length=15)
+    phone_reversed = models.CharField(max_length=15, blank=True, default='', editable=False, help_text="Digits of phone_number reversed, so phone suffix searches are index prefix scans")
     payment_method = models.CharField(max_length=50, default='online')
     payment_gateway_response = models.JSONField(blank=True, null=True)
+    batch = models.ForeignKey(PurchaseBatch, on_delete=models.SET_NULL, blank=True, null=True, related_name='purchases')
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Times the sweeper has requeued this purchase")
+    next_attempt_at = models.DateTimeField(blank=True, null=True, help_text="The sweeper leaves the purchase alone until then")
+    needs_reconciliation = models.BooleanField(default=False, help_text="Delivered, but the wallet could not be debited after its hold lapsed")
+    wallet_hold = models.OneToOneField('wallet.WalletHold', on_delete=models.SET_NULL, blank=True, null=True, related_name='purchase', help_text="Funds held on the buyer's wallet while a wallet payment is pending")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(blank=True, null=True)
+    expires_at = models.DateTimeField(blank=True, null=True, db_index=True, help_text="completed_at plus the plan's validity; set when the purchase succeeds")
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['payment_status', 'updated_at'], name='purchase_status_updated_idx'),
+            models.Index(fields=['user', 'expires_at'], name='purchase_user_expires_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='purchase_user_created_idx'),
+            models.Index(fields=['user', 'plan', 'created_at'], name='purchase_user_plan_idx'),
+            models.Index(
+                fields=['user', 'phone_reversed'], name='purchase_user_phone_rev_idx',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+        ]
         verbose_name = 'Plan Purchase'
         verbose_name_plural = 'Plan Purchases'
     
     def __str__(self):
         return f"{self.user.email} - {self.plan.title} - {self.payment_status}"
+    
+    def save(self, *args, **kwargs):
+        self.phone_reversed = self.reversed_phone(self.phone_number)
+        super().save(*args, **kwargs)
+    
+    @staticmethod
+    def reversed_phone(phone_number):
+        return ''.join(char for char in phone_number if char.isdigit())[::-1]
+    
+    @staticmethod
+    def expiry_for(completed_at, validity):
+        """When a plan bought at ``completed_at`` runs out, or None for plans without a validity."""
+        if completed_at and validity:
+            return completed_at + timedelta(days=validity)
+        return None
+
+class PurchaseTotals(models.Model):
+    """Counters kept current by ``purchases.summaries`` on every status change."""
+    purchase_count = models.PositiveIntegerField(default=0)
+    success_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0, help_text="Purchases currently failed; a retried purchase stops counting")
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Sum of successful purchases")
+    last_recharge_at = models.DateTimeField(blank=True, null=True, help_text="Latest completed_at of a successful purchase")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        abstract = True
+
+class PurchaseSummary(PurchaseTotals):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='purchase_summary')
+    
+    class Meta:
+        verbose_name = 'Purchase Summary'
+        verbose_name_plural = 'Purchase Summaries'
+    
+    def __str__(self):
+        return f"{self.user.email} - {self.purchase_count} purchases"
+
+class ProviderPurchaseSummary(PurchaseTotals):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='provider_purchase_summaries')
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='purchase_summaries')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'provider'], name='provider_summary_user_provider_unique'),
+        ]
+        verbose_name = 'Provider Purchase Summary'
+        verbose_name_plural = 'Provider Purchase Summaries'
+    
+    def __str__(self):
+        return f"{self.user.email} - {self.provider.title} - {self.purchase_count} purchases"
+
+class RevenueRollup(models.Model):
+    """
+    Completed purchases counted per (provider, plan, status) and time bucket.
+
+    ``purchases.rollups`` adds each completion to its hourly bucket;
+    ``compact_revenue_rollups`` later folds whole days of hourly buckets into
+    one daily bucket. A given hour is only ever in one of the two.
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='revenue_rollups')
+    plan = models.ForeignKey(Plans, on_delete=models.CASCADE, related_name='revenue_rollups')
+    status = models.CharField(max_length=20, help_text="Outcome counted: success or failed")
+    purchase_count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'plan', 'status'], name='revenue_rollup_bucket_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['bucket_start', 'granularity'], name='revenue_rollup_start_idx'),
+        ]
+        verbose_name = 'Revenue Rollup'
+        verbose_name_plural = 'Revenue Rollups'
+    
+    def __str__(self):
+        return f"{self.granularity} {self.bucket_start:%Y-%m-%d %H:%M} - plan {self.plan_id} - {self.status}"
@@ -0,0 +1,43 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.pagination import KeysetPagination
+
+# Full keyset for each ordering purchase_history accepts. created_at, id breaks
+# ties so the order is total; the default ordering is served end to end by the
+# (user, created_at, id) index.
+HISTORY_ORDERINGS = {
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+    '-amount': ('-amount', '-created_at', '-id'),
+    'amount': ('amount', 'created_at', 'id'),
+    'payment_status': ('payment_status', 'created_at', 'id'),
+    '-expires_at': ('-expires_at', '-created_at', '-id'),
+    'expires_at': ('expires_at', 'created_at', 'id'),
+}
+
+# Orderings on a nullable column; cursor pages need a filter that excludes its nulls.
+NULLABLE_ORDERINGS = {'expires_at', '-expires_at'}
+
+
+class PurchaseHistoryPagination(KeysetPagination):
+
+    def __init__(self, ordering='-created_at'):
+        self.ordering = HISTORY_ORDERINGS[ordering]
+
+
+def cached_count(queryset, user_id, params):
+    """
+    ``queryset.count()``, cached per user and filter set for
+    ``PURCHASE_HISTORY_COUNT_CACHE_SECONDS``, so the figure may trail new
+    purchases by that long.
+    """
+    filters = '&'.join(f'{key}={params[key]}' for key in sorted(params))
+    key = f"purchase_history_count:{user_id}:{hashlib.md5(filters.encode()).hexdigest()}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.PURCHASE_HISTORY_COUNT_CACHE_SECONDS)
+    return count
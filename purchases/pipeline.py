@@ -0,0 +1,329 @@
+"""
+Background processing of plan purchases.
+
+The purchase endpoints only insert the ``PlanPurchase`` (and its wallet hold)
+and hand the id to ``submit``; the gateway charge (see ``gateway``) runs on a
+thread pool once the request's transaction has committed, so no web worker
+waits on the gateway.
+Clients follow the purchase with the status endpoint or ``?wait=`` long-poll.
+
+The pool lives in the web process: purchases queued when a process exits stay
+in flight until ``sweep_pending_purchases`` requeues them (``requeue_stale``)
+and settles them from the gateway's record (``recover_purchase``).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from notifications import outbox
+from wallet import ledger
+from wallet.models import Wallet
+from . import gateway, state
+from .models import PlanPurchase
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# How often a long-polling request re-reads the purchase.
+WAIT_POLL_INTERVAL = 0.25
+
+# Slack on top of the gateway timeout for recording a charge's result; a
+# hold with less time than that left is extended before charging.
+HOLD_CHARGE_MARGIN = timedelta(seconds=60)
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PURCHASE_WORKERS,
+                    thread_name_prefix='purchase',
+                )
+    return _executor
+
+
+def submit(purchase_id, retry=False):
+    """Queue the purchase for processing once the current transaction commits."""
+    transaction.on_commit(lambda: executor().submit(run, purchase_id, retry))
+
+
+def submit_batch(purchase_ids):
+    """
+    Queue a batch of purchases once the current transaction commits.
+
+    The batch takes one slot of the shared pool and charges its purchases
+    ``PURCHASE_BATCH_PARALLELISM`` at a time, so a large batch cannot starve
+    single purchases of workers.
+    """
+    transaction.on_commit(lambda: executor().submit(_run_batch, list(purchase_ids)))
+
+
+def _run_batch(purchase_ids):
+    with ThreadPoolExecutor(max_workers=settings.PURCHASE_BATCH_PARALLELISM, thread_name_prefix='purchase-batch') as pool:
+        list(pool.map(run, purchase_ids))
+
+
+def run(purchase_id, retry=False):
+    """``process_purchase`` for a worker thread: manages the thread's database connection and logs failures."""
+    _run_in_thread(process_purchase, purchase_id, retry)
+
+
+def run_recovery(purchase_id):
+    """``recover_purchase`` for a worker thread."""
+    _run_in_thread(recover_purchase, purchase_id)
+
+
+def _run_in_thread(process, purchase_id, *args):
+    close_old_connections()
+    try:
+        process(purchase_id, *args)
+    except Exception:
+        logger.exception("Processing purchase %s failed", purchase_id)
+    finally:
+        connection.close()
+
+
+def _pending_purchase(purchase_id):
+    return (
+        PlanPurchase.objects.select_related('user', 'plan', 'wallet_hold__wallet')
+        .filter(pk=purchase_id, payment_status='pending')
+        .first()
+    )
+
+
+def _claim(purchase, retry):
+    """
+    Move a pending purchase to processing. Returns False if another worker
+    got there first (or the purchase was failed for want of funds).
+
+    A wallet purchase's hold is extended in the same transaction when it
+    would expire before the charge's result can be recorded.
+    """
+    hold = purchase.wallet_hold
+    if purchase.payment_method != 'wallet':
+        return state.transition(purchase, 'processing', from_status='pending')
+    if hold is not None and hold.status == 'active':
+        charge_window = timedelta(milliseconds=settings.PAYMENT_GATEWAY_TIMEOUT_MS) + HOLD_CHARGE_MARGIN
+        try:
+            with transaction.atomic():
+                if hold.expires_at <= timezone.now() + charge_window:
+                    ledger.extend(hold, ttl=max(settings.WALLET_HOLD_TTL_SECONDS, charge_window.total_seconds()))
+                won = state.transition(purchase, 'processing', from_status='pending')
+                if not won:
+                    transaction.set_rollback(True)
+                return won
+        except ledger.HoldNotActive:
+            pass
+    # The hold lapsed while the purchase waited (e.g. across requeues), so
+    # the funds are no longer reserved: hold them again before charging.
+    return _claim_with_new_hold(purchase, retry) is not None
+
+
+def process_purchase(purchase_id, retry=False):
+    """Run the payment step for a pending purchase and record the outcome."""
+    purchase = _pending_purchase(purchase_id)
+    if purchase is None or not _claim(purchase, retry):
+        return None
+    response = gateway.charge(purchase.transaction_id, purchase.amount, attempt=2 if retry else 1)
+    return _record_result(purchase, response, retry)
+
+
+def recover_purchase(purchase_id):
+    """
+    Settle a purchase requeued by the sweeper from the gateway's record of it.
+
+    A charge the gateway completed or declined is recorded without charging
+    again. One still in progress, or a gateway that cannot be asked, leaves the
+    purchase pending for a later sweep. Only a transaction the gateway has
+    never seen is charged.
+    """
+    purchase = _pending_purchase(purchase_id)
+    if purchase is None:
+        return None
+    response = gateway.status(purchase.transaction_id)
+    if response['status'] == 'unknown':
+        return process_purchase(purchase_id)
+    if response['status'] not in ('success', 'failed') or not _claim(purchase, retry=False):
+        return None
+    return _record_result(purchase, response, retry=False)
+
+
+def _record_result(purchase, response, retry):
+    """Capture or release the purchase's hold and move it to success/failed per the gateway ``response``."""
+    hold = purchase.wallet_hold if purchase.payment_method == 'wallet' else None
+    payment_success = response['status'] == 'success'
+    unpaid = False
+    with transaction.atomic():
+        if payment_success and hold is not None:
+            try:
+                ledger.capture(hold)
+            except ledger.HoldNotActive:
+                # The hold was released while the charge was in flight, but
+                # the recharge went through: take the payment directly.
+                unpaid = not _debit_without_hold(purchase, hold)
+        elif hold is not None:
+            try:
+                ledger.release(hold)
+            except ledger.HoldNotActive:
+                pass
+
+        completed_at = timezone.now() if payment_success else None
+        won = state.transition(
+            purchase,
+            'success' if payment_success else 'failed',
+            from_status='processing',
+            payment_gateway_response=response,
+            completed_at=completed_at,
+            expires_at=PlanPurchase.expiry_for(completed_at, purchase.plan.validity),
+            needs_reconciliation=unpaid,
+        )
+        if not won:
+            # Settled elsewhere meanwhile; undo the hold capture/release too.
+            transaction.set_rollback(True)
+            return None
+        if not retry:
+            _notify(purchase)
+    return purchase
+
+
+def _debit_without_hold(purchase, hold):
+    """
+    Debit a delivered purchase's amount from the wallet after its hold lapsed.
+
+    Returns False if the wallet can no longer cover it; the caller flags the
+    purchase ``needs_reconciliation`` for the payment to be settled by hand.
+    """
+    try:
+        ledger.debit(hold.wallet, purchase.amount, created_by=purchase.user, description=hold.description)
+    except ledger.InsufficientBalance:
+        logger.error("Purchase %s was delivered but wallet %s cannot cover it", purchase.pk, hold.wallet_id)
+        return False
+    return True
+
+
+def _claim_with_new_hold(purchase, retry):
+    """
+    Claim a wallet purchase whose hold is no longer active, reserving its
+    funds again in the same transaction as the claim.
+
+    If the wallet cannot cover the amount any more the purchase fails with
+    ``HOLD_EXPIRED`` without being charged. Returns the new hold, or ``None``
+    if the purchase was failed or claimed by someone else.
+    """
+    wallet = purchase.wallet_hold.wallet if purchase.wallet_hold else Wallet.objects.filter(user_id=purchase.user_id).first()
+    if wallet is not None:
+        try:
+            with transaction.atomic():
+                hold = ledger.reserve(
+                    wallet, purchase.amount, created_by=purchase.user, reference=purchase.transaction_id,
+                    description=f"Recharge {purchase.plan.title} for {purchase.phone_number}"
+                )
+                if not state.transition(purchase, 'processing', from_status='pending', wallet_hold=hold):
+                    transaction.set_rollback(True)
+                    return None
+                return hold
+        except ledger.InsufficientBalance:
+            pass
+
+    with transaction.atomic():
+        if state.transition(
+            purchase, 'failed',
+            from_status='pending',
+            payment_gateway_response=gateway.error_response('HOLD_EXPIRED', None),
+        ) and not retry:
+            _notify(purchase)
+    return None
+
+
+def _notify(purchase):
+    outbox.enqueue(
+        'RECHARGE_SUCCESS' if purchase.payment_status == 'success' else 'RECHARGE_FAILED',
+        purchase.user_id,
+        related_id=purchase.id,
+    )
+
+
+def backoff_delay(attempts):
+    """Seconds before a purchase requeued ``attempts`` times is looked at again: doubling, capped, half jittered."""
+    delay = min(settings.PURCHASE_RETRY_MAX_SECONDS, settings.PURCHASE_RETRY_BASE_SECONDS * 2 ** attempts)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def stale_purchases(limit):
+    """In-flight purchases untouched for ``PURCHASE_STALE_SECONDS`` whose backoff has elapsed, oldest first."""
+    now = timezone.now()
+    return list(
+        PlanPurchase.objects.select_related('user', 'plan', 'wallet_hold__wallet')
+        .filter(
+            payment_status__in=state.IN_FLIGHT,
+            updated_at__lt=now - timedelta(seconds=settings.PURCHASE_STALE_SECONDS),
+        )
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+        .order_by('updated_at')[:limit]
+    )
+
+
+def requeue_stale(purchase):
+    """
+    Put a stale purchase back to ``pending`` for another attempt, or fail it
+    once ``PURCHASE_MAX_ATTEMPTS`` is reached.
+
+    The transition is conditional on the ``updated_at`` the sweeper read, so
+    when several sweepers see the same purchase only one claims it. Returns
+    ``'requeued'``, ``'failed'`` or ``None`` if someone else got there first.
+    """
+    if purchase.attempts >= settings.PURCHASE_MAX_ATTEMPTS:
+        with transaction.atomic():
+            won = state.transition(
+                purchase, 'failed',
+                expected_updated_at=purchase.updated_at,
+                payment_gateway_response=gateway.error_response('MAX_ATTEMPTS_EXCEEDED', None),
+            )
+            if not won:
+                return None
+            hold = purchase.wallet_hold
+            if hold is not None and hold.status == 'active':
+                try:
+                    ledger.release(hold)
+                except ledger.HoldNotActive:
+                    pass
+            _notify(purchase)
+        return 'failed'
+
+    won = state.transition(
+        purchase, 'pending',
+        expected_updated_at=purchase.updated_at,
+        attempts=purchase.attempts + 1,
+        next_attempt_at=timezone.now() + timedelta(seconds=backoff_delay(purchase.attempts)),
+    )
+    return 'requeued' if won else None
+
+
+def wait_for_result(queryset, pk, timeout):
+    """
+    Re-read the purchase until it is settled or ``timeout`` seconds pass.
+
+    ``timeout`` is capped at ``PURCHASE_WAIT_MAX_SECONDS``; a non-finite one waits not at all. Returns the latest
+    row, or ``None`` if it does not exist.
+    """
+    if not math.isfinite(timeout):
+        timeout = 0
+    deadline = time.monotonic() + min(max(timeout, 0), settings.PURCHASE_WAIT_MAX_SECONDS)
+    while True:
+        purchase = queryset.filter(pk=pk).first()
+        if purchase is None or purchase.payment_status not in state.IN_FLIGHT or time.monotonic() >= deadline:
+            return purchase
+        time.sleep(WAIT_POLL_INTERVAL)
@@ -0,0 +1,177 @@
+"""
+Revenue rollups for reporting.
+
+Each purchase completion (a move to ``success`` or ``failed``) adds one to the
+hourly ``RevenueRollup`` bucket of its plan and outcome, in the same
+transaction as the status change. ``compact`` folds hourly buckets older than
+a cutoff into daily ones, so the table grows by days rather than hours.
+``report`` sums buckets over a date range; it never reads ``PlanPurchase``.
+``rebuild`` recomputes the buckets of a range of days from ``PlanPurchase``,
+for history written before the rollups existed or to repair them.
+
+Completions are events: a purchase that fails and then succeeds on retry
+counts once in each status. Buckets follow the project time zone, so a daily
+bucket is a calendar day there.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import PlanPurchase, RevenueRollup
+
+OUTCOMES = ('success', 'failed')
+GROUP_FIELDS = {
+    'provider': ('provider_id', 'provider__title'),
+    'plan': ('plan_id', 'plan__title'),
+    'day': ('day',),
+}
+
+
+def hour_bucket(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(day):
+    """Midnight at the start of ``day`` (a date) in the project time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _add(lookup, count, amount):
+    values = {'purchase_count': F('purchase_count') + count, 'amount': F('amount') + amount, 'updated_at': timezone.now()}
+    if RevenueRollup.objects.filter(**lookup).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            RevenueRollup.objects.create(**lookup, purchase_count=count, amount=amount)
+    except IntegrityError:
+        # Someone else created the bucket first.
+        RevenueRollup.objects.filter(**lookup).update(**values)
+
+
+def record_completion(purchase, outcome, completed_at):
+    """Count ``purchase`` (its ``plan`` must be loaded) in the hourly bucket of ``completed_at``."""
+    _add(
+        {
+            'granularity': 'hour',
+            'bucket_start': hour_bucket(completed_at),
+            'provider_id': purchase.plan.provider_id,
+            'plan_id': purchase.plan_id,
+            'status': outcome,
+        },
+        1,
+        purchase.amount,
+    )
+
+
+def compact(before):
+    """
+    Fold the hourly buckets of every whole day before ``before`` into daily
+    buckets, one transaction per day. Returns the number of days compacted.
+    """
+    cutoff = day_start(timezone.localtime(before).date())
+    hourly = RevenueRollup.objects.filter(granularity='hour', bucket_start__lt=cutoff)
+    days = 0
+    while True:
+        oldest = hourly.order_by('bucket_start').values_list('bucket_start', flat=True).first()
+        if oldest is None:
+            return days
+        day = day_start(timezone.localtime(oldest).date())
+        with transaction.atomic():
+            rows = list(
+                hourly.select_for_update()
+                .filter(bucket_start__gte=day, bucket_start__lt=day + timedelta(days=1))
+                .order_by('pk')
+            )
+            totals = {}
+            for row in rows:
+                key = (row.provider_id, row.plan_id, row.status)
+                count, amount = totals.get(key, (0, 0))
+                totals[key] = (count + row.purchase_count, amount + row.amount)
+            for (provider_id, plan_id, outcome), (count, amount) in totals.items():
+                _add(
+                    {
+                        'granularity': 'day',
+                        'bucket_start': day,
+                        'provider_id': provider_id,
+                        'plan_id': plan_id,
+                        'status': outcome,
+                    },
+                    count,
+                    amount,
+                )
+            RevenueRollup.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        days += 1
+
+
+def rebuild(start_date, end_date):
+    """
+    Replace the buckets of the days ``start_date`` to ``end_date`` (inclusive)
+    with hourly buckets recounted from ``PlanPurchase``, one transaction per
+    day. Returns the number of days rebuilt.
+
+    Only current statuses are known, so each completed purchase counts once,
+    at its last status change; an earlier failure that was retried into a
+    success is not counted again. Completions committed while a day is being
+    recounted are added on top of the recount, as usual.
+    """
+    days = 0
+    day = start_date
+    while day <= end_date:
+        start, end = day_start(day), day_start(day + timedelta(days=1))
+        with transaction.atomic():
+            RevenueRollup.objects.filter(bucket_start__gte=start, bucket_start__lt=end).delete()
+            rows = (
+                PlanPurchase.objects.filter(payment_status__in=OUTCOMES, updated_at__gte=start, updated_at__lt=end)
+                .annotate(bucket_start=TruncHour('updated_at', tzinfo=timezone.get_current_timezone()))
+                .values('bucket_start', 'plan__provider_id', 'plan_id', 'payment_status')
+                .annotate(count=Count('id'), total=Sum('amount'))
+                .order_by()
+            )
+            RevenueRollup.objects.bulk_create([
+                RevenueRollup(
+                    granularity='hour',
+                    bucket_start=row['bucket_start'],
+                    provider_id=row['plan__provider_id'],
+                    plan_id=row['plan_id'],
+                    status=row['payment_status'],
+                    purchase_count=row['count'],
+                    amount=row['total'],
+                )
+                for row in rows
+            ], batch_size=1000)
+        day += timedelta(days=1)
+        days += 1
+    return days
+
+
+def report(start_date, end_date, group_by=('provider',)):
+    """
+    Counts and revenue for the days ``start_date`` to ``end_date`` (inclusive),
+    one row per combination of ``group_by`` keys (see ``GROUP_FIELDS``).
+    """
+    success = Q(status='success')
+    fields = [field for key in group_by for field in GROUP_FIELDS[key]]
+    buckets = RevenueRollup.objects.filter(
+        bucket_start__gte=day_start(start_date),
+        bucket_start__lt=day_start(end_date + timedelta(days=1)),
+    )
+    if 'day' in group_by:
+        buckets = buckets.annotate(day=TruncDate('bucket_start', tzinfo=timezone.get_current_timezone()))
+    rows = (
+        buckets.values(*fields)
+        .annotate(
+            success_count=Sum('purchase_count', filter=success, default=0),
+            failed_count=Sum('purchase_count', filter=Q(status='failed'), default=0),
+            revenue=Sum('amount', filter=success, default=0),
+        )
+        .order_by(*fields)
+    )
+    results = []
+    for row in rows:
+        completed = row['success_count'] + row['failed_count']
+        row['success_rate'] = round(row['success_count'] / completed, 4) if completed else None
+        results.append(row)
+    return results
@@ -0,0 +1,53 @@
+"""
+Purchase search for purchase_history.
+
+Every branch is an index lookup rather than a substring scan:
+
+* a transaction id is matched exactly on the unique ``transaction_id`` index;
+* each query word is prefix-matched against ``PlanSearchToken`` (the words of
+  plan and provider titles), and purchases are then filtered by plan through
+  the ``(user, plan, created_at)`` index;
+* a query of digits is also matched as a phone number suffix, i.e. as a
+  prefix of ``phone_reversed`` on the ``(user, phone_reversed)`` index.
+"""
+import re
+
+from django.db.models import Q
+
+from plans.models import PlanSearchToken, search_tokens
+from .ids import PREFIX
+from .models import PlanPurchase
+
+TRANSACTION_ID_RE = re.compile(rf'^{PREFIX}[0-9a-z]+$', re.IGNORECASE)
+PHONE_SEPARATORS_RE = re.compile(r'[\s()+-]')
+# Shorter digit strings would match a large share of any user's purchases.
+MIN_PHONE_SUFFIX_DIGITS = 3
+
+
+def matching_plan_ids(words):
+    """Ids of plans whose title or provider has a word starting with each of ``words``."""
+    plan_ids = None
+    for word in words:
+        matches = set(PlanSearchToken.objects.filter(token__startswith=word).values_list('plan_id', flat=True))
+        plan_ids = matches if plan_ids is None else plan_ids & matches
+        if not plan_ids:
+            break
+    return plan_ids or set()
+
+
+def filter_purchases(queryset, query):
+    query = query.strip()
+    if TRANSACTION_ID_RE.match(query):
+        # Current ids are upper case, older ones lower-case hex.
+        body = query[len(PREFIX):]
+        return queryset.filter(transaction_id__in={query, PREFIX + body.upper(), PREFIX + body.lower()})
+
+    words = search_tokens(query)
+    if not words:
+        return queryset.none()
+    condition = Q(plan_id__in=matching_plan_ids(words))
+
+    digits = PHONE_SEPARATORS_RE.sub('', query)
+    if digits.isdigit() and len(digits) >= MIN_PHONE_SUFFIX_DIGITS:
+        condition |= Q(phone_reversed__startswith=PlanPurchase.reversed_phone(digits))
+    return queryset.filter(condition)
@@ -1,9 +1,9 @@
 from rest_framework import serializers
-from .models import PlanPurchase
+from .models import PlanPurchase, PurchaseBatch, PurchaseSummary, ProviderPurchaseSummary
 from plans.serializers import PlansSerializer
 from accounts.serializers import UserSignupSerializer
-import uuid
 from django.utils import timezone
+from . import ids
 
 class PlanPurchaseSerializer(serializers.ModelSerializer):
     plan = PlansSerializer(read_only=True)
@@ -18,13 +18,13 @@ class PlanPurchaseSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'plan', 'plan_id', 'user_email', 'user_name', 'plan_title', 'provider_name',
             'amount', 'payment_status', 'transaction_id', 'phone_number', 'payment_method',
-            'created_at', 'updated_at', 'completed_at'
+            'created_at', 'updated_at', 'completed_at', 'expires_at'
         ]
-        read_only_fields = ['transaction_id', 'created_at', 'updated_at', 'completed_at']
+        read_only_fields = ['transaction_id', 'created_at', 'updated_at', 'completed_at', 'expires_at']
     
     def create(self, validated_data):
         # Generate unique transaction ID
-        validated_data['transaction_id'] = f"TXN_{uuid.uuid4().hex[:12].upper()}"
+        validated_data['transaction_id'] = ids.transaction_id()
         return super().create(validated_data)
 
 class PurchasePlanSerializer(serializers.Serializer):
@@ -35,12 +35,22 @@ class PurchasePlanSerializer(serializers.Serializer):
     def validate_plan_id(self, value):
         from plans.models import Plans
         try:
-            plan = Plans.objects.get(id=value, is_active=True)
+            # Kept so the view does not have to fetch the plan a second time.
+            self.plan = Plans.objects.get(id=value, is_active=True)
             return value
         except Plans.DoesNotExist:
             raise serializers.ValidationError("Plan not found or not active")
 
-from datetime import timedelta, date
+class BulkPurchaseItemSerializer(serializers.Serializer):
+    plan_id = serializers.IntegerField()
+    phone_number = serializers.CharField(max_length=15)
+
+class BulkPurchaseSerializer(serializers.Serializer):
+    # Plans are checked for the whole batch with one query in the view.
+    items = BulkPurchaseItemSerializer(many=True, allow_empty=False)
+    payment_method = serializers.CharField(max_length=50, default='online')
+
+from datetime import date
 
 class PurchaseHistorySerializer(serializers.ModelSerializer):
     plan_title = serializers.CharField(source='plan.title', read_only=True)
@@ -53,12 +63,45 @@ class PurchaseHistorySerializer(serializers.ModelSerializer):
         fields = [
             'id', 'plan_title', 'provider_name', 'plan_validity', 'amount', 
             'payment_status', 'transaction_id', 'phone_number', 'payment_method',
-            'created_at', 'completed_at', 'validity_left'  # 👈 ADD HERE
+            'created_at', 'completed_at', 'expires_at', 'validity_left'  # 👈 ADD HERE
         ]
 
     def get_validity_left(self, obj):
-        if obj.completed_at and obj.plan.validity:
-            expiry_date = obj.completed_at.date() + timedelta(days=obj.plan.validity)
-            remaining_days = (expiry_date - date.today()).days
+        expires_at = obj.expires_at or PlanPurchase.expiry_for(obj.completed_at, obj.plan.validity)
+        if expires_at:
+            # One date for the whole page rather than date.today() per row.
+            today = self.context.setdefault('today', date.today())
+            remaining_days = (expires_at.date() - today).days
             return max(0, remaining_days)  # don’t return negative values
         return None
+
+
+class PurchaseBatchItemSerializer(serializers.ModelSerializer):
+    plan_title = serializers.CharField(source='plan.title', read_only=True)
+    
+    class Meta:
+        model = PlanPurchase
+        fields = [
+            'id', 'plan_id', 'plan_title', 'phone_number', 'amount', 'payment_status',
+            'transaction_id', 'payment_gateway_response', 'completed_at'
+        ]
+
+class PurchaseBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PurchaseBatch
+        fields = ['id', 'payment_method', 'item_count', 'total_amount', 'created_at']
+
+class ProviderPurchaseSummarySerializer(serializers.ModelSerializer):
+    provider_name = serializers.CharField(source='provider.title', read_only=True)
+    
+    class Meta:
+        model = ProviderPurchaseSummary
+        fields = [
+            'provider', 'provider_name', 'purchase_count', 'success_count', 'failed_count',
+            'total_spent', 'last_recharge_at', 'updated_at'
+        ]
+
+class PurchaseSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PurchaseSummary
+        fields = ['purchase_count', 'success_count', 'failed_count', 'total_spent', 'last_recharge_at', 'updated_at']
@@ -0,0 +1,72 @@
+"""
+Payment status state machine for plan purchases.
+
+Every status change is one conditional UPDATE
+(``... WHERE id = %s AND payment_status = <expected>``), so when two workers
+race to move the same purchase exactly one of them wins and the other is told
+it lost. Only the winner may go on to call the gateway or send notifications.
+No row stays locked longer than that single statement.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups, summaries
+from .models import PlanPurchase
+
+TRANSITIONS = {
+    # pending -> pending is the sweeper requeueing a purchase nobody picked up.
+    'pending': {'pending', 'processing', 'failed', 'cancelled'},
+    'processing': {'pending', 'success', 'failed'},
+    'failed': {'pending'},
+    'success': set(),
+    'cancelled': set(),
+}
+
+# Purchases still waiting for a final result.
+IN_FLIGHT = ('pending', 'processing')
+
+# Statuses counted in the purchase summaries.
+COUNTED = {'success', 'failed'}
+
+
+class InvalidTransition(Exception):
+    """Raised for a status change the state machine does not allow."""
+
+
+def transition(purchase, to_status, from_status=None, expected_updated_at=None, **fields):
+    """
+    Move ``purchase`` from ``from_status`` (default: its current status) to ``to_status``.
+
+    ``fields`` are written in the same UPDATE. With ``expected_updated_at`` the
+    change also requires the row to be untouched since then, which lets a
+    self-transition (pending -> pending) have a single winner too. Moves into
+    or out of success/failed also update ``summaries``, and completions are
+    added to ``rollups``. Returns
+    True if this call made the change (and updates ``purchase`` to match),
+    False if the purchase had moved on.
+    """
+    from_status = from_status or purchase.payment_status
+    if to_status not in TRANSITIONS.get(from_status, ()):
+        raise InvalidTransition(f"Cannot move a purchase from {from_status} to {to_status}")
+
+    fields.update(payment_status=to_status, updated_at=timezone.now())
+    purchases = PlanPurchase.objects.filter(pk=purchase.pk, payment_status=from_status)
+    if expected_updated_at is not None:
+        purchases = purchases.filter(updated_at=expected_updated_at)
+    if not {from_status, to_status} & COUNTED:
+        won = purchases.update(**fields)
+        if won:
+            for name, value in fields.items():
+                setattr(purchase, name, value)
+        return bool(won)
+
+    # The purchase summaries and revenue rollups change in the same transaction as the status.
+    with transaction.atomic():
+        won = purchases.update(**fields)
+        if won:
+            for name, value in fields.items():
+                setattr(purchase, name, value)
+            summaries.record_transition(purchase, from_status, to_status)
+            if to_status in rollups.OUTCOMES:
+                rollups.record_completion(purchase, to_status, fields['updated_at'])
+    return bool(won)
@@ -0,0 +1,162 @@
+"""
+Per-user and per-user-per-provider purchase totals.
+
+``PurchaseSummary`` and ``ProviderPurchaseSummary`` are updated with relative
+``F()`` UPDATEs in the same transaction as the change they count:
+``record_created`` when purchases are inserted and ``record_transition`` from
+``state.transition``. Dashboards then read one row instead of aggregating
+``PlanPurchase``.
+
+The counters describe current statuses (a failed purchase that is retried stops
+counting as failed), so ``rebuild`` can recompute them from ``PlanPurchase``
+alone whenever they need repairing. A user whose row is missing when a change
+is recorded is rebuilt rather than given a partial count.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from plans.models import Plans
+from .models import PlanPurchase, ProviderPurchaseSummary, PurchaseSummary
+
+COUNTERS = ('purchase_count', 'success_count', 'failed_count', 'total_spent')
+
+
+def _apply(model, lookup, deltas, last_recharge_at=None):
+    """Add ``deltas`` to the summary row. Returns False if the row does not exist."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas and last_recharge_at is None:
+        return True
+    values = {name: F(name) + delta for name, delta in deltas.items()}
+    if last_recharge_at is not None:
+        # Greatest() is NULL on some databases if either side is.
+        values['last_recharge_at'] = Greatest(Coalesce('last_recharge_at', Value(last_recharge_at)), Value(last_recharge_at))
+    values['updated_at'] = timezone.now()
+    return bool(model.objects.filter(**lookup).update(**values))
+
+
+def _record(user_id, provider_id, deltas, last_recharge_at=None):
+    # A missing row (a first purchase, or purchases older than the summaries)
+    # cannot take a delta, which would count only part of the history; it is
+    # recounted from PlanPurchase, which already includes this change.
+    # Creating the empty row first gives the recount a row to lock, so two
+    # first purchases racing here recount one after the other.
+    if not _apply(PurchaseSummary, {'user_id': user_id}, deltas, last_recharge_at):
+        PurchaseSummary.objects.bulk_create([PurchaseSummary(user_id=user_id)], ignore_conflicts=True)
+        ProviderPurchaseSummary.objects.bulk_create(
+            [ProviderPurchaseSummary(user_id=user_id, provider_id=provider_id)], ignore_conflicts=True
+        )
+        rebuild([user_id])
+    elif not _apply(ProviderPurchaseSummary, {'user_id': user_id, 'provider_id': provider_id}, deltas, last_recharge_at):
+        # Only this provider is new to the user: recount just its purchases.
+        ProviderPurchaseSummary.objects.bulk_create(
+            [ProviderPurchaseSummary(user_id=user_id, provider_id=provider_id)], ignore_conflicts=True
+        )
+        _recount_provider(user_id, provider_id)
+
+
+def _totals():
+    success = Q(payment_status='success')
+    return {
+        'purchase_count': Count('id'),
+        'success_count': Count('id', filter=success),
+        'failed_count': Count('id', filter=Q(payment_status='failed')),
+        'total_spent': Coalesce(Sum('amount', filter=success), Value(Decimal('0'))),
+        'last_recharge_at': Max('completed_at', filter=success),
+    }
+
+
+def _recount_provider(user_id, provider_id):
+    with transaction.atomic():
+        summary = ProviderPurchaseSummary.objects.select_for_update().get(user_id=user_id, provider_id=provider_id)
+        totals = PlanPurchase.objects.filter(
+            user_id=user_id, plan__in=Plans.objects.filter(provider_id=provider_id)
+        ).aggregate(**_totals())
+        for name, value in totals.items():
+            setattr(summary, name, value)
+        summary.save()
+
+
+def record_created(purchases):
+    """Count newly inserted purchases (their ``plan`` must be loaded); one pair of UPDATEs per provider."""
+    counts = defaultdict(int)
+    for purchase in purchases:
+        counts[(purchase.user_id, purchase.plan.provider_id)] += 1
+    for (user_id, provider_id), count in counts.items():
+        _record(user_id, provider_id, {'purchase_count': count})
+
+
+def record_transition(purchase, from_status, to_status):
+    deltas = defaultdict(int)
+    for payment_status, sign in ((from_status, -1), (to_status, 1)):
+        if payment_status == 'success':
+            deltas['success_count'] += sign
+            deltas['total_spent'] += sign * purchase.amount
+        elif payment_status == 'failed':
+            deltas['failed_count'] += sign
+    last_recharge_at = purchase.completed_at if to_status == 'success' else None
+    if deltas or last_recharge_at:
+        _record(purchase.user_id, purchase.plan.provider_id, deltas, last_recharge_at)
+
+
+def rebuild(user_ids):
+    """
+    Recompute the summaries of ``user_ids`` from ``PlanPurchase``. Returns the
+    number of provider rows written.
+
+    The existing summary rows are locked first, so a status change made
+    meanwhile either is counted by the recount or waits and applies its delta
+    on top of it.
+    """
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        summaries = PurchaseSummary.objects.select_for_update().in_bulk(user_ids)
+        provider_summaries = {
+            (summary.user_id, summary.provider_id): summary
+            for summary in ProviderPurchaseSummary.objects.select_for_update().filter(user_id__in=user_ids)
+        }
+        rows = (
+            PlanPurchase.objects.filter(user_id__in=user_ids)
+            .order_by()
+            .values('user_id', 'plan__provider_id')
+            .annotate(**_totals())
+        )
+
+        user_totals = {}
+        provider_totals = {}
+        for row in rows:
+            totals = {name: row[name] for name in COUNTERS + ('last_recharge_at',)}
+            provider_totals[(row['user_id'], row['plan__provider_id'])] = totals
+            combined = user_totals.setdefault(row['user_id'], {name: 0 for name in COUNTERS} | {'last_recharge_at': None})
+            for name in COUNTERS:
+                combined[name] += totals[name]
+            if totals['last_recharge_at'] and (combined['last_recharge_at'] is None or totals['last_recharge_at'] > combined['last_recharge_at']):
+                combined['last_recharge_at'] = totals['last_recharge_at']
+
+        _replace(PurchaseSummary, summaries, user_totals, lambda user_id: {'user_id': user_id})
+        _replace(
+            ProviderPurchaseSummary, provider_summaries, provider_totals,
+            lambda key: {'user_id': key[0], 'provider_id': key[1]},
+        )
+    return len(provider_totals)
+
+
+def _replace(model, existing, totals, lookup):
+    """Overwrite ``existing`` rows with ``totals`` (zeroing rows with no purchases) and create the missing ones."""
+    fields = COUNTERS + ('last_recharge_at',)
+    now = timezone.now()
+    zero = {name: 0 for name in COUNTERS} | {'last_recharge_at': None}
+    for key, summary in existing.items():
+        for name, value in totals.get(key, zero).items():
+            setattr(summary, name, value)
+        summary.updated_at = now
+    model.objects.bulk_update(existing.values(), fields + ('updated_at',), batch_size=1000)
+    model.objects.bulk_create(
+        [model(**lookup(key), **values) for key, values in totals.items() if key not in existing],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
@@ -1,3 +1,584 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+import importlib
+import types
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import UserType
+from core.testing import make_plan, make_purchase, make_user
+from plans.models import PlanSearchToken, Provider
+from wallet import ledger
+from wallet.models import Wallet, WalletHold
+from .models import PlanPurchase, ProviderPurchaseSummary, PurchaseBatch, PurchaseSummary
+from . import gateway, ids, pipeline, rollups, state, summaries
+
+
+class PurchaseHistoryPaginationTests(TestCase):
+    url = '/api/purchases/history/'
+
+    def setUp(self):
+        self.user = make_user('retailer')
+        plan = make_plan()
+        now = timezone.now()
+        self.active = [
+            make_purchase(self.user, plan, payment_status='success', completed_at=now, expires_at=now + timedelta(days=days))
+            for days in (1, 2, 3)
+        ]
+        make_purchase(self.user, plan, payment_status='failed')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_by_expiry_needs_a_filter_excluding_nulls(self):
+        response = self.client.get(self.url, {'pagination': 'cursor', 'ordering': 'expires_at'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_and_page_modes_agree_by_expiry(self):
+        params = {'ordering': 'expires_at', 'active_only': 'true', 'page_size': 2}
+        ids_by_cursor = []
+        response = self.client.get(self.url, {**params, 'pagination': 'cursor'})
+        while True:
+            ids_by_cursor += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        ids_by_page = [
+            row['id']
+            for page in (1, 2)
+            for row in self.client.get(self.url, {**params, 'page': page}).data['results']
+        ]
+
+        self.assertEqual(ids_by_cursor, [purchase.id for purchase in self.active])
+        self.assertEqual(ids_by_page, ids_by_cursor)
+
+
+class PurchaseSearchTests(TestCase):
+    url = '/api/purchases/history/'
+
+    def setUp(self):
+        self.user = make_user('retailer')
+        airtel = make_plan('Unlimited 299')
+        jio = make_plan('Data Booster', provider=Provider.objects.create(title='Jio'))
+        self.airtel = make_purchase(self.user, airtel, phone_number='9876543210')
+        self.jio = make_purchase(self.user, jio, phone_number='+91 99887 76655')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def search(self, query):
+        response = self.client.get(self.url, {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.data['results']}
+
+    def test_search_matches_plan_and_provider_words(self):
+        self.assertEqual(self.search('jio'), {self.jio.id})
+        self.assertEqual(self.search('Unlimited 299'), {self.airtel.id})
+        self.assertEqual(self.search('vodafone'), set())
+
+    def test_search_matches_word_prefixes(self):
+        self.assertEqual(self.search('unlim'), {self.airtel.id})
+        self.assertEqual(self.search('air unl'), {self.airtel.id})
+        self.assertEqual(self.search('air boost'), set())
+
+    def test_search_matches_phone_suffixes(self):
+        self.assertEqual(self.search('3210'), {self.airtel.id})
+        self.assertEqual(self.search('766 55'), {self.jio.id})
+        self.assertEqual(self.search('98765'), set())
+
+    def test_backfill_migrations_make_older_rows_searchable(self):
+        PlanSearchToken.objects.all().delete()
+        PlanPurchase.objects.update(phone_reversed='')
+        self.assertEqual(self.search('jio'), set())
+
+        importlib.import_module('plans.migrations.0003_backfill_plan_search_tokens').backfill(apps, None)
+        importlib.import_module('purchases.migrations.0013_backfill_phone_reversed').backfill(apps, None)
+
+        self.assertEqual(self.search('jio'), {self.jio.id})
+        self.assertEqual(self.search('6655'), {self.jio.id})
+
+
+class BulkPurchaseTests(TestCase):
+    url = '/api/purchases/batch/'
+
+    def setUp(self):
+        self.user = make_user('retailer')
+        self.wallet = Wallet.objects.create(user=self.user, balance=Decimal('60.00'))
+        self.plan = make_plan()
+        self.inactive = make_plan('Retired 199')
+        self.inactive.is_active = False
+        self.inactive.save()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def submit(self, plan_ids):
+        return self.client.post(self.url, {
+            'payment_method': 'wallet',
+            'items': [{'plan_id': plan_id, 'phone_number': f'98765432{n:02d}'} for n, plan_id in enumerate(plan_ids)],
+        }, format='json')
+
+    def test_valid_items_are_held_and_rejected_plans_reported(self):
+        response = self.submit([self.plan.pk, self.inactive.pk, 0, self.plan.pk])
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(
+            [item['status'] for item in response.data['items']], ['pending', 'rejected', 'rejected', 'pending']
+        )
+        self.assertEqual(response.data['batch']['item_count'], 2)
+        self.assertEqual(response.data['batch']['total_amount'], '50.00')
+        purchases = PlanPurchase.objects.filter(batch_id=response.data['batch']['id']).select_related('wallet_hold')
+        self.assertEqual({purchase.wallet_hold.status for purchase in purchases}, {'active'})
+        self.assertEqual(
+            {purchase.wallet_hold.reference for purchase in purchases}, {purchase.transaction_id for purchase in purchases}
+        )
+        self.wallet.refresh_from_db()
+        self.assertEqual((self.wallet.balance, self.wallet.held_amount), (Decimal('60.00'), Decimal('50.00')))
+
+        detail = self.client.get(f"{self.url}{response.data['batch']['id']}/")
+        self.assertEqual(detail.data['status_counts'], {'pending': 2})
+
+    def test_batch_the_wallet_cannot_cover_holds_nothing(self):
+        response = self.submit([self.plan.pk] * 3)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PurchaseBatch.objects.exists())
+        self.assertFalse(PlanPurchase.objects.exists())
+        self.assertFalse(WalletHold.objects.exists())
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.held_amount, Decimal('0.00'))
+
+    def test_batch_with_only_rejected_plans_gets_400(self):
+        response = self.submit([self.inactive.pk, 0])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([item['status'] for item in response.data['items']], ['rejected', 'rejected'])
+        self.assertFalse(PurchaseBatch.objects.exists())
+
+    def test_only_retailers_can_submit_batches(self):
+        self.client.force_authenticate(make_user('distributor', UserType.DISTRIBUTOR))
+
+        self.assertEqual(self.submit([self.plan.pk]).status_code, 403)
+
+
+class RechargeGuardTests(TestCase):
+    url = '/api/purchases/purchase/'
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = make_user('retailer')
+        self.plan = make_plan()
+        self.body = {'plan_id': self.plan.pk, 'phone_number': '9876543210', 'payment_method': 'online'}
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def test_repeat_while_the_first_is_submitting_gets_409(self):
+        # Without running on-commit callbacks the first request never leaves the in-flight state.
+        first = self.client.post(self.url, self.body, format='json')
+        repeat = self.client.post(self.url, self.body, format='json')
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(repeat.status_code, 409)
+        self.assertEqual(PlanPurchase.objects.count(), 1)
+
+    def test_repeat_after_acceptance_gets_the_first_purchase_back(self):
+        # Run the on-commit callbacks, but leave the purchase unprocessed.
+        submit = pipeline.submit
+        pipeline.submit = lambda purchase_id, retry=False: None
+        self.addCleanup(setattr, pipeline, 'submit', submit)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(self.url, self.body, format='json')
+
+        repeat = self.client.post(self.url, {**self.body, 'phone_number': '98765 43210'}, format='json')
+
+        self.assertEqual(repeat.status_code, 202)
+        self.assertTrue(repeat.data['duplicate'])
+        self.assertEqual(repeat.data['purchase']['id'], first.data['purchase']['id'])
+        self.assertEqual(PlanPurchase.objects.count(), 1)
+
+    def test_other_phone_numbers_are_not_duplicates(self):
+        self.client.post(self.url, self.body, format='json')
+        other = self.client.post(self.url, {**self.body, 'phone_number': '9876543211'}, format='json')
+
+        self.assertEqual(other.status_code, 202)
+        self.assertEqual(PlanPurchase.objects.count(), 2)
+
+    def test_body_that_is_not_an_object_gets_400(self):
+        response = self.client.post(self.url, [self.body], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PlanPurchase.objects.exists())
+
+
+def use_gateway(test, **options):
+    """Swap in a simulated gateway with the given options for the duration of ``test``."""
+    config = {'BACKEND': 'purchases.gateway.SimulatedGateway', 'OPTIONS': {
+        'seed': 'tests', 'latency_p50_ms': 1, 'latency_p99_ms': 1, **options,
+    }}
+    gateway._gateway = None
+    test.addCleanup(setattr, gateway, '_gateway', None)
+    override = override_settings(PAYMENT_GATEWAY=config)
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+class TransactionIdTests(SimpleTestCase):
+    def setUp(self):
+        saved = dict(ids._state)
+        self.addCleanup(ids._state.update, saved)
+
+    def use_clock(self, *times_ms):
+        clock = iter(times_ms)
+        self.addCleanup(setattr, ids, 'time', ids.time)
+        ids.time = types.SimpleNamespace(time_ns=lambda: next(clock) * 1_000_000)
+
+    def test_ids_are_fixed_width_unique_and_in_creation_order(self):
+        generated = [ids.transaction_id() for _ in range(2000)]
+
+        self.assertEqual(sorted(generated), generated)
+        self.assertEqual(len(set(generated)), len(generated))
+        self.assertEqual({len(txn_id) for txn_id in generated}, {len(ids.PREFIX) + ids.ID_LENGTH})
+
+    def test_ids_from_many_threads_are_unique(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            generated = list(pool.map(lambda _: ids.transaction_id(), range(4000)))
+
+        self.assertEqual(len(set(generated)), len(generated))
+
+    def test_ids_keep_increasing_when_the_clock_steps_back(self):
+        self.use_clock(1_000_000, 999_000, 1_000_001)
+        ids._state['last_ms'] = 0
+
+        generated = [ids.transaction_id() for _ in range(3)]
+
+        self.assertEqual(sorted(generated), generated)
+        self.assertEqual([ids.created_at_ms(txn_id) for txn_id in generated], [1_000_000, 1_000_000, 1_000_001])
+
+    def test_exhausted_sequence_borrows_the_next_millisecond(self):
+        self.use_clock(1_000_000, 1_000_000)
+        ids._state['last_ms'] = 0
+        first = ids.transaction_id()
+        ids._state['sequence'] = (1 << ids.SEQUENCE_BITS) - 1
+
+        second = ids.transaction_id()
+
+        self.assertLess(first, second)
+        self.assertEqual(ids.created_at_ms(second), 1_000_001)
+
+    @override_settings(PURCHASE_ID_NODE=5)
+    def test_configured_node_id_is_encoded(self):
+        ids._state['pid'] = None
+        txn_id = ids.transaction_id()
+
+        value = int(''.join(f'{ids.ALPHABET.index(char):05b}' for char in txn_id[len(ids.PREFIX):]), 2)
+        self.assertEqual((value >> ids.SEQUENCE_BITS) & ((1 << ids.NODE_BITS) - 1), 5)
+
+    def test_older_ids_have_no_timestamp(self):
+        self.assertIsNone(ids.created_at_ms('TXN-1a2b3c4d5e6f'))
+        self.assertIsNone(ids.created_at_ms('ORDER-123'))
+
+
+class GatewayTests(SimpleTestCase):
+    def test_charge_slower_than_the_timeout_fails_with_gateway_timeout(self):
+        simulated = gateway.SimulatedGateway(seed='tests', latency_p50_ms=50, latency_p99_ms=50, timeout_ms=10)
+
+        response = simulated.charge('TXN1', Decimal('10.00'))
+
+        self.assertEqual((response['status'], response['error_code'], response['latency_ms']), ('failed', 'GATEWAY_TIMEOUT', 10))
+        self.assertEqual(simulated.status('TXN1'), response)
+
+    def test_outcomes_replay_from_the_seed(self):
+        options = {'seed': 'tests', 'success_rate': 0.5, 'latency_p50_ms': 1, 'latency_p99_ms': 1}
+        first, second = gateway.SimulatedGateway(**options), gateway.SimulatedGateway(**options)
+
+        self.assertEqual(
+            [first.charge(f'TXN{n}', Decimal('1.00')) for n in range(10)],
+            [second.charge(f'TXN{n}', Decimal('1.00')) for n in range(10)],
+        )
+
+    def test_failures_use_the_configured_error_codes(self):
+        simulated = gateway.SimulatedGateway(
+            success_rate=0, latency_p50_ms=1, latency_p99_ms=1, error_weights={'PAYMENT_DECLINED': 1}
+        )
+
+        response = simulated.charge('TXN1', Decimal('10.00'))
+
+        self.assertEqual(response['error_code'], 'PAYMENT_DECLINED')
+        self.assertEqual(response['message'], gateway.ERROR_MESSAGES['PAYMENT_DECLINED'])
+
+    def test_charge_without_a_free_slot_is_busy_and_unrecorded(self):
+        simulated = gateway.SimulatedGateway(latency_p50_ms=1, latency_p99_ms=1, timeout_ms=20, max_concurrency=1)
+        simulated.slots.acquire()
+
+        response = simulated.charge('TXN1', Decimal('10.00'))
+
+        self.assertEqual(response['error_code'], 'GATEWAY_BUSY')
+        self.assertEqual(simulated.status('TXN1')['status'], 'unknown')
+        simulated.slots.release()
+        self.assertEqual(simulated.charge('TXN1', Decimal('10.00'))['status'], 'success')
+
+    def test_unreachable_http_gateway_is_unavailable(self):
+        http = gateway.HttpGateway('http://127.0.0.1:9/charge', timeout_ms=500)
+
+        self.assertEqual(http.status_url, 'http://127.0.0.1:9/status')
+        self.assertEqual(http.charge('TXN1', Decimal('10.00'))['error_code'], 'PROVIDER_UNAVAILABLE')
+        self.assertEqual(http.status('TXN1')['status'], 'unavailable')
+
+
+class PipelineHoldTests(TestCase):
+    def setUp(self):
+        use_gateway(self, success_rate=1.0)
+        self.user = make_user('retailer')
+        self.plan = make_plan()
+        self.wallet = Wallet.objects.create(user=self.user, balance=Decimal('30.00'))
+        hold = ledger.reserve(self.wallet, self.plan.amount, created_by=self.user)
+        self.purchase = make_purchase(self.user, self.plan, payment_method='wallet', wallet_hold=hold)
+        ledger.release(hold, new_status='expired')
+
+    def test_expired_hold_is_reserved_again_and_captured(self):
+        pipeline.process_purchase(self.purchase.pk)
+
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.payment_status, 'success')
+        self.assertEqual(self.purchase.wallet_hold.status, 'captured')
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('5.00'))
+        self.assertEqual(self.wallet.held_amount, Decimal('0.00'))
+
+    def test_expired_hold_without_funds_fails_before_charging(self):
+        ledger.debit(self.wallet, Decimal('20.00'), created_by=self.user)
+
+        pipeline.process_purchase(self.purchase.pk)
+
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.payment_status, 'failed')
+        self.assertEqual(self.purchase.payment_gateway_response['error_code'], 'HOLD_EXPIRED')
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('10.00'))
+
+
+class PipelineHoldExpiryTests(TestCase):
+    def setUp(self):
+        use_gateway(self, success_rate=1.0)
+        self.user = make_user('retailer')
+        self.plan = make_plan()
+        self.wallet = Wallet.objects.create(user=self.user, balance=Decimal('30.00'))
+        self.hold = ledger.reserve(self.wallet, self.plan.amount, created_by=self.user, ttl=0)
+        self.purchase = make_purchase(self.user, self.plan, payment_method='wallet', wallet_hold=self.hold)
+
+    def during_charge(self, action):
+        simulated = gateway.get_gateway()
+        charge = simulated.charge
+
+        def charge_after_action(*args, **kwargs):
+            action()
+            return charge(*args, **kwargs)
+
+        simulated.charge = charge_after_action
+
+    def test_hold_near_expiry_is_extended_when_claimed(self):
+        self.during_charge(lambda: self.assertEqual(ledger.expire_holds(), 0))
+
+        pipeline.process_purchase(self.purchase.pk)
+
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.payment_status, 'success')
+        self.assertEqual(self.purchase.wallet_hold.status, 'captured')
+
+    def test_hold_released_during_charge_is_debited_directly(self):
+        self.during_charge(lambda: ledger.release(self.hold, new_status='expired'))
+
+        pipeline.process_purchase(self.purchase.pk)
+
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.payment_status, 'success')
+        self.assertFalse(self.purchase.needs_reconciliation)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('5.00'))
+        self.assertEqual(self.wallet.held_amount, Decimal('0.00'))
+
+    def test_delivered_recharge_the_wallet_cannot_cover_is_flagged(self):
+        def drain():
+            ledger.release(self.hold, new_status='expired')
+            ledger.debit(self.wallet, Decimal('20.00'), created_by=self.user)
+
+        self.during_charge(drain)
+
+        pipeline.process_purchase(self.purchase.pk)
+
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.payment_status, 'success')
+        self.assertTrue(self.purchase.needs_reconciliation)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('10.00'))
+
+
+class SweeperRecoveryTests(TestCase):
+    def setUp(self):
+        use_gateway(self, success_rate=1.0)
+        self.user = make_user('retailer')
+        self.plan = make_plan()
+        self.purchase = make_purchase(self.user, self.plan, payment_status='processing')
+        # The worker that claimed it died; the sweeper finds it stale.
+        PlanPurchase.objects.filter(pk=self.purchase.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def sweep(self):
+        stale = pipeline.stale_purchases(10)
+        self.assertEqual([purchase.pk for purchase in stale], [self.purchase.pk])
+        self.assertEqual(pipeline.requeue_stale(stale[0]), 'requeued')
+        pipeline.recover_purchase(self.purchase.pk)
+        self.purchase.refresh_from_db()
+
+    def test_charge_the_gateway_completed_is_not_repeated(self):
+        charged = gateway.charge(self.purchase.transaction_id, self.purchase.amount)
+        gateway.get_gateway().charge = lambda *args, **kwargs: self.fail('charged twice')
+
+        self.sweep()
+
+        self.assertEqual(self.purchase.payment_status, 'success')
+        self.assertEqual(self.purchase.payment_gateway_response, charged)
+
+    def test_charge_in_progress_is_left_pending(self):
+        gateway.get_gateway()._record(self.purchase.transaction_id, gateway.pending_response())
+
+        self.sweep()
+
+        self.assertEqual(self.purchase.payment_status, 'pending')
+        self.assertEqual(self.purchase.attempts, 1)
+
+    def test_requeued_purchase_waits_for_its_backoff(self):
+        gateway.get_gateway()._record(self.purchase.transaction_id, gateway.pending_response())
+        self.sweep()
+        PlanPurchase.objects.filter(pk=self.purchase.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        self.assertGreater(self.purchase.next_attempt_at, timezone.now())
+        self.assertEqual(pipeline.stale_purchases(10), [])
+
+    @override_settings(PURCHASE_MAX_ATTEMPTS=1)
+    def test_purchase_fails_after_max_attempts_and_releases_its_hold(self):
+        wallet = Wallet.objects.create(user=self.user, balance=Decimal('30.00'))
+        hold = ledger.reserve(wallet, self.plan.amount, created_by=self.user)
+        PlanPurchase.objects.filter(pk=self.purchase.pk).update(
+            payment_method='wallet', wallet_hold=hold, attempts=1, updated_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(pipeline.requeue_stale(pipeline.stale_purchases(10)[0]), 'failed')
+
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.payment_status, 'failed')
+        self.assertEqual(self.purchase.payment_gateway_response['error_code'], 'MAX_ATTEMPTS_EXCEEDED')
+        wallet.refresh_from_db()
+        self.assertEqual((wallet.balance, wallet.held_amount), (Decimal('30.00'), Decimal('0.00')))
+
+    def test_transaction_unknown_to_the_gateway_is_charged(self):
+        self.sweep()
+
+        self.assertEqual(self.purchase.payment_status, 'success')
+        self.assertEqual(gateway.status(self.purchase.transaction_id), self.purchase.payment_gateway_response)
+
+
+class SummaryTests(TestCase):
+    def setUp(self):
+        self.user = make_user('retailer')
+        self.plan = make_plan()
+
+    def test_transition_without_a_summary_row_recounts_the_user(self):
+        # Purchases made before the summaries existed have no summary rows.
+        make_purchase(self.user, self.plan, payment_status='success', completed_at=timezone.now())
+        failed = make_purchase(self.user, self.plan, payment_status='failed')
+
+        self.assertTrue(state.transition(failed, 'pending', from_status='failed'))
+
+        summary = PurchaseSummary.objects.get(user=self.user)
+        self.assertEqual(
+            (summary.purchase_count, summary.success_count, summary.failed_count, summary.total_spent),
+            (2, 1, 0, Decimal('25.00')),
+        )
+        self.assertEqual(ProviderPurchaseSummary.objects.get(user=self.user).purchase_count, 2)
+
+    def test_first_purchase_from_a_new_provider_recounts_only_that_provider(self):
+        purchase = make_purchase(self.user, self.plan)
+        summaries.record_created([purchase])
+        other_plan = make_plan('Talktime 100', amount='10.00')
+        other = make_purchase(self.user, other_plan)
+
+        with self.assertNumQueries(8):
+            summaries.record_created([other])
+
+        summary = PurchaseSummary.objects.get(user=self.user)
+        self.assertEqual(summary.purchase_count, 2)
+        self.assertEqual(
+            ProviderPurchaseSummary.objects.get(user=self.user, provider=other_plan.provider).purchase_count, 1
+        )
+
+    def test_backfill_migration_counts_existing_purchases(self):
+        make_purchase(self.user, self.plan, payment_status='success', completed_at=timezone.now())
+        make_purchase(self.user, self.plan, payment_status='failed')
+        make_purchase(self.user, self.plan)
+        migration = importlib.import_module('purchases.migrations.0011_backfill_purchase_summaries')
+
+        migration.backfill(apps, None)
+
+        summary = PurchaseSummary.objects.get(user=self.user)
+        self.assertEqual(
+            (summary.purchase_count, summary.success_count, summary.failed_count, summary.total_spent),
+            (3, 1, 1, Decimal('25.00')),
+        )
+
+    def test_purchase_lifecycle_updates_the_summary(self):
+        purchase = make_purchase(self.user, self.plan)
+        summaries.record_created([purchase])
+        state.transition(purchase, 'processing', from_status='pending')
+        state.transition(purchase, 'failed', from_status='processing')
+        state.transition(purchase, 'pending', from_status='failed')
+        state.transition(purchase, 'processing', from_status='pending')
+        state.transition(purchase, 'success', from_status='processing', completed_at=timezone.now())
+
+        summary = PurchaseSummary.objects.get(user=self.user)
+        self.assertEqual(
+            (summary.purchase_count, summary.success_count, summary.failed_count, summary.total_spent),
+            (1, 1, 0, Decimal('25.00')),
+        )
+        self.assertEqual(summary.last_recharge_at, purchase.completed_at)
+
+
+class RevenueReportTests(TestCase):
+    def test_rebuilt_history_is_reported_with_string_amounts(self):
+        user = make_user('retailer')
+        plan = make_plan()
+        # Written directly, as purchases completed before the rollups existed were.
+        make_purchase(user, plan, payment_status='success', completed_at=timezone.now())
+        make_purchase(user, plan, payment_status='failed')
+        today = timezone.localdate()
+
+        self.assertEqual(rollups.rebuild(today, today), 1)
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(make_user('admin', UserType.ADMIN))
+        response = client.get('/api/purchases/reports/revenue/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['revenue'], '25.00')
+        self.assertEqual(response.data['totals']['failed_count'], 1)
+        self.assertEqual(response.data['results'][0]['revenue'], '25.00')
+
+
+class PurchaseWaitTests(TestCase):
+    def setUp(self):
+        self.user = make_user('retailer')
+        self.purchase = make_purchase(self.user, make_plan())
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def test_non_finite_wait_is_rejected(self):
+        for url in (f'/api/purchases/status/{self.purchase.pk}/', f'/api/purchases/history/{self.purchase.pk}/'):
+            for wait in ('nan', 'inf', '-inf', 'soon'):
+                self.assertEqual(self.client.get(url, {'wait': wait}).status_code, 400, (url, wait))
+
+    def test_wait_for_result_does_not_poll_forever_on_nan(self):
+        purchase = pipeline.wait_for_result(PlanPurchase.objects.all(), self.purchase.pk, float('nan'))
+
+        self.assertEqual(purchase.payment_status, 'pending')
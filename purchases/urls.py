@@ -3,7 +3,12 @@ from . import views
 
 urlpatterns = [
     path('purchase/', views.purchase_plan, name='purchase_plan'),
+    path('batch/', views.bulk_purchase, name='bulk_purchase'),
+    path('batch/<int:pk>/', views.purchase_batch_detail, name='purchase_batch_detail'),
     path('history/', views.purchase_history, name='purchase_history'),
+    path('summary/', views.purchase_summary, name='purchase_summary'),
+    path('reports/revenue/', views.revenue_report, name='revenue_report'),
     path('history/<int:pk>/', views.purchase_detail, name='purchase_detail'),
+    path('status/<int:pk>/', views.purchase_status, name='purchase_status'),
     path('retry/<int:pk>/', views.retry_payment, name='retry_payment'),
 ]
\ No newline at end of file
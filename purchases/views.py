@@ -2,24 +2,39 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Q
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
 from django.utils import timezone
-from .models import PlanPurchase
-from .serializers import PlanPurchaseSerializer, PurchasePlanSerializer, PurchaseHistorySerializer
+from datetime import date, timedelta
+from decimal import Decimal
+import math
+from .models import PlanPurchase, PurchaseBatch, PurchaseSummary
+from .pagination import HISTORY_ORDERINGS, NULLABLE_ORDERINGS, PurchaseHistoryPagination, cached_count
+from .serializers import (
+    PlanPurchaseSerializer, PurchasePlanSerializer, PurchaseHistorySerializer, BulkPurchaseSerializer,
+    PurchaseBatchSerializer, PurchaseBatchItemSerializer, PurchaseSummarySerializer, ProviderPurchaseSummarySerializer
+)
 from plans.models import Plans
-import random
-import time
-import uuid
-from notifications.utils import generate_notification_content,is_notification_allowed
-from notifications.models import Notification
+from wallet.models import Wallet
+from wallet import ledger
+from . import ids, pipeline, rollups, state, summaries
+from .duplicates import recharge_guard
+from .search import filter_purchases as search_purchases
+from core.idempotency import idempotent
+
+# Query parameters that page through results rather than filter them.
+HISTORY_PAGING_PARAMS = ('page', 'page_size', 'cursor', 'pagination', 'count', 'ordering')
 
 def generate_unique_transaction_id():
-    return f"TXN-{uuid.uuid4().hex[:10]}"
+    return ids.transaction_id()
 
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
+@recharge_guard
 def purchase_plan(request):
     serializer = PurchasePlanSerializer(data=request.data)
     if serializer.is_valid():
@@ -28,79 +43,153 @@ def purchase_plan(request):
         payment_method = serializer.validated_data['payment_method']
         
         try:
-            plan = Plans.objects.get(id=plan_id, is_active=True)
+            plan = serializer.plan
 
             transaction_id = generate_unique_transaction_id()
             
+            hold = None
+            if payment_method == 'wallet':
+                wallet = Wallet.objects.filter(user=request.user).first()
+                if wallet is None:
+                    return Response({'error': 'Wallet not found'}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Create purchase record
-            purchase = PlanPurchase.objects.create(
-                user=request.user,
-                plan=plan,
-                amount=plan.amount,
-                phone_number=phone_number,
-                payment_method=payment_method,
-                payment_status='pending',
-                transaction_id=transaction_id 
-            )
-            
-            # Simulate payment processing
-            # In a real app, you would integrate with payment gateway here
-            time.sleep(1)  # Simulate processing time
-            
-            # Random success/failure for demo (80% success rate)
-            payment_success = random.choice([True, True, True, True, False])
-            
-            if payment_success:
-                purchase.payment_status = 'success'
-                purchase.completed_at = timezone.now()
-                purchase.payment_gateway_response = {
-                    'status': 'success',
-                    'message': 'Payment completed successfully',
-                    'gateway_txn_id': f"GTW_{purchase.transaction_id}"
-                }
-                # Send RECHARGE notification
-                if is_notification_allowed('recharge_success', 'in_app'):
-                    data = generate_notification_content(request.user, 'RECHARGE', related_id=purchase.id)
-                    Notification.objects.create(
-                        user=request.user,
-                        title=data['title'],
-                        message=data['message'],
-                        notification_type='RECHARGE',
-                        related_id=purchase.id
+            try:
+                # Short transaction: the wallet row is only locked while the
+                # hold is placed, not while the payment is processed.
+                with transaction.atomic():
+                    if payment_method == 'wallet':
+                        hold = ledger.reserve(
+                            wallet, plan.amount, created_by=request.user, reference=transaction_id,
+                            description=f"Recharge {plan.title} for {phone_number}"
                         )
-            else:
-                purchase.payment_status = 'failed'
-                purchase.payment_gateway_response = {
-                    'status': 'failed',
-                    'message': 'Payment failed due to insufficient funds',
-                    'error_code': 'INSUFFICIENT_FUNDS'
-                }
-                 # ❌ Optionally send failed payment notification
-                if is_notification_allowed('recharge_success', 'in_app'):
-                    Notification.objects.create(
+                    
+                    # Create purchase record
+                    purchase = PlanPurchase.objects.create(
                         user=request.user,
-                        title="Recharge Failed",
-                        message=f"Hi {request.user.first_name or request.user.email.split('@')[0]},\n\n"
-                            f"Your payment for the plan '{plan.title}' failed due to insufficient funds.\n"
-                            f"Please try again.",
-                        notification_type='RECHARGE',
-                        related_id=purchase.id
-                        )
+                        plan=plan,
+                        amount=plan.amount,
+                        phone_number=phone_number,
+                        payment_method=payment_method,
+                        payment_status='pending',
+                        transaction_id=transaction_id,
+                        wallet_hold=hold
+                    )
+                    summaries.record_created([purchase])
+            except ledger.InsufficientBalance:
+                return Response({'error': 'Insufficient wallet balance'}, status=status.HTTP_400_BAD_REQUEST)
             
-            purchase.save()
+            # The payment is processed in the background once this request
+            # commits; clients follow it via the status endpoint.
+            pipeline.submit(purchase.pk)
             
             serializer = PlanPurchaseSerializer(purchase)
             return Response({
-                'message': 'Purchase processed successfully',
+                'message': 'Purchase accepted for processing',
                 'purchase': serializer.data
-            }, status=status.HTTP_201_CREATED)
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Plans.DoesNotExist:
             return Response({'error': 'Plan not found'}, status=status.HTTP_404_NOT_FOUND)
             
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def bulk_purchase(request):
+    if not request.user.is_retailer:
+        return Response({'error': 'Only retailers can submit bulk recharges'}, status=status.HTTP_403_FORBIDDEN)
+    serializer = BulkPurchaseSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    items = serializer.validated_data['items']
+    payment_method = serializer.validated_data['payment_method']
+    if len(items) > settings.PURCHASE_BATCH_MAX_ITEMS:
+        return Response(
+            {'error': f'At most {settings.PURCHASE_BATCH_MAX_ITEMS} recharges can be submitted per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # One query for every plan in the batch.
+    plans = Plans.objects.filter(is_active=True).in_bulk({item['plan_id'] for item in items})
+    results = []
+    purchases = []
+    for index, item in enumerate(items):
+        result = {'index': index, 'plan_id': item['plan_id'], 'phone_number': item['phone_number']}
+        plan = plans.get(item['plan_id'])
+        if plan is None:
+            result.update(status='rejected', error='Plan not found or not active')
+        else:
+            purchases.append(PlanPurchase(
+                user=request.user,
+                plan=plan,
+                amount=plan.amount,
+                phone_number=item['phone_number'],
+                phone_reversed=PlanPurchase.reversed_phone(item['phone_number']),
+                payment_method=payment_method,
+                payment_status='pending',
+                transaction_id=generate_unique_transaction_id()
+            ))
+        results.append(result)
+    if not purchases:
+        return Response({'error': 'No valid recharges in batch', 'items': results}, status=status.HTTP_400_BAD_REQUEST)
+    
+    wallet = None
+    if payment_method == 'wallet':
+        wallet = Wallet.objects.filter(user=request.user).first()
+        if wallet is None:
+            return Response({'error': 'Wallet not found'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        with transaction.atomic():
+            batch = PurchaseBatch.objects.create(
+                user=request.user,
+                payment_method=payment_method,
+                item_count=len(purchases),
+                total_amount=sum(purchase.amount for purchase in purchases)
+            )
+            if wallet is not None:
+                # All or nothing: the batch is rejected if the wallet cannot cover all of it.
+                holds = ledger.reserve_many(wallet, [
+                    (purchase.amount, purchase.transaction_id, f"Recharge {purchase.plan.title} for {purchase.phone_number}")
+                    for purchase in purchases
+                ], created_by=request.user)
+                for purchase, hold in zip(purchases, holds):
+                    purchase.wallet_hold = hold
+            for purchase in purchases:
+                purchase.batch = batch
+            purchases = PlanPurchase.objects.bulk_create(purchases, batch_size=500)
+            summaries.record_created(purchases)
+            pipeline.submit_batch([purchase.pk for purchase in purchases])
+    except ledger.InsufficientBalance:
+        return Response({'error': 'Insufficient wallet balance'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    created = iter(purchases)
+    for result in results:
+        if 'error' not in result:
+            purchase = next(created)
+            result.update(status='pending', purchase_id=purchase.pk, transaction_id=purchase.transaction_id)
+    return Response({
+        'message': 'Batch accepted for processing',
+        'batch': PurchaseBatchSerializer(batch).data,
+        'items': results
+    }, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def purchase_batch_detail(request, pk):
+    try:
+        batch = PurchaseBatch.objects.get(pk=pk, user=request.user)
+    except PurchaseBatch.DoesNotExist:
+        return Response({'error': 'Batch not found'}, status=status.HTTP_404_NOT_FOUND)
+    items = batch.purchases.select_related('plan').order_by('id')
+    counts = dict(items.order_by().values_list('payment_status').annotate(count=Count('id')))
+    return Response({
+        'batch': PurchaseBatchSerializer(batch).data,
+        'status_counts': counts,
+        'items': PurchaseBatchItemSerializer(items, many=True).data
+    }, status=status.HTTP_200_OK)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def purchase_history(request):
@@ -122,31 +211,78 @@ def purchase_history(request):
     # Search functionality
     search = request.GET.get('search', '')
     if search:
-        purchases = purchases.filter(
-            Q(plan__title__icontains=search) |
-            Q(plan__provider__title__icontains=search) |
-            Q(transaction_id__icontains=search) |
-            Q(phone_number__icontains=search)
-        )
+        purchases = search_purchases(purchases, search)
     
     # Filter by provider
     provider_id = request.GET.get('provider_id', '')
     if provider_id:
         purchases = purchases.filter(plan__provider_id=provider_id)
     
+    # Validity filters, on the stored expires_at so they run in SQL
+    now = timezone.now()
+    expiry_filtered = False
+    if request.GET.get('active_only', '').lower() in ('1', 'true', 'yes'):
+        purchases = purchases.filter(expires_at__gt=now)
+        expiry_filtered = True
+    expiring_within = request.GET.get('expiring_within', '')
+    if expiring_within:
+        try:
+            days = int(expiring_within)
+        except ValueError:
+            return Response({'error': 'expiring_within must be a number of days'}, status=status.HTTP_400_BAD_REQUEST)
+        purchases = purchases.filter(expires_at__gt=now, expires_at__lte=now + timedelta(days=days))
+        expiry_filtered = True
+    
     # Ordering
     ordering = request.GET.get('ordering', '-created_at')
-    if ordering in ['created_at', '-created_at', 'amount', '-amount', 'payment_status']:
-        purchases = purchases.order_by(ordering)
+    if ordering not in HISTORY_ORDERINGS:
+        ordering = '-created_at'
+    
+    # ?count=exact (default for page numbers) | cached | none (default for cursors)
+    cursor_mode = request.GET.get('pagination') == 'cursor' or 'cursor' in request.GET
+    count_mode = request.GET.get('count', 'none' if cursor_mode else 'exact')
+    if count_mode not in ('exact', 'cached', 'none'):
+        return Response({'error': 'count must be exact, cached or none'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    total_count = None
+    if count_mode == 'exact':
+        total_count = purchases.count()
+    elif count_mode == 'cached':
+        filters = {key: value for key, value in request.GET.items() if key not in HISTORY_PAGING_PARAMS}
+        total_count = cached_count(purchases, request.user.id, filters)
     
-    # Pagination
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 20))
+    # Cursor pagination: constant cost however deep the page
+    if cursor_mode:
+        # Keyset predicates cannot step over NULLs, so ordering by expiry needs a
+        # filter that already excludes purchases without one.
+        if ordering in NULLABLE_ORDERINGS and not expiry_filtered:
+            return Response(
+                {'error': f'Cursor pagination by {ordering} requires active_only or expiring_within'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        paginator = PurchaseHistoryPagination(ordering)
+        purchases_page = paginator.paginate_queryset(purchases, request)
+        serializer = PurchaseHistorySerializer(purchases_page, many=True)
+        return Response({
+            'count': total_count,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'results': serializer.data
+        }, status=status.HTTP_200_OK)
+    
+    # Page-number pagination
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        page_size = max(int(request.GET.get('page_size', 20)), 1)
+    except ValueError:
+        return Response({'error': 'page and page_size must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
     start = (page - 1) * page_size
     end = start + page_size
     
-    total_count = purchases.count()
-    purchases_page = purchases[start:end]
+    # One extra row says whether there is a next page without needing the count
+    purchases_page = list(purchases.order_by(*HISTORY_ORDERINGS[ordering])[start:end + 1])
+    has_next = len(purchases_page) > page_size
+    purchases_page = purchases_page[:page_size]
     
     serializer = PurchaseHistorySerializer(purchases_page, many=True)
     
@@ -154,61 +290,143 @@ def purchase_history(request):
         'count': total_count,
         'page': page,
         'page_size': page_size,
-        'total_pages': (total_count + page_size - 1) // page_size,
+        'total_pages': (total_count + page_size - 1) // page_size if total_count is not None else None,
+        'has_next': has_next,
         'results': serializer.data
     }, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def purchase_detail(request, pk):
+def purchase_summary(request):
+    # Maintained counters, not an aggregate over the purchase history.
+    summary = PurchaseSummary.objects.filter(user=request.user).first() or PurchaseSummary(user=request.user)
+    data = PurchaseSummarySerializer(summary).data
+    if request.GET.get('by_provider', '').lower() in ('1', 'true', 'yes'):
+        providers = request.user.provider_purchase_summaries.select_related('provider').order_by('-total_spent')
+        data['providers'] = ProviderPurchaseSummarySerializer(providers, many=True).data
+    return Response(data, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def revenue_report(request):
+    if not request.user.is_admin:
+        return Response({'error': 'Only admins can view revenue reports'}, status=status.HTTP_403_FORBIDDEN)
+    
+    # Whole days, inclusive; defaults to the last 30 days
+    today = timezone.localdate()
     try:
-        purchase = PlanPurchase.objects.select_related('plan', 'plan__provider').get(
-            pk=pk, user=request.user
+        start_date = date.fromisoformat(request.GET.get('start_date', '') or (today - timedelta(days=29)).isoformat())
+        end_date = date.fromisoformat(request.GET.get('end_date', '') or today.isoformat())
+    except ValueError:
+        return Response({'error': 'start_date and end_date must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    if start_date > end_date:
+        return Response({'error': 'start_date must not be after end_date'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    group_by = [key for key in request.GET.get('group_by', 'provider').split(',') if key]
+    if not group_by or any(key not in rollups.GROUP_FIELDS for key in group_by):
+        return Response(
+            {'error': f"group_by must be a comma-separated list of {', '.join(rollups.GROUP_FIELDS)}"},
+            status=status.HTTP_400_BAD_REQUEST
         )
-        serializer = PlanPurchaseSerializer(purchase)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    except PlanPurchase.DoesNotExist:
+    
+    # Summed from the rollup buckets, never from the purchases themselves
+    results = rollups.report(start_date, end_date, group_by)
+    totals = {
+        'success_count': sum(row['success_count'] for row in results),
+        'failed_count': sum(row['failed_count'] for row in results),
+        'revenue': sum((row['revenue'] for row in results), Decimal('0.00')),
+    }
+    completed = totals['success_count'] + totals['failed_count']
+    totals['success_rate'] = round(totals['success_count'] / completed, 4) if completed else None
+    # Money as strings, like the serializers' DecimalFields, not JSON floats.
+    for row in results + [totals]:
+        row['revenue'] = str(Decimal(row['revenue']).quantize(Decimal('0.01')))
+    return Response({
+        'start_date': start_date,
+        'end_date': end_date,
+        'group_by': group_by,
+        'totals': totals,
+        'results': results
+    }, status=status.HTTP_200_OK)
+
+def _wait_seconds(request):
+    try:
+        wait = float(request.GET.get('wait', 0))
+    except ValueError:
+        return None
+    # nan/inf parse as floats but are not a duration.
+    return wait if math.isfinite(wait) else None
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def purchase_detail(request, pk):
+    # ?wait=<seconds> long-polls until the purchase is no longer pending.
+    wait = _wait_seconds(request)
+    if wait is None:
+        return Response({'error': 'wait must be a number of seconds'}, status=status.HTTP_400_BAD_REQUEST)
+    purchases = PlanPurchase.objects.select_related('plan', 'plan__provider').filter(user=request.user)
+    purchase = pipeline.wait_for_result(purchases, pk, wait)
+    if purchase is None:
         return Response({'error': 'Purchase not found'}, status=status.HTTP_404_NOT_FOUND)
+    serializer = PlanPurchaseSerializer(purchase)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def purchase_status(request, pk):
+    wait = _wait_seconds(request)
+    if wait is None:
+        return Response({'error': 'wait must be a number of seconds'}, status=status.HTTP_400_BAD_REQUEST)
+    purchases = PlanPurchase.objects.filter(user=request.user).only(
+        'id', 'transaction_id', 'payment_status', 'payment_gateway_response', 'updated_at', 'completed_at'
+    )
+    purchase = pipeline.wait_for_result(purchases, pk, wait)
+    if purchase is None:
+        return Response({'error': 'Purchase not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'id': purchase.id,
+        'transaction_id': purchase.transaction_id,
+        'payment_status': purchase.payment_status,
+        'payment_gateway_response': purchase.payment_gateway_response,
+        'updated_at': purchase.updated_at,
+        'completed_at': purchase.completed_at
+    }, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def retry_payment(request, pk):
     try:
-        purchase = PlanPurchase.objects.get(pk=pk, user=request.user, payment_status='failed')
-        
-        # Reset payment status to pending
-        purchase.payment_status = 'pending'
-        purchase.save()
-        
-        # Simulate retry payment processing
-        time.sleep(1)
-        
-        # Random success/failure for demo (70% success rate on retry)
-        payment_success = random.choice([True, True, True, False])
-        
-        if payment_success:
-            purchase.payment_status = 'success'
-            purchase.completed_at = timezone.now()
-            purchase.payment_gateway_response = {
-                'status': 'success',
-                'message': 'Payment completed successfully on retry',
-                'gateway_txn_id': f"GTW_{purchase.transaction_id}_RETRY"
-            }
-        else:
-            purchase.payment_status = 'failed'
-            purchase.payment_gateway_response = {
-                'status': 'failed',
-                'message': 'Payment failed on retry',
-                'error_code': 'PAYMENT_DECLINED'
-            }
-        
-        purchase.save()
-        
-        serializer = PlanPurchaseSerializer(purchase)
-        return Response({
-            'message': 'Payment retry processed',
-            'purchase': serializer.data
-        }, status=status.HTTP_200_OK)
-        
+        purchase = PlanPurchase.objects.select_related('plan').get(pk=pk, user=request.user, payment_status='failed')
     except PlanPurchase.DoesNotExist:
         return Response({'error': 'Purchase not found or not eligible for retry'}, status=status.HTTP_404_NOT_FOUND)
+    
+    wallet = None
+    if purchase.payment_method == 'wallet':
+        wallet = Wallet.objects.filter(user=request.user).first()
+        if wallet is None:
+            return Response({'error': 'Wallet not found'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        with transaction.atomic():
+            # The failed attempt's hold was released, so hold the funds again.
+            hold = None
+            if wallet is not None:
+                hold = ledger.reserve(
+                    wallet, purchase.amount, created_by=request.user, reference=purchase.transaction_id,
+                    description=f"Recharge retry for {purchase.phone_number}"
+                )
+            # Only one of several concurrent retries moves the purchase back to pending.
+            if not state.transition(
+                purchase, 'pending', from_status='failed', wallet_hold=hold, attempts=0, next_attempt_at=None
+            ):
+                transaction.set_rollback(True)
+                return Response({'error': 'Purchase is already being retried'}, status=status.HTTP_409_CONFLICT)
+            pipeline.submit(purchase.pk, retry=True)
+    except ledger.InsufficientBalance:
+        return Response({'error': 'Insufficient wallet balance'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = PlanPurchaseSerializer(purchase)
+    return Response({
+        'message': 'Payment retry accepted for processing',
+        'purchase': serializer.data
+    }, status=status.HTTP_202_ACCEPTED)
@@ -4,8 +4,8 @@ from .models import Support
 from .serializers import SupportSerializer, SupportStatusUpdateSerializer,SupportCreateSerializer
 from rest_framework.permissions import IsAuthenticated
 from .permissions import IsAdminUserOnly
-from notifications.utils import generate_notification_content,is_notification_allowed
-from notifications.models import Notification
+from django.db import transaction
+from notifications import outbox
 # List all support tickets
 class SupportCreateView(generics.CreateAPIView):
     queryset = Support.objects.all()
@@ -32,19 +32,7 @@ class SupportStatusUpdateView(generics.UpdateAPIView):
     lookup_field = 'id'
 
     def perform_update(self, serializer):
-        support = serializer.save()
-
-        # ✅ Create notification after support update
-        if is_notification_allowed('recharge_success', 'in_app'):
-            data = generate_notification_content(
-                user=support.user,
-                notification_type='SUPPORT',
-                related_id=support.id
-                )
-            Notification.objects.create(
-                user=support.user,
-                title=data['title'],
-                message=data['message'],
-                notification_type='SUPPORT',
-                related_id=support.id
-                )
+        # ✅ Queue the notification with the support update; relay_notifications delivers it
+        with transaction.atomic():
+            support = serializer.save()
+            outbox.enqueue('SUPPORT_UPDATED', support.user_id, related_id=support.id)
@@ -1,24 +1,43 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Wallet, WalletTransaction, UserMargin
+from .models import Wallet, WalletStripe, WalletHold, WalletTransaction, WalletBalanceSnapshot, ReconciliationRun, UserMargin
 
 @admin.register(Wallet)
 class WalletAdmin(admin.ModelAdmin):
-    list_display = ('user', 'balance', 'user_type', 'created_at', 'updated_at')
+    list_display = ('user', 'balance', 'held_amount', 'user_type', 'created_at', 'updated_at')
     list_filter = ('user__user_type', 'created_at', 'updated_at')
     search_fields = ('user__email', 'user__username', 'user__phone')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('held_amount', 'created_at', 'updated_at')
     
     def user_type(self, obj):
         return obj.user.user_type.title()
     user_type.short_description = 'User Type'
 
+@admin.register(WalletStripe)
+class WalletStripeAdmin(admin.ModelAdmin):
+    list_display = ('wallet', 'stripe', 'balance', 'updated_at')
+    search_fields = ('wallet__user__email',)
+    readonly_fields = ('wallet', 'stripe', 'balance', 'updated_at')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('wallet__user')
+
+@admin.register(WalletHold)
+class WalletHoldAdmin(admin.ModelAdmin):
+    list_display = ('wallet', 'amount', 'status', 'reference', 'created_at', 'expires_at', 'settled_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('wallet__user__email', 'reference')
+    readonly_fields = ('wallet', 'amount', 'status', 'reference', 'created_by', 'created_at', 'expires_at', 'settled_at')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('wallet__user')
+
 @admin.register(WalletTransaction)
 class WalletTransactionAdmin(admin.ModelAdmin):
-    list_display = ('wallet_user', 'transaction_type', 'amount', 'created_by', 'created_at')
+    list_display = ('wallet_user', 'transaction_type', 'amount', 'balance_after', 'created_by', 'created_at')
     list_filter = ('transaction_type', 'created_at', 'wallet__user__user_type')
     search_fields = ('wallet__user__email', 'wallet__user__username', 'description')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('balance_after', 'created_at')
     
     def wallet_user(self, obj):
         return obj.wallet.user.email
@@ -27,6 +46,21 @@ class WalletTransactionAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('wallet__user', 'created_by')
 
+@admin.register(WalletBalanceSnapshot)
+class WalletBalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('wallet', 'balance', 'last_transaction_id', 'taken_at')
+    search_fields = ('wallet__user__email',)
+    readonly_fields = ('wallet', 'balance', 'last_transaction_id', 'taken_at')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('wallet__user')
+
+@admin.register(ReconciliationRun)
+class ReconciliationRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'finished_at', 'incremental', 'wallets_checked', 'discrepancies', 'report_path')
+    list_filter = ('incremental',)
+    readonly_fields = ('started_at', 'finished_at', 'incremental', 'wallets_checked', 'discrepancies', 'report_path')
+
 @admin.register(UserMargin)
 class UserMarginAdmin(admin.ModelAdmin):
     list_display = ('user', 'user_type', 'margin_percentage', 'admin', 'created_at', 'updated_at')
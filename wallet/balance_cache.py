@@ -0,0 +1,109 @@
+"""
+Write-through cache of wallet balances, keyed by user id.
+
+The ledger stores the new balance after every committed credit/debit, and
+balance reads check here before the database. Each entry carries the wallet's
+``version`` (plus its stripes' versions, for a striped wallet) so an older
+write can never replace a newer one, and every entry expires after
+``WALLET_BALANCE_CACHE_TTL`` seconds so a missed write-through cannot serve a
+stale balance indefinitely.
+"""
+from decimal import Decimal
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+HITS_KEY = 'wallet:balance:hits'
+MISSES_KEY = 'wallet:balance:misses'
+
+# A writer that dies holding the store lock only blocks the key this long.
+LOCK_TIMEOUT = 2
+# How long store() waits for the lock before dropping the entry instead.
+LOCK_WAIT = 0.2
+
+
+def _key(user_id):
+    return f'wallet:balance:{user_id}'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Counter missing (first use or evicted): create it, or retry if a
+        # concurrent request just did.
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get(user_id):
+    """
+    Cached ``{'wallet_id', 'balance', 'held_amount', 'available_balance',
+    'version', 'created_at', 'updated_at'}`` for the user, or ``None``.
+    """
+    entry = cache.get(_key(user_id), version=settings.WALLET_BALANCE_CACHE_VERSION)
+    _count(HITS_KEY if entry is not None else MISSES_KEY)
+    return entry
+
+
+def store(wallet):
+    """
+    Cache the wallet's balance unless a newer version is already cached.
+
+    A wallet annotated by ``ledger.with_stripe_balance`` is cached with its
+    stripes included. The compare and the write run under a per-user lock
+    taken with ``cache.add``, so two writers cannot both pass the version
+    check and leave the older entry in place. If the lock is not free within
+    ``LOCK_WAIT`` the entry is dropped and the next read reloads it.
+    """
+    balance = wallet.balance + (getattr(wallet, 'stripe_balance', None) or Decimal('0.00'))
+    entry = {
+        'wallet_id': wallet.pk,
+        'balance': balance,
+        'held_amount': wallet.held_amount,
+        'available_balance': balance - wallet.held_amount,
+        'version': wallet.version + (getattr(wallet, 'stripe_version', None) or 0),
+        'created_at': wallet.created_at,
+        'updated_at': wallet.updated_at,
+    }
+    key = _key(wallet.user_id)
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(lock, 1, timeout=LOCK_TIMEOUT, version=settings.WALLET_BALANCE_CACHE_VERSION):
+        if time.monotonic() >= deadline:
+            invalidate(wallet.user_id)
+            return entry
+        time.sleep(0.005)
+    try:
+        current = cache.get(key, version=settings.WALLET_BALANCE_CACHE_VERSION)
+        if current is None or current['version'] < entry['version']:
+            cache.set(key, entry, timeout=settings.WALLET_BALANCE_CACHE_TTL, version=settings.WALLET_BALANCE_CACHE_VERSION)
+    finally:
+        cache.delete(lock, version=settings.WALLET_BALANCE_CACHE_VERSION)
+    return entry
+
+
+def store_on_commit(wallet):
+    """Write the wallet's current balance through once the surrounding transaction commits."""
+    snapshot = type(wallet)(
+        pk=wallet.pk, user_id=wallet.user_id, balance=wallet.balance, held_amount=wallet.held_amount,
+        version=wallet.version, created_at=wallet.created_at, updated_at=wallet.updated_at,
+    )
+    transaction.on_commit(lambda: store(snapshot))
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id), version=settings.WALLET_BALANCE_CACHE_VERSION)
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
@@ -0,0 +1,695 @@
+"""
+Wallet ledger service.
+
+All balance changes go through ``credit`` / ``debit`` (or ``apply_batch`` for
+many wallets at once, ``reserve`` / ``capture`` / ``release`` for holds). Each call applies the change to the wallet row with one
+conditional UPDATE and writes the matching WalletTransaction inside the same
+database transaction, so concurrent requests can neither lose updates nor
+leave a balance without its ledger row.
+
+A striped wallet's stripe balances are folded into ``Wallet.balance`` at the
+start of every such write (``fold_stripes``), so the balance a write checks,
+and the ``balance_after`` it records, always include striped credits.
+"""
+from datetime import timedelta
+from decimal import Decimal
+import random
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Case, DecimalField, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import User, UserType
+from .models import Wallet, WalletStripe, WalletHold, WalletTransaction, WalletBalanceSnapshot
+from . import balance_cache
+
+
+# User types that may have wallet transactions.
+WALLET_USER_TYPES = (UserType.DISTRIBUTOR, UserType.RETAILER)
+
+
+class InsufficientBalance(Exception):
+    """Raised when a debit would take a wallet below zero."""
+
+
+class HoldNotActive(Exception):
+    """Raised when capturing or releasing a hold that was already settled or expired."""
+
+
+def credit(wallet, amount, created_by, description='', transaction_type='add_to_wallet'):
+    with transaction.atomic():
+        fold_stripes([wallet.pk])
+        wallet.add_balance(amount)
+        balance_cache.store_on_commit(wallet)
+        # The UPDATE above holds the row lock until commit, so the refreshed
+        # balance is exactly the balance after this transaction.
+        return WalletTransaction.objects.create(
+            wallet=wallet,
+            transaction_type=transaction_type,
+            amount=amount,
+            balance_after=wallet.balance,
+            description=description,
+            created_by=created_by,
+        )
+
+
+def debit(wallet, amount, created_by, description='', transaction_type='debit_from_wallet'):
+    with transaction.atomic():
+        fold_stripes([wallet.pk])
+        if not wallet.debit_balance(amount):
+            raise InsufficientBalance("Insufficient wallet balance")
+        balance_cache.store_on_commit(wallet)
+        return WalletTransaction.objects.create(
+            wallet=wallet,
+            transaction_type=transaction_type,
+            amount=amount,
+            balance_after=wallet.balance,
+            description=description,
+            created_by=created_by,
+        )
+
+
+def reserve(wallet, amount, created_by, reference='', description='', ttl=None):
+    """
+    Hold ``amount`` of the wallet's available balance for a pending payment.
+
+    Only a single conditional UPDATE touches the wallet row, so its lock is
+    held for milliseconds rather than for the payment round trip. The hold
+    expires after ``ttl`` seconds (default ``WALLET_HOLD_TTL_SECONDS``).
+    Raises ``InsufficientBalance`` if the available balance is too low.
+    """
+    ttl = settings.WALLET_HOLD_TTL_SECONDS if ttl is None else ttl
+    with transaction.atomic():
+        fold_stripes([wallet.pk])
+        reserved = Wallet.objects.filter(pk=wallet.pk, balance__gte=F('held_amount') + amount).update(
+            held_amount=F('held_amount') + amount, version=F('version') + 1, updated_at=timezone.now()
+        )
+        if not reserved:
+            raise InsufficientBalance("Insufficient wallet balance")
+        wallet.refresh_balance()
+        balance_cache.store_on_commit(wallet)
+        return WalletHold.objects.create(
+            wallet=wallet,
+            amount=amount,
+            reference=reference,
+            description=description,
+            created_by=created_by,
+            expires_at=timezone.now() + timedelta(seconds=ttl),
+        )
+
+
+def reserve_many(wallet, entries, created_by, ttl=None):
+    """
+    Place one hold per ``(amount, reference, description)`` entry with a single wallet UPDATE.
+
+    Either every hold is placed or, if the available balance cannot cover
+    their total, none is (``InsufficientBalance``). Returns the holds in
+    entry order.
+    """
+    ttl = settings.WALLET_HOLD_TTL_SECONDS if ttl is None else ttl
+    total = sum((amount for amount, _, _ in entries), Decimal('0.00'))
+    with transaction.atomic():
+        fold_stripes([wallet.pk])
+        reserved = Wallet.objects.filter(pk=wallet.pk, balance__gte=F('held_amount') + total).update(
+            held_amount=F('held_amount') + total, version=F('version') + 1, updated_at=timezone.now()
+        )
+        if not reserved:
+            raise InsufficientBalance("Insufficient wallet balance")
+        wallet.refresh_balance()
+        balance_cache.store_on_commit(wallet)
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        return WalletHold.objects.bulk_create([
+            WalletHold(
+                wallet=wallet,
+                amount=amount,
+                reference=reference,
+                description=description,
+                created_by=created_by,
+                expires_at=expires_at,
+            )
+            for amount, reference, description in entries
+        ])
+
+
+def _settle(hold, new_status, due_by=None):
+    # Only the first settlement of a hold may move money; the conditional
+    # UPDATE makes racing capture/release/expire calls agree on a winner.
+    holds = WalletHold.objects.filter(pk=hold.pk, status='active')
+    if due_by is not None:
+        holds = holds.filter(expires_at__lte=due_by)
+    settled = holds.update(
+        status=new_status, settled_at=timezone.now()
+    )
+    if not settled:
+        raise HoldNotActive(f"Hold {hold.pk} is no longer active")
+    hold.status = new_status
+
+
+def extend(hold, ttl=None):
+    """
+    Push an active hold's ``expires_at`` to ``ttl`` seconds from now (default
+    ``WALLET_HOLD_TTL_SECONDS``). Raises ``HoldNotActive`` if it was settled.
+    """
+    ttl = settings.WALLET_HOLD_TTL_SECONDS if ttl is None else ttl
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    if not WalletHold.objects.filter(pk=hold.pk, status='active').update(expires_at=expires_at):
+        raise HoldNotActive(f"Hold {hold.pk} is no longer active")
+    hold.expires_at = expires_at
+
+
+def capture(hold, description=''):
+    """Debit the held funds from the wallet and close the hold. Returns the WalletTransaction."""
+    with transaction.atomic():
+        _settle(hold, 'captured')
+        fold_stripes([hold.wallet_id])
+        Wallet.objects.filter(pk=hold.wallet_id).update(
+            balance=F('balance') - hold.amount,
+            held_amount=F('held_amount') - hold.amount,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        wallet = hold.wallet
+        wallet.refresh_balance()
+        balance_cache.store_on_commit(wallet)
+        return WalletTransaction.objects.create(
+            wallet=wallet,
+            transaction_type='debit_from_wallet',
+            amount=hold.amount,
+            balance_after=wallet.balance,
+            description=description or hold.description,
+            reference=hold.reference[:32],
+            created_by=hold.created_by,
+        )
+
+
+def release(hold, new_status='released', due_by=None):
+    """
+    Return the held funds to the wallet's available balance without moving money.
+
+    With ``due_by`` the hold is only released if it still expires by then
+    (``HoldNotActive`` otherwise), so a hold extended meanwhile is kept.
+    """
+    with transaction.atomic():
+        _settle(hold, new_status, due_by)
+        fold_stripes([hold.wallet_id])
+        Wallet.objects.filter(pk=hold.wallet_id).update(
+            held_amount=F('held_amount') - hold.amount, version=F('version') + 1, updated_at=timezone.now()
+        )
+        hold.wallet.refresh_balance()
+        balance_cache.store_on_commit(hold.wallet)
+
+
+def expire_holds(limit=1000):
+    """Release active holds past their ``expires_at``. Returns how many were expired."""
+    expired = 0
+    now = timezone.now()
+    holds = (
+        WalletHold.objects.filter(status='active', expires_at__lte=now)
+        .select_related('wallet')
+        .order_by('expires_at')[:limit]
+    )
+    for hold in holds:
+        try:
+            release(hold, new_status='expired', due_by=now)
+        except HoldNotActive:
+            # Captured, released or extended while we were sweeping.
+            continue
+        expired += 1
+    return expired
+
+
+def house_wallet():
+    """The admin wallet that receives client payments (lowest user id if there are several admins)."""
+    return (
+        Wallet.objects
+        .filter(user__user_type=UserType.ADMIN)
+        .select_related('user')
+        .order_by('user_id')
+        .first()
+    )
+
+
+def credit_striped(wallet, amount, created_by, description='', transaction_type='add_to_wallet'):
+    """
+    Credit a hot wallet by adding to one of its ``HOUSE_WALLET_STRIPES`` sub-balances.
+
+    Concurrent credits mostly hit different stripe rows instead of queueing on
+    the wallet row. The ledger row has no ``balance_after`` because the wallet
+    total is only known once the stripes are summed. Each credit bumps its
+    stripe's ``version``, which counts towards the wallet's cached version,
+    and the cached balance is reloaded once the credit commits.
+    """
+    if settings.HOUSE_WALLET_STRIPES <= 1:
+        return credit(wallet, amount, created_by, description, transaction_type)
+
+    stripe = random.randrange(settings.HOUSE_WALLET_STRIPES)
+    with transaction.atomic():
+        stripes = WalletStripe.objects.filter(wallet=wallet, stripe=stripe)
+        changes = {'balance': F('balance') + amount, 'version': F('version') + 1, 'updated_at': timezone.now()}
+        if not stripes.update(**changes):
+            try:
+                with transaction.atomic():
+                    WalletStripe.objects.create(wallet=wallet, stripe=stripe, balance=amount, version=1)
+            except IntegrityError:
+                # Another credit created this stripe first.
+                stripes.update(**changes)
+        transaction.on_commit(lambda: refresh_cached_balance(wallet.user_id))
+        return WalletTransaction.objects.create(
+            wallet=wallet,
+            transaction_type=transaction_type,
+            amount=amount,
+            description=description,
+            created_by=created_by,
+        )
+
+
+def stripe_balance_subquery(field='balance', output_field=None):
+    return Subquery(
+        WalletStripe.objects
+        .filter(wallet=OuterRef('pk'))
+        .order_by()
+        .values('wallet')
+        .annotate(total=Sum(field))
+        .values('total'),
+        output_field=output_field or DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def with_stripe_balance(queryset):
+    """
+    Annotate wallets with ``stripe_balance``, the not-yet-consolidated stripe
+    total, and ``stripe_version``, the sum of the stripes' versions.
+    """
+    return queryset.annotate(
+        stripe_balance=Coalesce(stripe_balance_subquery(), Value(Decimal('0.00'))),
+        stripe_version=Coalesce(stripe_balance_subquery('version', BigIntegerField()), Value(0)),
+    )
+
+
+def refresh_cached_balance(user_id):
+    """Load the user's wallet, stripes included, into the balance cache. Returns the entry, or ``None`` without a wallet."""
+    wallet = with_stripe_balance(Wallet.objects.filter(user_id=user_id)).first()
+    if wallet is None:
+        return None
+    return balance_cache.store(wallet)
+
+
+def fold_stripes(wallet_ids):
+    """
+    Move the stripe balances of the given wallets into ``Wallet.balance``.
+
+    Call it inside the caller's transaction before the wallets are locked or
+    written: stripes are always locked before their wallet, so this cannot
+    deadlock with ``consolidate_stripes``. ``wallet_ids`` may be a list or a
+    queryset of ids. A wallet without stripes costs one indexed read. The
+    stripes' versions move into ``Wallet.version`` with their balances, so
+    the wallet's cached version only ever grows.
+    Returns ``{wallet_id: amount moved}``.
+    """
+    stripes = list(
+        WalletStripe.objects.select_for_update()
+        .filter(wallet_id__in=wallet_ids)
+        .exclude(balance=0)
+        .order_by('wallet_id', 'stripe')
+    )
+    totals = {}
+    versions = {}
+    for stripe in stripes:
+        totals[stripe.wallet_id] = totals.get(stripe.wallet_id, Decimal('0.00')) + stripe.balance
+        versions[stripe.wallet_id] = versions.get(stripe.wallet_id, 0) + stripe.version
+    if not totals:
+        return totals
+    now = timezone.now()
+    WalletStripe.objects.filter(pk__in=[stripe.pk for stripe in stripes]).update(
+        balance=Decimal('0.00'), version=0, updated_at=now
+    )
+    for wallet_id, total in totals.items():
+        Wallet.objects.filter(pk=wallet_id).update(
+            balance=F('balance') + total, version=F('version') + versions[wallet_id] + 1, updated_at=now
+        )
+    return totals
+
+
+def consolidate_stripes(wallet_id):
+    """
+    Fold a wallet's stripe balances into ``Wallet.balance``.
+
+    The stripes are locked only for this short transaction; credits arriving
+    meanwhile wait briefly and then land on the zeroed stripes.
+    Returns the amount moved.
+    """
+    with transaction.atomic():
+        total = fold_stripes([wallet_id]).get(wallet_id, Decimal('0.00'))
+        if not total:
+            return total
+        user_id = Wallet.objects.values_list('user_id', flat=True).get(pk=wallet_id)
+        # Reload after commit: credits that waited on the stripe locks may
+        # already have landed, and their versions order the cached entries.
+        transaction.on_commit(lambda: refresh_cached_balance(user_id))
+    return total
+
+
+def apply_batch(entries, created_by):
+    """
+    Apply many credits/debits in one transaction.
+
+    ``entries`` is a list of dicts with ``user_email``, ``amount``,
+    ``transaction_type`` and optional ``description``. Users are resolved with
+    one query, the affected wallets are locked in primary-key order (so two
+    overlapping batches cannot deadlock), balances are written with one bulk
+    UPDATE and the ledger rows with one bulk INSERT. Rows that cannot be
+    applied are skipped and reported; the rest still go through.
+
+    Returns one result dict per entry, in input order.
+    """
+    results = [{'row': index + 1, 'user_email': entry['user_email']} for index, entry in enumerate(entries)]
+
+    users = {
+        user.email: user
+        for user in User.objects.filter(email__in={entry['user_email'] for entry in entries})
+        .only('id', 'email', 'user_type')
+    }
+
+    with transaction.atomic():
+        fold_stripes(Wallet.objects.filter(user_id__in=[user.pk for user in users.values()]).values('pk'))
+        # Crediting a user without a wallet creates it, as add_to_wallet does,
+        # but only for users whose rows will pass validation below.
+        credited_user_ids = {
+            users[entry['user_email']].pk
+            for entry in entries
+            if entry['user_email'] in users
+            and users[entry['user_email']].user_type in WALLET_USER_TYPES
+            and entry['transaction_type'] in WalletTransaction.CREDIT_TYPES
+        }
+        Wallet.objects.bulk_create(
+            [Wallet(user_id=user_id) for user_id in credited_user_ids],
+            ignore_conflicts=True,
+        )
+
+        wallets = {
+            wallet.user_id: wallet
+            for wallet in Wallet.objects.select_for_update()
+            .filter(user_id__in=[user.pk for user in users.values()])
+            .order_by('pk')
+        }
+
+        now = timezone.now()
+        touched = {}
+        ledger_rows = []
+        for entry, result in zip(entries, results):
+            user = users.get(entry['user_email'])
+            if user is None:
+                result.update(status='error', error='User not found')
+                continue
+            if user.user_type not in WALLET_USER_TYPES:
+                result.update(status='error', error='Only distributors and retailers can have wallet transactions.')
+                continue
+            wallet = wallets.get(user.pk)
+            if wallet is None:
+                result.update(status='error', error='Wallet not found')
+                continue
+
+            amount = entry['amount']
+            if entry['transaction_type'] in WalletTransaction.DEBIT_TYPES:
+                if wallet.available_balance < amount:
+                    result.update(status='error', error='Insufficient wallet balance')
+                    continue
+                wallet.balance -= amount
+            else:
+                wallet.balance += amount
+            if wallet.pk not in touched:
+                wallet.version += 1
+                touched[wallet.pk] = wallet
+            wallet.updated_at = now
+
+            ledger_rows.append(WalletTransaction(
+                wallet=wallet,
+                transaction_type=entry['transaction_type'],
+                amount=amount,
+                balance_after=wallet.balance,
+                description=entry.get('description', ''),
+                created_by=created_by,
+            ))
+            result.update(status='ok', balance_after=wallet.balance)
+
+        Wallet.objects.bulk_update(touched.values(), ['balance', 'version', 'updated_at'], batch_size=500)
+        WalletTransaction.objects.bulk_create(ledger_rows, batch_size=1000)
+        for wallet in touched.values():
+            balance_cache.store_on_commit(wallet)
+
+    return results
+
+
+def transfer(source_user, transfers, created_by):
+    """
+    Move funds from ``source_user``'s wallet to one or more other users' wallets atomically.
+
+    ``transfers`` is a list of ``(destination_user, amount, description)``.
+    Every wallet involved is locked in primary-key order, so two opposing
+    transfers (A->B and B->A) always lock in the same order and cannot
+    deadlock. Each leg writes a transfer_out / transfer_in pair sharing one
+    ``reference``. Destination wallets are created if missing. Raises
+    ``InsufficientBalance`` if the source cannot cover the total, in which
+    case nothing is moved.
+
+    Returns ``(reference, [(destination_user, amount, source_balance_after, destination_balance_after)])``.
+    """
+    destination_ids = {user.pk for user, _, _ in transfers}
+    if source_user.pk in destination_ids:
+        raise ValueError("Cannot transfer to the source wallet")
+
+    reference = uuid.uuid4().hex
+    with transaction.atomic():
+        Wallet.objects.bulk_create(
+            [Wallet(user_id=user_id) for user_id in destination_ids],
+            ignore_conflicts=True,
+        )
+        fold_stripes(Wallet.objects.filter(user_id__in=destination_ids | {source_user.pk}).values('pk'))
+        wallets = {
+            wallet.user_id: wallet
+            for wallet in Wallet.objects.select_for_update()
+            .filter(user_id__in=destination_ids | {source_user.pk})
+            .order_by('pk')
+        }
+        source = wallets.get(source_user.pk)
+        total = sum((amount for _, amount, _ in transfers), Decimal('0.00'))
+        if source is None or source.available_balance < total:
+            raise InsufficientBalance("Insufficient wallet balance")
+
+        now = timezone.now()
+        ledger_rows = []
+        legs = []
+        for destination_user, amount, description in transfers:
+            destination = wallets[destination_user.pk]
+            source.balance -= amount
+            destination.balance += amount
+            ledger_rows.append(WalletTransaction(
+                wallet=source,
+                transaction_type='transfer_out',
+                amount=amount,
+                balance_after=source.balance,
+                description=description or f'Transfer to {destination_user.email}',
+                reference=reference,
+                created_by=created_by,
+            ))
+            ledger_rows.append(WalletTransaction(
+                wallet=destination,
+                transaction_type='transfer_in',
+                amount=amount,
+                balance_after=destination.balance,
+                description=description or f'Transfer from {source_user.email}',
+                reference=reference,
+                created_by=created_by,
+            ))
+            legs.append((destination_user, amount, source.balance, destination.balance))
+
+        for wallet in wallets.values():
+            wallet.version += 1
+            wallet.updated_at = now
+        Wallet.objects.bulk_update(wallets.values(), ['balance', 'version', 'updated_at'])
+        WalletTransaction.objects.bulk_create(ledger_rows, batch_size=1000)
+        for wallet in wallets.values():
+            balance_cache.store_on_commit(wallet)
+    return reference, legs
+
+
+def signed_amount():
+    """Expression giving a WalletTransaction's effect on the balance (+credit / -debit)."""
+    return Case(
+        When(transaction_type__in=WalletTransaction.DEBIT_TYPES, then=-F('amount')),
+        default=F('amount'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def sum_transactions(queryset):
+    return queryset.aggregate(
+        total=Coalesce(Sum(signed_amount()), Value(Decimal('0.00')))
+    )['total']
+
+
+def balance_as_of(wallet, when):
+    """
+    Balance of ``wallet`` at ``when``.
+
+    Uses the newest transaction's ``balance_after`` when available (one index
+    seek). Striped credits carry no ``balance_after``, so after them the
+    newest row that has one is taken and the credits since are added. Older
+    rows without it fall back to the nearest earlier snapshot plus the
+    transactions written after it, instead of summing the whole history.
+    """
+    transactions = WalletTransaction.objects.filter(wallet=wallet, created_at__lte=when)
+    newest_first = transactions.order_by('-created_at', '-id')
+    latest = newest_first.values_list('balance_after', flat=True).first()
+    if latest is not None:
+        return latest
+    anchor = newest_first.filter(balance_after__isnull=False).values('id', 'created_at', 'balance_after').first()
+    if anchor is not None:
+        return anchor['balance_after'] + sum_transactions(transactions.filter(
+            Q(created_at__gt=anchor['created_at']) | Q(created_at=anchor['created_at'], id__gt=anchor['id'])
+        ))
+
+    snapshot = (
+        WalletBalanceSnapshot.objects
+        .filter(wallet=wallet, taken_at__lte=when)
+        .order_by('-taken_at')
+        .first()
+    )
+    if snapshot is None:
+        return sum_transactions(transactions)
+    if snapshot.last_transaction_id is not None:
+        transactions = transactions.filter(id__gt=snapshot.last_transaction_id)
+    return snapshot.balance + sum_transactions(transactions)
+
+
+def take_snapshots(wallet_ids):
+    """
+    Snapshot the given wallets' current balances.
+
+    Stripe balances are folded in first, so a snapshot covers every ledger row
+    up to its ``last_transaction_id``, striped credits included. Wallets with
+    no transactions since their latest snapshot are skipped.
+    Returns the number of snapshots written.
+    """
+    latest_snapshot_txn = (
+        WalletBalanceSnapshot.objects
+        .filter(wallet=OuterRef('pk'))
+        .order_by('-taken_at')
+        .values('last_transaction_id')[:1]
+    )
+    with transaction.atomic():
+        fold_stripes(wallet_ids)
+        # Lock the chunk briefly so balance and newest transaction id agree.
+        balances = dict(
+            Wallet.objects
+            .select_for_update()
+            .filter(pk__in=wallet_ids)
+            .order_by('pk')
+            .values_list('pk', 'balance')
+        )
+        last_txns = dict(
+            WalletTransaction.objects
+            .filter(wallet_id__in=balances)
+            .order_by()
+            .values('wallet_id')
+            .annotate(last_id=Max('id'))
+            .values_list('wallet_id', 'last_id')
+        )
+        snapshot_txns = dict(
+            Wallet.objects
+            .filter(pk__in=balances)
+            .annotate(snapshot_txn=Subquery(latest_snapshot_txn))
+            .values_list('pk', 'snapshot_txn')
+        )
+        now = timezone.now()
+        snapshots = [
+            WalletBalanceSnapshot(
+                wallet_id=wallet_id,
+                balance=balances[wallet_id],
+                last_transaction_id=last_id,
+                taken_at=now,
+            )
+            for wallet_id, last_id in last_txns.items()
+            if last_id != snapshot_txns.get(wallet_id)
+        ]
+        WalletBalanceSnapshot.objects.bulk_create(snapshots)
+    return len(snapshots)
+
+
+def reconcile_range(first_id, last_id, since=None):
+    """
+    Compare balances with ledger sums for wallets with ``first_id <= pk < last_id``.
+
+    Uses one grouped aggregate over the chunk's transactions. With ``since``,
+    only wallets updated or given a transaction after that time are checked.
+    Balances and sums are read by separate statements, so a write committing
+    between them can look like a mismatch; each mismatch is checked again
+    under the wallet's locks (``_recheck``) before it is reported.
+    Returns ``(wallets_checked, discrepancies)``.
+    """
+    wallets = Wallet.objects.filter(pk__gte=first_id, pk__lt=last_id)
+    if since is not None:
+        recent = WalletTransaction.objects.filter(
+            wallet_id__gte=first_id, wallet_id__lt=last_id, created_at__gte=since
+        ).values('wallet_id')
+        wallets = wallets.filter(Q(updated_at__gte=since) | Q(pk__in=recent))
+    wallets = list(
+        with_stripe_balance(wallets).values_list('pk', 'user__email', 'balance', 'stripe_balance')
+    )
+    if not wallets:
+        return 0, []
+
+    transactions = WalletTransaction.objects.filter(wallet_id__gte=first_id, wallet_id__lt=last_id)
+    if since is not None:
+        transactions = transactions.filter(wallet_id__in=[wallet[0] for wallet in wallets])
+    totals = dict(
+        transactions.order_by()
+        .values('wallet_id')
+        .annotate(total=Sum(signed_amount()))
+        .values_list('wallet_id', 'total')
+    )
+
+    discrepancies = []
+    for wallet_id, email, balance, stripe_total in wallets:
+        ledger_total = (totals.get(wallet_id) or Decimal('0.00')).quantize(Decimal('0.01'))
+        if balance + stripe_total == ledger_total:
+            continue
+        actual, ledger_total = _recheck(wallet_id)
+        if actual != ledger_total:
+            discrepancies.append({
+                'wallet_id': wallet_id,
+                'user_email': email,
+                'balance': actual,
+                'ledger_total': ledger_total,
+                'difference': actual - ledger_total,
+            })
+    return len(wallets), discrepancies
+
+
+def _recheck(wallet_id):
+    """
+    ``(balance, ledger_total)`` for one wallet, read in a single statement
+    after taking its stripe and wallet row locks (in ``fold_stripes`` order),
+    so no write can be half seen.
+    """
+    ledger_total = Subquery(
+        WalletTransaction.objects
+        .filter(wallet=OuterRef('pk'))
+        .order_by()
+        .values('wallet')
+        .annotate(total=Sum(signed_amount()))
+        .values('total'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    with transaction.atomic():
+        list(WalletStripe.objects.select_for_update().filter(wallet_id=wallet_id).order_by('stripe').values_list('pk'))
+        list(Wallet.objects.select_for_update().filter(pk=wallet_id).values_list('pk'))
+        wallet = (
+            with_stripe_balance(Wallet.objects.filter(pk=wallet_id))
+            .annotate(ledger_total=Coalesce(ledger_total, Value(Decimal('0.00'))))
+            .get()
+        )
+    return wallet.balance + wallet.stripe_balance, wallet.ledger_total.quantize(Decimal('0.01'))
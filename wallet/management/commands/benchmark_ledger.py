@@ -0,0 +1,128 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection, OperationalError
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import time
+import uuid
+
+from accounts.models import UserType
+from wallet.models import Wallet, WalletTransaction
+from wallet import ledger
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent wallet debits/credits through the ledger and check for lost updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            nargs='+',
+            default=[1, 8, 32],
+            help='Concurrent worker counts to benchmark (default: 1 8 32)',
+        )
+        parser.add_argument(
+            '--debits',
+            type=int,
+            default=50,
+            help='Operations issued by each worker (default: 50)',
+        )
+        parser.add_argument(
+            '--amount',
+            type=Decimal,
+            default=Decimal('1.00'),
+            help='Amount of each operation (default: 1.00)',
+        )
+        parser.add_argument(
+            '--operation',
+            choices=['debit', 'credit', 'striped-credit'],
+            default='debit',
+            help='Ledger operation every worker repeats against one shared wallet (default: debit)',
+        )
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=5,
+            help='Retries per operation when the database reports a lock timeout (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Database backend: {connection.vendor}")
+        failed = False
+        for workers in options['workers']:
+            if not self.run_round(workers, options['debits'], options['amount'], options['retries'], options['operation']):
+                failed = True
+        if failed:
+            raise CommandError('Lost updates detected')
+
+    def run_round(self, workers, debits, amount, retries, operation):
+        suffix = uuid.uuid4().hex[:10]
+        user = User.objects.create(
+            username=f'ledger-bench-{suffix}',
+            email=f'ledger-bench-{suffix}@example.com',
+            phone=f'bench{suffix}',
+            user_type=UserType.RETAILER,
+        )
+        # Leave room for every debit plus a margin so none should fail for balance.
+        opening = amount * workers * debits + amount
+        wallet = Wallet.objects.create(user=user, balance=opening)
+        apply = {
+            'debit': ledger.debit,
+            'credit': ledger.credit,
+            'striped-credit': ledger.credit_striped,
+        }[operation]
+
+        def worker(_):
+            ok = errors = 0
+            try:
+                own_wallet = Wallet.objects.get(pk=wallet.pk)
+                for _ in range(debits):
+                    for attempt in range(retries + 1):
+                        try:
+                            apply(own_wallet, amount, created_by=user, description='ledger benchmark')
+                            ok += 1
+                            break
+                        except OperationalError:
+                            if attempt == retries:
+                                errors += 1
+                            time.sleep(0.01 * (attempt + 1))
+                        except ledger.InsufficientBalance:
+                            errors += 1
+                            break
+            finally:
+                connection.close()
+            return ok, errors
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(worker, range(workers)))
+            elapsed = time.perf_counter() - started
+
+            succeeded = sum(ok for ok, _ in results)
+            errors = sum(err for _, err in results)
+            if operation == 'striped-credit':
+                ledger.consolidate_stripes(wallet.pk)
+            wallet.refresh_balance()
+            if operation == 'debit':
+                expected = opening - amount * succeeded
+            else:
+                expected = opening + amount * succeeded
+            recorded = WalletTransaction.objects.filter(wallet=wallet).count()
+            consistent = wallet.balance == expected and recorded == succeeded
+
+            line = (
+                f"{operation} workers={workers:<3} ops={succeeded:<6} errors={errors:<4} "
+                f"elapsed={elapsed:.2f}s rate={succeeded / elapsed:.1f} ops/sec "
+                f"balance={wallet.balance} expected={expected} transactions={recorded}"
+            )
+            if consistent:
+                self.stdout.write(self.style.SUCCESS(f"{line} OK"))
+            else:
+                self.stdout.write(self.style.ERROR(f"{line} LOST UPDATES"))
+            return consistent
+        finally:
+            user.delete()
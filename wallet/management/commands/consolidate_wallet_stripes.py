@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from wallet.models import WalletStripe
+from wallet import ledger
+import time
+
+
+class Command(BaseCommand):
+    help = 'Fold striped sub-balances (house wallet payment credits) back into their wallet balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, consolidating every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=30,
+            help='Seconds between passes with --loop (default: 30)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.consolidate()
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def consolidate(self):
+        wallet_ids = (
+            WalletStripe.objects.exclude(balance=0)
+            .order_by('wallet_id')
+            .values_list('wallet_id', flat=True)
+            .distinct()
+        )
+        for wallet_id in wallet_ids:
+            moved = ledger.consolidate_stripes(wallet_id)
+            if moved:
+                self.stdout.write(f'Wallet {wallet_id}: consolidated ₹{moved}')
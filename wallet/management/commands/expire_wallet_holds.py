@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from wallet import ledger
+import time
+
+
+class Command(BaseCommand):
+    help = 'Release wallet holds that are still active past their expiry time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Holds expired per pass (default: 1000)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, sweeping every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60,
+            help='Seconds between passes with --loop (default: 60)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while True:
+                expired = ledger.expire_holds(limit=options['batch_size'])
+                total += expired
+                if expired < options['batch_size']:
+                    break
+            self.stdout.write(f'Expired {total} holds')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
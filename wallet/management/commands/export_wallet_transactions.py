@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from wallet.models import Wallet
+from wallet import export, ledger
+from datetime import timedelta
+import sys
+
+
+class Command(BaseCommand):
+    help = 'Stream wallet transactions to a CSV or JSON Lines file (constant memory, optional gzip)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet-id', type=int, help='Only this wallet')
+        parser.add_argument('--user-type', type=int, help='Only wallets of this user type (1-4)')
+        parser.add_argument('--start', help='ISO date or datetime, inclusive')
+        parser.add_argument('--end', help='ISO date (inclusive) or datetime (exclusive)')
+        parser.add_argument(
+            '--format',
+            dest='output_format',
+            choices=['csv', 'jsonl'],
+            default='csv',
+            help='Output format (default: csv)',
+        )
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            start = export.parse_bound(options['start']) if options['start'] else None
+            end = export.parse_bound(options['end'], end=True) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        queryset = export.export_queryset(
+            wallet_id=options['wallet_id'],
+            user_type=options['user_type'],
+            start=start,
+            end=end,
+        )
+        chunks = export.stream(queryset, options['output_format'], options['gzip'])
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                written = sum(output.write(chunk) for chunk in chunks)
+            self.stderr.write(f"Wrote {written} bytes to {options['output']}")
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+
+        if options['wallet_id'] is not None and start is not None:
+            wallet = Wallet.objects.filter(pk=options['wallet_id']).first()
+            if wallet is not None:
+                opening = ledger.balance_as_of(wallet, start - timedelta(microseconds=1))
+                self.stderr.write(f"Opening balance at {start.isoformat()}: {opening}")
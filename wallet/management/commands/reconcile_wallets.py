@@ -0,0 +1,121 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import os
+
+import django
+
+from wallet.models import Wallet, ReconciliationRun
+from wallet import ledger
+
+REPORT_COLUMNS = ['wallet_id', 'user_email', 'balance', 'ledger_total', 'difference']
+
+
+def _init_worker():
+    # Needed when the pool spawns fresh interpreters (macOS/Windows); harmless after fork.
+    django.setup()
+
+
+def _check_chunk(first_id, last_id, since):
+    try:
+        return ledger.reconcile_range(first_id, last_id, since)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Check every wallet balance against the sum of its transactions and write a discrepancy report'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Wallet id range checked per aggregate query (default: 10000)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes; 1 runs inline (default: CPU count)',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only check wallets touched since the last completed run',
+        )
+        parser.add_argument(
+            '--report',
+            help='CSV file for discrepancies (default: reconciliation-<timestamp>.csv)',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        since = None
+        if options['incremental']:
+            last_run = ReconciliationRun.objects.filter(finished_at__isnull=False).order_by('-started_at').first()
+            if last_run is None:
+                self.stdout.write('No previous run found; checking all wallets')
+            else:
+                since = last_run.started_at
+                self.stdout.write(f'Checking wallets touched since {since.isoformat()}')
+
+        started_at = timezone.now()
+        report_path = options['report'] or f"reconciliation-{started_at:%Y%m%d-%H%M%S}.csv"
+        run = ReconciliationRun.objects.create(
+            incremental=since is not None,
+            started_at=started_at,
+            report_path=report_path,
+        )
+
+        bounds = Wallet.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        chunks = []
+        if bounds['first'] is not None:
+            chunks = [
+                (first_id, first_id + chunk_size, since)
+                for first_id in range(bounds['first'], bounds['last'] + 1, chunk_size)
+            ]
+
+        checked = 0
+        discrepancies = []
+        if options['workers'] <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                count, found = ledger.reconcile_range(*chunk)
+                checked += count
+                discrepancies.extend(found)
+        else:
+            # Children must open their own connections rather than share ours.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                futures = [pool.submit(_check_chunk, *chunk) for chunk in chunks]
+                for future in as_completed(futures):
+                    count, found = future.result()
+                    checked += count
+                    discrepancies.extend(found)
+
+        discrepancies.sort(key=lambda row: row['wallet_id'])
+        with open(report_path, 'w', newline='') as report:
+            writer = csv.DictWriter(report, fieldnames=REPORT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(discrepancies)
+
+        run.finished_at = timezone.now()
+        run.wallets_checked = checked
+        run.discrepancies = len(discrepancies)
+        run.save(update_fields=['finished_at', 'wallets_checked', 'discrepancies'])
+
+        elapsed = (run.finished_at - started_at).total_seconds()
+        message = (
+            f'Checked {checked} wallets in {len(chunks)} chunks in {elapsed:.1f}s; '
+            f'{len(discrepancies)} discrepancies written to {report_path}'
+        )
+        if discrepancies:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
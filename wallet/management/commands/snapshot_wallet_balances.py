@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from wallet.models import Wallet
+from wallet import ledger
+
+
+class Command(BaseCommand):
+    help = 'Record a balance snapshot for every wallet that has new transactions since its last snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Wallets locked and snapshotted per transaction (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        wallet_ids = Wallet.objects.order_by('pk').values_list('pk', flat=True)
+
+        written = 0
+        chunk = []
+        for wallet_id in wallet_ids.iterator(chunk_size=chunk_size):
+            chunk.append(wallet_id)
+            if len(chunk) == chunk_size:
+                written += ledger.take_snapshots(chunk)
+                chunk = []
+        if chunk:
+            written += ledger.take_snapshots(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} wallet balance snapshots'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0002_alter_usermargin_admin_alter_usermargin_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Wallet balance right after this transaction (empty for rows written before it was tracked)', max_digits=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='WalletBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('last_transaction_id', models.BigIntegerField(blank=True, help_text='Newest WalletTransaction id included in this balance', null=True)),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='wallet.wallet')),
+            ],
+            options={
+                'ordering': ['-taken_at'],
+                'indexes': [models.Index(fields=['wallet', 'taken_at'], name='wallet_snapshot_taken_idx')],
+            },
+        ),
+    ]
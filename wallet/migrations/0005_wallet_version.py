@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0004_wallettransaction_wallet_txn_wallet_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, help_text='Incremented on every balance change; used to order cached balances'),
+        ),
+    ]
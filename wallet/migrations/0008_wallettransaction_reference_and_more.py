@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0007_reconciliationrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='reference',
+            field=models.CharField(blank=True, db_index=True, help_text='Shared by the entries of one transfer', max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='wallettransaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('add_to_wallet', 'Add to Wallet'), ('debit_from_wallet', 'Debit from Wallet'), ('transfer_in', 'Transfer In'), ('transfer_out', 'Transfer Out')], max_length=20),
+        ),
+    ]
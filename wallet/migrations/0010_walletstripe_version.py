@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0009_wallet_held_amount_wallethold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='walletstripe',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, help_text="Credits since the last fold; counts towards the wallet's cached version"),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from decimal import Decimal
 from accounts.models import UserType
 
@@ -8,45 +10,159 @@ User = get_user_model()
 class Wallet(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wallet')
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    held_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), help_text="Total of active holds; not available for debits")
+    version = models.PositiveBigIntegerField(default=0, help_text="Incremented on every balance change; used to order cached balances")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.user.email} - Balance: ₹{self.balance}"
     
+    @property
+    def available_balance(self):
+        return self.balance - self.held_amount
+    
     def can_debit(self, amount):
-        return self.balance >= amount
+        return self.available_balance >= amount
     
     def add_balance(self, amount):
-        self.balance += amount
-        self.save()
+        # Single UPDATE so concurrent credits are applied by the database, not
+        # by overwriting a stale in-memory balance.
+        Wallet.objects.filter(pk=self.pk).update(
+            balance=F('balance') + amount, version=F('version') + 1, updated_at=timezone.now()
+        )
+        self.refresh_balance()
     
     def debit_balance(self, amount):
-        if self.can_debit(amount):
-            self.balance -= amount
-            self.save()
-            return True
-        return False
+        # The balance check is part of the UPDATE's WHERE clause, so two racing
+        # debits can never both pass it. Held funds are not available.
+        updated = Wallet.objects.filter(pk=self.pk, balance__gte=F('held_amount') + amount).update(
+            balance=F('balance') - amount, version=F('version') + 1, updated_at=timezone.now()
+        )
+        self.refresh_balance()
+        return bool(updated)
+    
+    def refresh_balance(self):
+        self.balance, self.held_amount, self.version, self.updated_at = Wallet.objects.values_list(
+            'balance', 'held_amount', 'version', 'updated_at'
+        ).get(pk=self.pk)
+
+class WalletStripe(models.Model):
+    """
+    One of N sub-balances of a hot wallet (the house/admin wallet).
+
+    Credits land on a random stripe so concurrent payments update different
+    rows; the wallet's true balance is ``Wallet.balance`` plus all stripes
+    until the next ledger write to the wallet, or ``consolidate_wallet_stripes``,
+    folds them back in.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='stripes')
+    stripe = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    version = models.PositiveBigIntegerField(default=0, help_text="Credits since the last fold; counts towards the wallet's cached version")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'stripe'], name='unique_wallet_stripe'),
+        ]
+    
+    def __str__(self):
+        return f"{self.wallet.user.email} - stripe {self.stripe} - ₹{self.balance}"
+
+class WalletHold(models.Model):
+    """
+    Funds reserved on a wallet while a payment is pending.
+
+    Reserving adds to ``Wallet.held_amount`` (so the money cannot be spent
+    twice); capturing debits the wallet, releasing or expiring just gives the
+    funds back. Holds left active past ``expires_at`` are released by
+    ``expire_wallet_holds``.
+    """
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('captured', 'Captured'),
+        ('released', 'Released'),
+        ('expired', 'Expired'),
+    ]
+    
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='holds')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    reference = models.CharField(max_length=100, blank=True, db_index=True, help_text="What the funds are held for, e.g. a purchase transaction id")
+    description = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wallet_holds_created')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    settled_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='wallet_hold_status_exp_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.wallet.user.email} - hold ₹{self.amount} - {self.status}"
 
 class WalletTransaction(models.Model):
     TRANSACTION_TYPES = [
         ('add_to_wallet', 'Add to Wallet'),
         ('debit_from_wallet', 'Debit from Wallet'),
+        ('transfer_in', 'Transfer In'),
+        ('transfer_out', 'Transfer Out'),
     ]
+    CREDIT_TYPES = ['add_to_wallet', 'transfer_in']
+    DEBIT_TYPES = ['debit_from_wallet', 'transfer_out']
     
     wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='transactions')
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Wallet balance right after this transaction (empty for rows written before it was tracked)")
     description = models.TextField(blank=True)
+    reference = models.CharField(max_length=32, blank=True, db_index=True, help_text="Shared by the entries of one transfer")
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wallet_transactions_created')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['wallet', 'created_at', 'id'], name='wallet_txn_wallet_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='wallet_txn_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.wallet.user.email} - {self.transaction_type} - ₹{self.amount}"
 
+class WalletBalanceSnapshot(models.Model):
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='snapshots')
+    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    last_transaction_id = models.BigIntegerField(null=True, blank=True, help_text="Newest WalletTransaction id included in this balance")
+    taken_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-taken_at']
+        indexes = [
+            models.Index(fields=['wallet', 'taken_at'], name='wallet_snapshot_taken_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.wallet.user.email} - ₹{self.balance} @ {self.taken_at:%Y-%m-%d %H:%M}"
+
+class ReconciliationRun(models.Model):
+    incremental = models.BooleanField(default=False)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    wallets_checked = models.PositiveIntegerField(default=0)
+    discrepancies = models.PositiveIntegerField(default=0)
+    report_path = models.CharField(max_length=500, blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Reconciliation {self.started_at:%Y-%m-%d %H:%M} - {self.discrepancies} discrepancies"
+
 class UserMargin(models.Model):
     admin = models.ForeignKey(User, on_delete=models.CASCADE, related_name='managed_margins', limit_choices_to={'user_type': UserType.ADMIN})
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='margin_settings', limit_choices_to={'user_type__in': [UserType.DISTRIBUTOR, UserType.RETAILER]})
@@ -0,0 +1,6 @@
+from core.pagination import KeysetPagination
+
+
+class WalletTransactionPagination(KeysetPagination):
+    # Served by the (wallet, created_at, id) and (created_at, id) indexes on WalletTransaction.
+    ordering = ('-created_at', '-id')
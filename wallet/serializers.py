@@ -1,3 +1,4 @@
+from decimal import Decimal
 from rest_framework import serializers
 from .models import Wallet, WalletTransaction, UserMargin
 from accounts.models import User, UserType
@@ -8,8 +9,21 @@ class WalletSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Wallet
-        fields = ['id', 'user_email', 'user_type', 'balance', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'user_email', 'user_type', 'balance', 'held_amount', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'held_amount', 'created_at', 'updated_at']
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Striped (house) wallets: report the total including unconsolidated stripes.
+        balance = instance.balance + (getattr(instance, 'stripe_balance', None) or 0)
+        data['balance'] = self.fields['balance'].to_representation(balance)
+        data['available_balance'] = self.fields['balance'].to_representation(balance - instance.held_amount)
+        return data
+
+class WalletBalanceSerializer(serializers.Serializer):
+    wallet_id = serializers.IntegerField(read_only=True)
+    balance = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    available_balance = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
 class WalletTransactionSerializer(serializers.ModelSerializer):
     wallet_user = serializers.EmailField(source='wallet.user.email', read_only=True)
@@ -17,8 +31,8 @@ class WalletTransactionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = WalletTransaction
-        fields = ['id', 'wallet_user', 'transaction_type', 'amount', 'description', 'created_by_email', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = ['id', 'wallet_user', 'transaction_type', 'amount', 'balance_after', 'description', 'created_by_email', 'created_at']
+        read_only_fields = ['id', 'balance_after', 'created_at']
 
 class AddToWalletSerializer(serializers.Serializer):
     user_email = serializers.EmailField()
@@ -48,6 +62,24 @@ class DebitFromWalletSerializer(serializers.Serializer):
         except User.DoesNotExist:
             raise serializers.ValidationError("User with this email does not exist.")
 
+class BulkWalletEntrySerializer(serializers.Serializer):
+    user_email = serializers.EmailField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    description = serializers.CharField(max_length=500, required=False, allow_blank=True, default='')
+    transaction_type = serializers.ChoiceField(choices=['add_to_wallet', 'debit_from_wallet'], default='add_to_wallet')
+
+class TransferSerializer(serializers.Serializer):
+    to_email = serializers.EmailField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    description = serializers.CharField(max_length=500, required=False, allow_blank=True, default='')
+
+class WalletTransferSerializer(TransferSerializer):
+    from_email = serializers.EmailField(required=False, help_text="Source wallet owner (admin only; defaults to you)")
+
+class BatchTransferSerializer(serializers.Serializer):
+    from_email = serializers.EmailField(required=False, help_text="Source wallet owner (admin only; defaults to you)")
+    transfers = TransferSerializer(many=True, allow_empty=False)
+
 class UserMarginSerializer(serializers.ModelSerializer):
     user_email = serializers.EmailField(source='user.email', read_only=True)
     user_type = serializers.CharField(source='user.user_type', read_only=True)
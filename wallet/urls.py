@@ -4,9 +4,15 @@ from . import views
 urlpatterns = [
     path('wallets/', views.WalletListView.as_view(), name='wallet-list'),
     path('wallets/<int:pk>/', views.WalletDetailView.as_view(), name='wallet-detail'),
+    path('wallets/balance/', views.WalletBalanceView.as_view(), name='wallet-balance'),
+    path('wallets/balance-cache-stats/', views.WalletBalanceCacheStatsView.as_view(), name='wallet-balance-cache-stats'),
     path('transactions/', views.WalletTransactionListView.as_view(), name='wallet-transaction-list'),
+    path('transactions/export/', views.export_transactions, name='wallet-transaction-export'),
     path('add-to-wallet/', views.add_to_wallet, name='add-to-wallet'),
     path('debit-from-wallet/', views.debit_from_wallet, name='debit-from-wallet'),
+    path('bulk/', views.bulk_wallet_operation, name='bulk-wallet-operation'),
+    path('transfer/', views.transfer_funds, name='wallet-transfer'),
+    path('transfer/batch/', views.batch_transfer_funds, name='wallet-batch-transfer'),
     path('set-margin/', views.set_user_margin, name='set-user-margin'),
     path('margins/', views.UserMarginListView.as_view(), name='user-margin-list'),
 ]
\ No newline at end of file
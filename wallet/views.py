@@ -2,22 +2,44 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.views import APIView
+from django.conf import settings
 from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from .models import Wallet, WalletTransaction, UserMargin
+from .pagination import WalletTransactionPagination
+from . import ledger, balance_cache, export
 from .serializers import (
-    WalletSerializer, WalletTransactionSerializer, AddToWalletSerializer,
-    DebitFromWalletSerializer, UserMarginSerializer, SetMarginSerializer
+    WalletSerializer, WalletBalanceSerializer, WalletTransactionSerializer, AddToWalletSerializer,
+    DebitFromWalletSerializer, BulkWalletEntrySerializer, WalletTransferSerializer,
+    BatchTransferSerializer, UserMarginSerializer, SetMarginSerializer
 )
 from accounts.models import User, UserType
+from core.idempotency import idempotent, IDEMPOTENCY_KEY_PARAMETER
+from datetime import timedelta
+import csv
+import io
+
+
+def cached_wallet(user):
+    """The user's wallet as held in the balance cache (loaded on a miss), or ``None`` if they have none."""
+    entry = balance_cache.get(user.pk) or ledger.refresh_cached_balance(user.pk)
+    if entry is None:
+        return None
+    return Wallet(
+        pk=entry['wallet_id'], user=user, balance=entry['balance'], held_amount=entry['held_amount'],
+        created_at=entry['created_at'], updated_at=entry['updated_at'],
+    )
 
 class WalletListView(generics.ListAPIView):
     """
     List Wallets
     
-    Get list of wallets. Admins see all wallets, users see only their own.
+    Get list of wallets. Admins see all wallets, users see only their own,
+    served from the balance cache.
     """
     serializer_class = WalletSerializer
     permission_classes = [IsAuthenticated]
@@ -55,15 +77,22 @@ class WalletListView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.is_admin:
-            return Wallet.objects.all().select_related('user')
+            return ledger.with_stripe_balance(Wallet.objects.all().select_related('user'))
         else:
-            return Wallet.objects.filter(user=user)
+            return ledger.with_stripe_balance(Wallet.objects.filter(user=user))
+    
+    def list(self, request, *args, **kwargs):
+        if request.user.is_admin:
+            return super().list(request, *args, **kwargs)
+        wallet = cached_wallet(request.user)
+        return Response(self.get_serializer([wallet] if wallet else [], many=True).data)
 
 class WalletDetailView(generics.RetrieveAPIView):
     """
     Get Wallet Details
     
-    Get detailed wallet information. Admins can view any wallet, users can only view their own.
+    Get detailed wallet information. Admins can view any wallet, users can only
+    view their own, served from the balance cache.
     """
     serializer_class = WalletSerializer
     permission_classes = [IsAuthenticated]
@@ -102,29 +131,132 @@ class WalletDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.is_admin:
-            return Wallet.objects.all().select_related('user')
+            return ledger.with_stripe_balance(Wallet.objects.all().select_related('user'))
         else:
-            return Wallet.objects.filter(user=user)
+            return ledger.with_stripe_balance(Wallet.objects.filter(user=user))
+    
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_admin:
+            return super().retrieve(request, *args, **kwargs)
+        wallet = cached_wallet(request.user)
+        if wallet is None or wallet.pk != kwargs['pk']:
+            raise Http404
+        return Response(self.get_serializer(wallet).data)
+
+class WalletBalanceView(APIView):
+    """
+    Get Wallet Balance
+    
+    Lightweight balance lookup for point-of-sale polling. Served from the balance
+    cache, falling back to the database on a miss. Admins may pass `user_id`.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary="Get Wallet Balance",
+        operation_description=(
+            "Lightweight balance lookup for point-of-sale polling. Served from the balance cache, "
+            "falling back to the database on a miss. Admins may pass `user_id` to look up another user's wallet."
+        ),
+        manual_parameters=[
+            openapi.Parameter('user_id', openapi.IN_QUERY, description="User whose balance to fetch (admin only)", type=openapi.TYPE_INTEGER)
+        ],
+        responses={
+            200: openapi.Response(
+                description="Wallet balance",
+                examples={
+                    "application/json": {
+                        "wallet_id": 1,
+                        "balance": "1500.00",
+                        "available_balance": "1200.00"
+                    }
+                }
+            ),
+            404: openapi.Response(
+                description="Wallet not found",
+                examples={
+                    "application/json": {
+                        "error": "Wallet not found"
+                    }
+                }
+            )
+        },
+        tags=['Wallet Management']
+    )
+    def get(self, request):
+        user_id = request.user.id
+        if request.user.is_admin and request.query_params.get('user_id'):
+            try:
+                user_id = int(request.query_params['user_id'])
+            except ValueError:
+                return Response({"error": "user_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        entry = balance_cache.get(user_id) or ledger.refresh_cached_balance(user_id)
+        if entry is None:
+            return Response({"error": "Wallet not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(WalletBalanceSerializer(entry).data)
+
+class WalletBalanceCacheStatsView(APIView):
+    """
+    Balance Cache Statistics (Admin Only)
+    
+    Hit/miss counters for the wallet balance cache.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary="Balance Cache Statistics (Admin Only)",
+        operation_description="Hit/miss counters for the wallet balance cache.",
+        responses={
+            200: openapi.Response(
+                description="Cache counters",
+                examples={
+                    "application/json": {
+                        "hits": 9500,
+                        "misses": 500,
+                        "hit_rate": 0.95
+                    }
+                }
+            ),
+            403: openapi.Response(
+                description="Forbidden - Admin access required",
+                examples={
+                    "application/json": {
+                        "error": "Only admins can view cache statistics"
+                    }
+                }
+            )
+        },
+        tags=['Wallet Management']
+    )
+    def get(self, request):
+        if not request.user.is_admin:
+            return Response({"error": "Only admins can view cache statistics"}, status=status.HTTP_403_FORBIDDEN)
+        return Response(balance_cache.stats())
 
 class WalletTransactionListView(generics.ListAPIView):
     """
     List Wallet Transactions
     
     Get wallet transaction history. Admins see all transactions, users see only their own.
+    Newest first, paginated by cursor: follow the `next` / `previous` links.
     """
     serializer_class = WalletTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = WalletTransactionPagination
     
     @swagger_auto_schema(
         operation_summary="List Wallet Transactions",
-        operation_description="Get wallet transaction history. Admins see all transactions, users see only their own.",
+        operation_description=(
+            "Get wallet transaction history. Admins see all transactions, users see only their own. "
+            "Newest first, paginated by cursor: follow the `next` / `previous` links."
+        ),
         responses={
             200: openapi.Response(
                 description="List of wallet transactions",
                 examples={
                     "application/json": {
-                        "count": 2,
-                        "next": None,
+                        "next": "http://localhost:8000/api/wallet/transactions/?cursor=eyJ2IjpbIjIwMjQtMDEtMTVUMTA6MzA6MDBaIiwxXX0",
                         "previous": None,
                         "results": [
                             {
@@ -132,6 +264,7 @@ class WalletTransactionListView(generics.ListAPIView):
                                 "wallet_user": "distributor@example.com",
                                 "transaction_type": "add_to_wallet",
                                 "amount": "1000.00",
+                                "balance_after": "1000.00",
                                 "description": "Initial wallet funding",
                                 "created_by_email": "admin@example.com",
                                 "created_at": "2024-01-15T10:30:00Z"
@@ -153,11 +286,89 @@ class WalletTransactionListView(generics.ListAPIView):
         else:
             return WalletTransaction.objects.filter(wallet__user=user).select_related('wallet__user', 'created_by')
 
+@swagger_auto_schema(
+    method='get',
+    operation_summary="Export Wallet Transactions",
+    operation_description=(
+        "Stream wallet transactions oldest first as CSV or JSON Lines, optionally gzip-compressed. "
+        "Admins can filter by wallet, user type and date range; other users always get their own wallet. "
+        "When exporting one wallet with a start date, the opening balance is returned in the "
+        "`X-Opening-Balance` header."
+    ),
+    manual_parameters=[
+        openapi.Parameter('file_format', openapi.IN_QUERY, description="csv (default) or jsonl", type=openapi.TYPE_STRING, enum=['csv', 'jsonl']),
+        openapi.Parameter('gzip', openapi.IN_QUERY, description="Compress the output with gzip", type=openapi.TYPE_BOOLEAN),
+        openapi.Parameter('wallet_id', openapi.IN_QUERY, description="Only this wallet (admin only)", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('user_type', openapi.IN_QUERY, description="Only wallets of this user type (admin only)", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('start_date', openapi.IN_QUERY, description="ISO date or datetime, inclusive", type=openapi.TYPE_STRING),
+        openapi.Parameter('end_date', openapi.IN_QUERY, description="ISO date (inclusive) or datetime (exclusive)", type=openapi.TYPE_STRING),
+    ],
+    responses={
+        200: openapi.Response(description="Streamed CSV / JSON Lines file"),
+        400: openapi.Response(
+            description="Bad request - invalid filter",
+            examples={
+                "application/json": {
+                    "error": "Invalid date: 2024-13-01"
+                }
+            }
+        ),
+        404: openapi.Response(
+            description="Wallet not found",
+            examples={
+                "application/json": {
+                    "error": "Wallet not found"
+                }
+            }
+        )
+    },
+    tags=['Wallet Management']
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_transactions(request):
+    params = request.query_params
+    # Not `format`: DRF reserves that query parameter for renderer selection.
+    output_format = params.get('file_format', 'csv')
+    if output_format not in ('csv', 'jsonl'):
+        return Response({"error": "file_format must be csv or jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+    compress = params.get('gzip', '').lower() in ('1', 'true', 'yes')
+    
+    try:
+        start = export.parse_bound(params['start_date']) if params.get('start_date') else None
+        end = export.parse_bound(params['end_date'], end=True) if params.get('end_date') else None
+        if request.user.is_admin:
+            wallet_id = int(params['wallet_id']) if params.get('wallet_id') else None
+            user_type = int(params['user_type']) if params.get('user_type') else None
+        else:
+            wallet_id = Wallet.objects.filter(user=request.user).values_list('pk', flat=True).first()
+            if wallet_id is None:
+                return Response({"error": "Wallet not found"}, status=status.HTTP_404_NOT_FOUND)
+            user_type = None
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    queryset = export.export_queryset(wallet_id=wallet_id, user_type=user_type, start=start, end=end)
+    content_type = 'application/x-ndjson' if output_format == 'jsonl' else 'text/csv'
+    filename = f"wallet-transactions.{output_format}"
+    if compress:
+        content_type = 'application/gzip'
+        filename += '.gz'
+    
+    response = StreamingHttpResponse(export.stream(queryset, output_format, compress), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if wallet_id is not None and start is not None:
+        wallet = Wallet.objects.filter(pk=wallet_id).first()
+        if wallet is not None:
+            response['X-Opening-Balance'] = str(ledger.balance_as_of(wallet, start - timedelta(microseconds=1)))
+    return response
+
 @swagger_auto_schema(
     method='post',
     operation_summary="Add Money to Wallet (Admin Only)",
     operation_description="Add money to a distributor or retailer wallet",
     request_body=AddToWalletSerializer,
+    manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
     responses={
         200: openapi.Response(
             description="Money added successfully",
@@ -204,6 +415,7 @@ class WalletTransactionListView(generics.ListAPIView):
 )
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def add_to_wallet(request):
     if not request.user.is_admin:
         return Response({"error": "Only admins can add money to wallets"}, status=status.HTTP_403_FORBIDDEN)
@@ -219,15 +431,7 @@ def add_to_wallet(request):
                 user = User.objects.get(email=user_email)
                 wallet, _ = Wallet.objects.get_or_create(user=user)
                 
-                wallet.add_balance(amount)
-                
-                WalletTransaction.objects.create(
-                    wallet=wallet,
-                    transaction_type='add_to_wallet',
-                    amount=amount,
-                    description=description,
-                    created_by=request.user
-                )
+                ledger.credit(wallet, amount, created_by=request.user, description=description)
                 
                 return Response({
                     "message": "Money added to wallet successfully",
@@ -246,6 +450,7 @@ def add_to_wallet(request):
     operation_summary="Debit Money from Wallet (Admin Only)",
     operation_description="Debit money from a distributor or retailer wallet",
     request_body=DebitFromWalletSerializer,
+    manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
     responses={
         200: openapi.Response(
             description="Money debited successfully",
@@ -292,6 +497,7 @@ def add_to_wallet(request):
 )
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def debit_from_wallet(request):
     if not request.user.is_admin:
         return Response({"error": "Only admins can debit money from wallets"}, status=status.HTTP_403_FORBIDDEN)
@@ -307,19 +513,11 @@ def debit_from_wallet(request):
                 user = User.objects.get(email=user_email)
                 wallet = get_object_or_404(Wallet, user=user)
                 
-                if not wallet.can_debit(amount):
+                try:
+                    ledger.debit(wallet, amount, created_by=request.user, description=description)
+                except ledger.InsufficientBalance:
                     return Response({"error": "Insufficient wallet balance"}, status=status.HTTP_400_BAD_REQUEST)
                 
-                wallet.debit_balance(amount)
-                
-                WalletTransaction.objects.create(
-                    wallet=wallet,
-                    transaction_type='debit_from_wallet',
-                    amount=amount,
-                    description=description,
-                    created_by=request.user
-                )
-                
                 return Response({
                     "message": "Money debited from wallet successfully",
                     "wallet": WalletSerializer(wallet).data
@@ -332,6 +530,297 @@ def debit_from_wallet(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _read_bulk_rows(request):
+    """Rows from an uploaded CSV ``file`` or a JSON array (bare or under ``entries``)."""
+    upload = request.FILES.get('file')
+    if upload is not None:
+        reader = csv.DictReader(io.TextIOWrapper(upload, encoding='utf-8-sig'))
+        rows = []
+        for row in reader:
+            # Blank cells fall back to the serializer defaults.
+            row = {(key or '').strip().lower(): value.strip() for key, value in row.items() if isinstance(value, str) and value.strip()}
+            if 'email' in row and 'user_email' not in row:
+                row['user_email'] = row.pop('email')
+            rows.append(row)
+        return rows
+
+    data = request.data
+    if isinstance(data, dict):
+        data = data.get('entries')
+    if not isinstance(data, list):
+        return None
+    return [
+        {**row, 'user_email': row.get('user_email', row.get('email'))} if isinstance(row, dict) else {}
+        for row in data
+    ]
+
+@swagger_auto_schema(
+    method='post',
+    operation_summary="Bulk Add/Debit Wallets (Admin Only)",
+    operation_description=(
+        "Credit or debit many distributor/retailer wallets in one transaction. "
+        "Send a JSON array of {email, amount, description, transaction_type} objects, "
+        "or upload a CSV file (field `file`) with email, amount, description and optional "
+        "transaction_type columns. transaction_type defaults to add_to_wallet. "
+        "Rows that fail validation or would overdraw a wallet are skipped and reported."
+    ),
+    manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+    responses={
+        200: openapi.Response(
+            description="Per-row results",
+            examples={
+                "application/json": {
+                    "processed": 2,
+                    "succeeded": 1,
+                    "failed": 1,
+                    "results": [
+                        {"row": 1, "user_email": "retailer@example.com", "status": "ok", "balance_after": "1500.00"},
+                        {"row": 2, "user_email": "missing@example.com", "status": "error", "error": "User not found"}
+                    ]
+                }
+            }
+        ),
+        400: openapi.Response(
+            description="Bad request - no rows or too many rows",
+            examples={
+                "application/json": {
+                    "error": "Send a JSON array of entries or upload a CSV file"
+                }
+            }
+        ),
+        403: openapi.Response(
+            description="Forbidden - Admin access required",
+            examples={
+                "application/json": {
+                    "error": "Only admins can run bulk wallet operations"
+                }
+            }
+        )
+    },
+    tags=['Wallet Management']
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def bulk_wallet_operation(request):
+    if not request.user.is_admin:
+        return Response({"error": "Only admins can run bulk wallet operations"}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        rows = _read_bulk_rows(request)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return Response({"error": f"Could not read CSV file: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    if not rows:
+        return Response({"error": "Send a JSON array of entries or upload a CSV file"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > settings.WALLET_BULK_MAX_ROWS:
+        return Response(
+            {"error": f"At most {settings.WALLET_BULK_MAX_ROWS} rows can be processed per request"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    results = [None] * len(rows)
+    entries = []
+    positions = []
+    for index, row in enumerate(rows):
+        serializer = BulkWalletEntrySerializer(data=row)
+        if serializer.is_valid():
+            entries.append(serializer.validated_data)
+            positions.append(index)
+        else:
+            results[index] = {
+                "row": index + 1,
+                "user_email": row.get('user_email'),
+                "status": "error",
+                "error": serializer.errors,
+            }
+    
+    if entries:
+        for index, result in zip(positions, ledger.apply_batch(entries, created_by=request.user)):
+            result['row'] = index + 1
+            if 'balance_after' in result:
+                result['balance_after'] = str(result['balance_after'])
+            results[index] = result
+    
+    succeeded = sum(1 for result in results if result['status'] == 'ok')
+    return Response({
+        "processed": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }, status=status.HTTP_200_OK)
+
+def _run_transfer(request, from_email, items):
+    """Shared body of the single and batch transfer endpoints."""
+    if request.user.is_admin:
+        allowed_types = (UserType.DISTRIBUTOR, UserType.RETAILER)
+    elif request.user.is_distributor:
+        allowed_types = (UserType.RETAILER,)
+    else:
+        return Response({"error": "Only admins and distributors can transfer funds"}, status=status.HTTP_403_FORBIDDEN)
+    
+    source_user = request.user
+    if from_email and from_email != request.user.email:
+        if not request.user.is_admin:
+            return Response({"error": "Only admins can transfer from another user's wallet"}, status=status.HTTP_403_FORBIDDEN)
+        source_user = User.objects.filter(email=from_email).first()
+        if source_user is None:
+            return Response({"error": "Source user not found"}, status=status.HTTP_404_NOT_FOUND)
+    
+    recipients = {user.email: user for user in User.objects.filter(email__in={item['to_email'] for item in items})}
+    missing = sorted({item['to_email'] for item in items} - recipients.keys())
+    if missing:
+        return Response({"error": "User not found", "emails": missing}, status=status.HTTP_404_NOT_FOUND)
+    not_allowed = sorted(email for email, user in recipients.items() if user.user_type not in allowed_types)
+    if not_allowed:
+        return Response(
+            {"error": "You cannot transfer funds to these users", "emails": not_allowed},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        reference, legs = ledger.transfer(
+            source_user,
+            [(recipients[item['to_email']], item['amount'], item.get('description', '')) for item in items],
+            created_by=request.user,
+        )
+    except ledger.InsufficientBalance:
+        return Response({"error": "Insufficient wallet balance"}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        "message": "Transfer completed successfully",
+        "reference": reference,
+        "from_email": source_user.email,
+        "balance": str(legs[-1][2]),
+        "transfers": [
+            {"to_email": user.email, "amount": str(amount), "to_balance_after": str(to_balance)}
+            for user, amount, _, to_balance in legs
+        ]
+    }, status=status.HTTP_200_OK)
+
+@swagger_auto_schema(
+    method='post',
+    operation_summary="Transfer Funds Between Wallets",
+    operation_description=(
+        "Move funds from your wallet (distributors, to retailers) or from any wallet (admins, "
+        "via from_email) to another wallet in one atomic operation. Both sides get a ledger "
+        "entry sharing the returned reference."
+    ),
+    request_body=WalletTransferSerializer,
+    manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+    responses={
+        200: openapi.Response(
+            description="Transfer completed",
+            examples={
+                "application/json": {
+                    "message": "Transfer completed successfully",
+                    "reference": "3f1c2a9b8d7e4f60a1b2c3d4e5f60718",
+                    "from_email": "distributor@example.com",
+                    "balance": "1250.00",
+                    "transfers": [
+                        {"to_email": "retailer@example.com", "amount": "250.00", "to_balance_after": "750.00"}
+                    ]
+                }
+            }
+        ),
+        400: openapi.Response(
+            description="Bad request - insufficient balance or invalid recipient",
+            examples={
+                "application/json": {
+                    "error": "Insufficient wallet balance"
+                }
+            }
+        ),
+        403: openapi.Response(
+            description="Forbidden - Admin or distributor access required",
+            examples={
+                "application/json": {
+                    "error": "Only admins and distributors can transfer funds"
+                }
+            }
+        ),
+        404: openapi.Response(
+            description="User not found",
+            examples={
+                "application/json": {
+                    "error": "User not found",
+                    "emails": ["missing@example.com"]
+                }
+            }
+        )
+    },
+    tags=['Wallet Management']
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def transfer_funds(request):
+    serializer = WalletTransferSerializer(data=request.data)
+    if serializer.is_valid():
+        data = serializer.validated_data
+        return _run_transfer(request, data.get('from_email'), [data])
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@swagger_auto_schema(
+    method='post',
+    operation_summary="Batch Transfer Funds",
+    operation_description=(
+        "Fund many wallets from one source wallet in a single atomic operation: either every "
+        "transfer is applied or none is."
+    ),
+    request_body=BatchTransferSerializer,
+    manual_parameters=[IDEMPOTENCY_KEY_PARAMETER],
+    responses={
+        200: openapi.Response(
+            description="Transfers completed",
+            examples={
+                "application/json": {
+                    "message": "Transfer completed successfully",
+                    "reference": "3f1c2a9b8d7e4f60a1b2c3d4e5f60718",
+                    "from_email": "distributor@example.com",
+                    "balance": "1000.00",
+                    "transfers": [
+                        {"to_email": "retailer1@example.com", "amount": "250.00", "to_balance_after": "750.00"},
+                        {"to_email": "retailer2@example.com", "amount": "250.00", "to_balance_after": "300.00"}
+                    ]
+                }
+            }
+        ),
+        400: openapi.Response(
+            description="Bad request - insufficient balance or invalid recipient",
+            examples={
+                "application/json": {
+                    "error": "Insufficient wallet balance"
+                }
+            }
+        ),
+        403: openapi.Response(
+            description="Forbidden - Admin or distributor access required",
+            examples={
+                "application/json": {
+                    "error": "Only admins and distributors can transfer funds"
+                }
+            }
+        )
+    },
+    tags=['Wallet Management']
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def batch_transfer_funds(request):
+    serializer = BatchTransferSerializer(data=request.data)
+    if serializer.is_valid():
+        data = serializer.validated_data
+        if len(data['transfers']) > settings.WALLET_BULK_MAX_ROWS:
+            return Response(
+                {"error": f"At most {settings.WALLET_BULK_MAX_ROWS} transfers can be processed per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return _run_transfer(request, data.get('from_email'), data['transfers'])
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 @swagger_auto_schema(
     method='post',
     operation_summary="Set User Margin (Admin Only)",